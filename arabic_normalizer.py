@@ -0,0 +1,55 @@
+import re
+from functools import lru_cache
+from typing import List
+
+# التشكيل (الفتحة.. السكون، الشدة، التنوين، الألف الخنجرية) والتطويل تُحذف
+ARABIC_DIACRITICS = ''.join(chr(code) for code in range(0x064B, 0x0653)) + '\u0670'
+TATWEEL = '\u0640'
+
+# توحيد أشكال الحروف، والأرقام الهندية إلى أرقام عادية
+LETTER_FOLDING = {
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ى': 'ي', 'ی': 'ي', 'ئ': 'ي',
+    'ؤ': 'و',
+    'ة': 'ه',
+    'ک': 'ك',
+    **{chr(0x0660 + digit): str(digit) for digit in range(10)},
+    **{chr(0x06F0 + digit): str(digit) for digit in range(10)},
+}
+
+_TRANSLATION = str.maketrans({**LETTER_FOLDING, **{char: None for char in ARABIC_DIACRITICS + TATWEEL}})
+
+# السوابق واللواحق الشائعة: الأطول أولاً، ولا يُحذف شيء إذا بقي أقل من 3 أحرف
+PREFIXES = ('وبال', 'وال', 'ولل', 'بال', 'فال', 'كال', 'لل', 'ال', 'و')
+SUFFIXES = ('ات', 'ها', 'هم', 'ي')
+# التاء المربوطة تُكتب تاءً قبل الضمير: جرعته وجرعتي -> جرعه
+TA_PRONOUNS = ('تها', 'تهم', 'ته', 'تك', 'تي')
+MIN_STEM = 3
+
+_TOKEN_PATTERN = re.compile(r'\w+')
+
+def normalize_text(text: str) -> str:
+    """تطبيع النص في تمريرة translate واحدة: حذف التشكيل والتطويل وتوحيد الحروف"""
+    return text.lower().translate(_TRANSLATION).strip()
+
+@lru_cache(maxsize=65536)
+def stem(token: str) -> str:
+    """تجذيع خفيف لكلمة مطبعة: حذف سابقة واحدة ولاحقة واحدة"""
+    for prefix in PREFIXES:
+        if token.startswith(prefix) and len(token) - len(prefix) >= MIN_STEM:
+            token = token[len(prefix):]
+            break
+    for suffix in TA_PRONOUNS:
+        if token.endswith(suffix) and len(token) - len(suffix) >= MIN_STEM:
+            return token[:-len(suffix)] + 'ه'
+    for suffix in SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= MIN_STEM:
+            return token[:-len(suffix)]
+    # جمع إنجليزي بسيط: fevers -> fever
+    if token.isascii() and len(token) > MIN_STEM and token.endswith('s') and not token.endswith('ss'):
+        return token[:-1]
+    return token
+
+def tokenize(text: str) -> List[str]:
+    """كلمات النص بعد التطبيع والتجذيع (نفس الدالة للفهارس وللاستعلامات)"""
+    return [stem(token) for token in _TOKEN_PATTERN.findall(normalize_text(text))]
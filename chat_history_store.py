@@ -0,0 +1,107 @@
+import os
+import sqlite3
+import threading
+from collections import deque
+from typing import List, NamedTuple, Optional
+
+class ChatTurn(NamedTuple):
+    seq: int
+    user_msg: str
+    bot_response: str
+    timestamp: str
+
+class ChatHistoryStore:
+    """سجل محادثة محدود الذاكرة: آخر الرسائل في ring buffer والأقدم في SQLite
+
+    الذاكرة محدودة بعدد الرسائل وبعدد الأحرف لكل جلسة، وما يخرج من النافذة
+    يُكتب إلحاقاً فقط في قاعدة البيانات ويُقرأ عند التصفح للصفحات القديمة.
+    """
+
+    def __init__(self, session_id: str, db_path: Optional[str] = None, max_turns: int = 50,
+                 max_chars: int = 200_000):
+        self.session_id = session_id
+        self.db_path = db_path or os.getenv('CHAT_HISTORY_DB', 'chat_history.sqlite')
+        self.max_turns = max_turns
+        self.max_chars = max_chars
+        self.window = deque()
+        self.window_chars = 0
+        self.total = 0
+        self._lock = threading.Lock()
+        self._db = None
+
+    def _connection(self) -> sqlite3.Connection:
+        # قاعدة البيانات تُفتح فقط عند أول تفريغ
+        if self._db is None:
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS chat_turns ("
+                "session_id TEXT NOT NULL, seq INTEGER NOT NULL, user_msg TEXT, bot_response TEXT, "
+                "timestamp TEXT, PRIMARY KEY (session_id, seq))"
+            )
+        return self._db
+
+    def append(self, user_msg: str, bot_response: str, timestamp: str) -> ChatTurn:
+        with self._lock:
+            turn = ChatTurn(self.total, user_msg, bot_response, timestamp)
+            self.total += 1
+            self.window.append(turn)
+            self.window_chars += len(user_msg) + len(bot_response)
+
+            spilled = []
+            while len(self.window) > 1 and (len(self.window) > self.max_turns or self.window_chars > self.max_chars):
+                oldest = self.window.popleft()
+                self.window_chars -= len(oldest.user_msg) + len(oldest.bot_response)
+                spilled.append(oldest)
+            if spilled:
+                db = self._connection()
+                with db:
+                    db.executemany(
+                        "INSERT OR REPLACE INTO chat_turns VALUES (?, ?, ?, ?, ?)",
+                        [(self.session_id,) + tuple(turn) for turn in spilled]
+                    )
+            return turn
+
+    def __len__(self) -> int:
+        return self.total
+
+    def turns(self, start: int, stop: int) -> List[ChatTurn]:
+        """الرسائل من start إلى stop (بالترتيب الزمني)"""
+        with self._lock:
+            start, stop = max(start, 0), min(stop, self.total)
+            window_start = self.window[0].seq if self.window else self.total
+            result = []
+            if start < window_start:
+                rows = self._connection().execute(
+                    "SELECT seq, user_msg, bot_response, timestamp FROM chat_turns "
+                    "WHERE session_id = ? AND seq >= ? AND seq < ? ORDER BY seq",
+                    (self.session_id, start, min(stop, window_start))
+                ).fetchall()
+                result.extend(ChatTurn(*row) for row in rows)
+            for turn in self.window:
+                if turn.seq >= stop:
+                    break
+                if turn.seq >= start:
+                    result.append(turn)
+            return result
+
+    def page_count(self, page_size: int) -> int:
+        return max(1, -(-self.total // page_size))
+
+    def page(self, page: int, page_size: int = 10) -> List[ChatTurn]:
+        """الصفحة رقم page من الأحدث (0 = آخر الرسائل)"""
+        stop = self.total - page * page_size
+        return self.turns(stop - page_size, stop)
+
+    def clear(self):
+        with self._lock:
+            self.window.clear()
+            self.window_chars = 0
+            self.total = 0
+            if self._db is not None:
+                with self._db:
+                    self._db.execute("DELETE FROM chat_turns WHERE session_id = ?", (self.session_id,))
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
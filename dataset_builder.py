@@ -1,9 +1,30 @@
 
-import pandas as pd
+import csv
 import json
 import random
+import os
+import argparse
 from datetime import datetime
 
+from dataset_stats import DatasetStatistics
+
+# تحويل الحروف العربية إلى "عربيزي" (أرقام وحروف لاتينية)
+ARABIZI_MAP = {
+    'ا': 'a', 'أ': '2', 'إ': '2', 'آ': '2a', 'ء': '2', 'ؤ': '2', 'ئ': '2',
+    'ب': 'b', 'ت': 't', 'ث': 'th', 'ج': 'j', 'ح': '7', 'خ': '5', 'د': 'd',
+    'ذ': 'th', 'ر': 'r', 'ز': 'z', 'س': 's', 'ش': 'sh', 'ص': 's', 'ض': 'd',
+    'ط': '6', 'ظ': 'z', 'ع': '3', 'غ': 'gh', 'ف': 'f', 'ق': '8', 'ك': 'k',
+    'ل': 'l', 'م': 'm', 'ن': 'n', 'ه': 'h', 'ة': 'a', 'و': 'w', 'ي': 'y',
+    'ى': 'a', '؟': '?', '،': ','
+}
+
+# الحركات والتطويل المستخدمة كضوضاء
+ARABIC_DIACRITICS = ['\u064b', '\u064c', '\u064d', '\u064e', '\u064f', '\u0650', '\u0651', '\u0652']
+TATWEEL = '\u0640'
+
+# عبارات يمكن استبدالها باسم دواء حقيقي
+DRUG_PLACEHOLDERS = ['this medicine', 'this pill', 'هذا الدواء']
+
 class MedicalDatasetBuilder:
     def __init__(self):
         self.setup_sample_data()
@@ -77,26 +98,182 @@ class MedicalDatasetBuilder:
     
     def create_csv_dataset(self, filename="medical_dataset.csv"):
         """Create CSV dataset for easy analysis"""
-        df = pd.DataFrame(self.training_data)
-        df.to_csv(filename, index=False, encoding='utf-8')
+        with open(filename, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=['text', 'intent', 'language'])
+            writer.writeheader()
+            writer.writerows(self.training_data)
         print(f"CSV dataset saved to {filename}")
         return filename
     
     def get_statistics(self):
         """Get dataset statistics"""
-        df = pd.DataFrame(self.training_data)
-        stats = {
-            "total_samples": len(df),
-            "intents": df['intent'].value_counts().to_dict(),
-            "languages": df['language'].value_counts().to_dict(),
-            "intent_by_language": df.groupby(['intent', 'language']).size().to_dict()
+        return DatasetStatistics().consume(self.training_data).report()
+    
+    def load_augmentation_sources(self, formulary_file="medical_dataset_final.json"):
+        """تحميل مصادر التوليد: الألفاظ العامية وأسماء الأدوية"""
+        # عكس قاموس العامية: الكلمة الفصحى -> صيغها العامية
+        self.slang_variants = {}
+        try:
+            from main import AdvancedSymptomParser
+            for slang, formal in AdvancedSymptomParser().slang_normalization.items():
+                if slang != formal:
+                    self.slang_variants.setdefault(formal, []).append(slang)
+        except ImportError as e:
+            print(f"Slang augmentation disabled: {e}")
+
+        self.drug_names = {'ar': [], 'en': []}
+        if os.path.exists(formulary_file):
+            with open(formulary_file, 'r', encoding='utf-8') as f:
+                drug_database = json.load(f).get('drug_database', {})
+            for drug_info in drug_database.values():
+                self.drug_names['ar'].append(drug_info.get('name_ar', ''))
+                self.drug_names['en'].append(drug_info.get('name_en', ''))
+                for brand in drug_info.get('brand_names', []):
+                    language = 'ar' if any('\u0600' <= ch <= '\u06ff' for ch in brand) else 'en'
+                    self.drug_names[language].append(brand)
+        self.drug_names = {language: sorted(set(filter(None, names))) for language, names in self.drug_names.items()}
+        self.all_drug_names = sorted(self.drug_names['ar'] + self.drug_names['en'], key=len, reverse=True)
+
+    def swap_drug_name(self, text, language, rng):
+        """استبدال اسم الدواء (أو العبارة العامة) باسم دواء آخر من القاعدة"""
+        names = self.drug_names.get(language) or self.drug_names.get('en')
+        if not names:
+            return text
+        lowered = text.lower()
+        for name in self.all_drug_names + DRUG_PLACEHOLDERS:
+            start = lowered.find(name.lower())
+            if start >= 0:
+                return text[:start] + rng.choice(names) + text[start + len(name):]
+        return text
+
+    def inject_slang(self, text, rng):
+        candidates = [formal for formal in self.slang_variants if formal in text]
+        if not candidates:
+            return text
+        formal = rng.choice(candidates)
+        return text.replace(formal, rng.choice(self.slang_variants[formal]), 1)
+
+    @staticmethod
+    def inject_typo(text, rng):
+        """خطأ إملائي واحد: حذف أو تكرار أو تبديل حرفين متجاورين"""
+        positions = [i for i, ch in enumerate(text) if ch.isalpha()]
+        if len(positions) < 3:
+            return text
+        i = rng.choice(positions[:-1])
+        operation = rng.randrange(3)
+        if operation == 0:
+            return text[:i] + text[i + 1:]
+        if operation == 1:
+            return text[:i] + text[i] + text[i:]
+        return text[:i] + text[i + 1] + text[i] + text[i + 2:]
+
+    @staticmethod
+    def to_arabizi(text):
+        return ''.join(ARABIZI_MAP.get(ch, ch) for ch in text)
+
+    @staticmethod
+    def add_diacritics_noise(text, rng, rate=0.15):
+        noisy = []
+        for ch in text:
+            noisy.append(ch)
+            if '\u0621' <= ch <= '\u064a' and rng.random() < rate:
+                noisy.append(TATWEEL if rng.random() < 0.2 else rng.choice(ARABIC_DIACRITICS))
+        return ''.join(noisy)
+
+    def augment(self, sample, rng, augment_prob=0.5):
+        """توليد نسخة معدلة من عينة واحدة بسلسلة تحويلات عشوائية"""
+        text, language = sample['text'], sample['language']
+        applied = []
+
+        if rng.random() < augment_prob:
+            swapped = self.swap_drug_name(text, language, rng)
+            if swapped != text:
+                text = swapped
+                applied.append('drug_swap')
+        if language == 'ar' and rng.random() < augment_prob:
+            slang = self.inject_slang(text, rng)
+            if slang != text:
+                text = slang
+                applied.append('slang')
+        if rng.random() < augment_prob / 2:
+            text = self.inject_typo(text, rng)
+            applied.append('typo')
+        if language == 'ar':
+            roll = rng.random()
+            if roll < augment_prob / 4:
+                text = self.to_arabizi(text)
+                applied.append('arabizi')
+            elif roll < augment_prob / 2:
+                text = self.add_diacritics_noise(text, rng)
+                applied.append('diacritics')
+
+        return {
+            'text': text,
+            'intent': sample['intent'],
+            'language': language,
+            'augmentations': ','.join(applied)
         }
-        return stats
 
-if __name__ == "__main__":
+    def iter_augmented(self, num_rows, seed=42, augment_prob=0.5):
+        """مولّد كسول لعينات معززة (ذاكرة ثابتة مهما كان العدد)"""
+        if not hasattr(self, 'slang_variants'):
+            self.load_augmentation_sources()
+        rng = random.Random(seed)
+        for _ in range(num_rows):
+            yield self.augment(rng.choice(self.training_data), rng, augment_prob)
+
+    def write_shards(self, output_dir, num_rows, shard_size=100_000, seed=42, file_format="jsonl",
+                     augment_prob=0.5):
+        """كتابة بيانات معززة في ملفات مجزأة (JSONL أو Parquet) بذاكرة محدودة"""
+        os.makedirs(output_dir, exist_ok=True)
+        paths = []
+
+        for shard, start in enumerate(range(0, num_rows, shard_size)):
+            rows = self.iter_augmented(min(shard_size, num_rows - start), seed * 1_000_003 + shard, augment_prob)
+            path = os.path.join(output_dir, f"shard-{shard:05d}.{file_format}")
+
+            if file_format == 'jsonl':
+                with open(path, 'w', encoding='utf-8') as f:
+                    for row in rows:
+                        f.write(json.dumps(row, ensure_ascii=False) + '\n')
+            elif file_format == 'parquet':
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+
+                schema = pa.schema([(column, pa.string()) for column in ('text', 'intent', 'language', 'augmentations')])
+                with pq.ParquetWriter(path, schema) as writer:
+                    batch = []
+                    for row in rows:
+                        batch.append(row)
+                        if len(batch) == 10_000:
+                            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                            batch = []
+                    if batch:
+                        writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+            else:
+                raise ValueError(f"Unsupported format: {file_format}")
+
+            paths.append(path)
+            print(f"Shard saved to {path}")
+
+        return paths
+
+def main():
+    parser = argparse.ArgumentParser(description="بناء بيانات تدريب طبية ثنائية اللغة")
+    parser.add_argument('--rows', type=int, default=0, help="عدد العينات المعززة (0 = البيانات الأساسية فقط)")
+    parser.add_argument('--shard-size', type=int, default=100_000)
+    parser.add_argument('--format', choices=['jsonl', 'parquet'], default='jsonl')
+    parser.add_argument('--output-dir', default='augmented_dataset')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
     # Create dataset
     builder = MedicalDatasetBuilder()
-    
+
+    if args.rows:
+        builder.write_shards(args.output_dir, args.rows, args.shard_size, args.seed, args.format)
+        return
+
     # Save files
     builder.save_dataset()
     builder.create_csv_dataset()
@@ -107,3 +284,6 @@ if __name__ == "__main__":
     print(f"Total samples: {stats['total_samples']}")
     print(f"Intents: {stats['intents']}")
     print(f"Languages: {stats['languages']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+import argparse
+import glob
+import hashlib
+import json
+import math
+import os
+import re
+from collections import Counter
+from typing import Dict, Iterable, Iterator
+
+# الحركات والتطويل تُحذف قبل كشف التكرار التقريبي
+_NOISE_PATTERN = re.compile('[\u064b-\u0652\u0640]')
+_SPACE_PATTERN = re.compile(r'\s+')
+
+class HyperLogLog:
+    """تقدير عدد العناصر المميزة بذاكرة ثابتة (2^p بايت)"""
+
+    def __init__(self, p: int = 14):
+        self.p = p
+        self.m = 1 << p
+        self.registers = bytearray(self.m)
+        self.alpha = 0.7213 / (1 + 1.079 / self.m)
+
+    def add(self, value: str):
+        x = int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'big')
+        idx = x >> (64 - self.p)
+        rest = x & ((1 << (64 - self.p)) - 1)
+        rank = (64 - self.p) - rest.bit_length() + 1
+        if rank > self.registers[idx]:
+            self.registers[idx] = rank
+
+    def merge(self, other: 'HyperLogLog'):
+        for i, rank in enumerate(other.registers):
+            if rank > self.registers[i]:
+                self.registers[i] = rank
+
+    def count(self) -> int:
+        estimate = self.alpha * self.m * self.m / sum(2.0 ** -rank for rank in self.registers)
+        zeros = self.registers.count(0)
+        # تصحيح المدى الصغير (linear counting)
+        if estimate <= 2.5 * self.m and zeros:
+            estimate = self.m * math.log(self.m / zeros)
+        return int(round(estimate))
+
+def normalize_for_dedup(text: str) -> str:
+    return _SPACE_PATTERN.sub(' ', _NOISE_PATTERN.sub('', text.lower())).strip()
+
+def iter_rows(paths: Iterable[str]) -> Iterator[Dict]:
+    """قراءة العينات من ملفات JSON/JSONL/Parquet (أو مجلدات منها) دون تحميلها كاملة"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(
+                glob.glob(os.path.join(path, '*.jsonl')) + glob.glob(os.path.join(path, '*.parquet'))
+            ))
+        else:
+            files.extend(sorted(glob.glob(path)) or [path])
+
+    for file_path in files:
+        if file_path.endswith('.parquet'):
+            import pyarrow.parquet as pq
+
+            parquet_file = pq.ParquetFile(file_path)
+            for batch in parquet_file.iter_batches(columns=['text', 'intent', 'language']):
+                yield from batch.to_pylist()
+        elif file_path.endswith('.jsonl'):
+            with open(file_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+        else:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                yield from json.load(f)
+
+class DatasetStatistics:
+    """إحصائيات البيانات بمرور واحد: عدادات صغيرة + رسم بياني للأطوال + HyperLogLog"""
+
+    def __init__(self, max_length_bucket: int = 128, hll_precision: int = 14):
+        self.total = 0
+        self.intents = Counter()
+        self.languages = Counter()
+        self.intent_by_language = Counter()
+        self.token_lengths = Counter()
+        self.max_length_bucket = max_length_bucket
+        self.distinct_texts = HyperLogLog(hll_precision)
+        self.distinct_normalized = HyperLogLog(hll_precision)
+
+    def update(self, row: Dict):
+        text, intent, language = row['text'], row['intent'], row['language']
+        self.total += 1
+        self.intents[intent] += 1
+        self.languages[language] += 1
+        self.intent_by_language[(intent, language)] += 1
+        self.token_lengths[min(len(text.split()), self.max_length_bucket)] += 1
+        self.distinct_texts.add(text)
+        self.distinct_normalized.add(normalize_for_dedup(text))
+
+    def consume(self, rows: Iterable[Dict]) -> 'DatasetStatistics':
+        for row in rows:
+            self.update(row)
+        return self
+
+    def length_percentile(self, q: float) -> int:
+        target = q * self.total
+        seen = 0
+        for length in sorted(self.token_lengths):
+            seen += self.token_lengths[length]
+            if seen >= target:
+                return length
+        return 0
+
+    def imbalance(self) -> Dict:
+        counts = list(self.intents.values())
+        if not counts:
+            return {'max_min_ratio': 0.0, 'normalized_entropy': 0.0}
+        probs = [count / self.total for count in counts]
+        entropy = -sum(p * math.log(p) for p in probs)
+        return {
+            'max_min_ratio': max(counts) / min(counts),
+            'normalized_entropy': entropy / math.log(len(counts)) if len(counts) > 1 else 1.0
+        }
+
+    def report(self) -> Dict:
+        distinct = min(self.distinct_texts.count(), self.total)
+        distinct_normalized = min(self.distinct_normalized.count(), self.total)
+        return {
+            "total_samples": self.total,
+            "intents": dict(self.intents.most_common()),
+            "languages": dict(self.languages.most_common()),
+            "intent_by_language": dict(sorted(self.intent_by_language.items())),
+            "token_length_histogram": dict(sorted(self.token_lengths.items())),
+            "token_length_p50": self.length_percentile(0.5),
+            "token_length_p95": self.length_percentile(0.95),
+            "distinct_texts": distinct,
+            "duplicate_rate": 1 - distinct / self.total if self.total else 0.0,
+            "near_duplicate_rate": 1 - distinct_normalized / self.total if self.total else 0.0,
+            "class_imbalance": self.imbalance()
+        }
+
+def print_report(stats: Dict):
+    print(f"Total samples: {stats['total_samples']}")
+    print(f"Distinct texts (approx.): {stats['distinct_texts']}")
+    print(f"Duplicate rate: {stats['duplicate_rate']:.2%}  (after normalization: {stats['near_duplicate_rate']:.2%})")
+    print(f"Class imbalance: max/min={stats['class_imbalance']['max_min_ratio']:.2f}, "
+          f"normalized entropy={stats['class_imbalance']['normalized_entropy']:.3f}")
+
+    print("\nIntents:")
+    for intent, count in stats['intents'].items():
+        print(f"  {intent:<20} {count:>10} {count / stats['total_samples']:>7.2%}")
+    print("\nLanguages:")
+    for language, count in stats['languages'].items():
+        print(f"  {language:<20} {count:>10}")
+
+    print(f"\nToken lengths (p50={stats['token_length_p50']}, p95={stats['token_length_p95']}):")
+    peak = max(stats['token_length_histogram'].values(), default=1)
+    for length, count in stats['token_length_histogram'].items():
+        print(f"  {length:>4} {count:>10} {'#' * max(1, round(40 * count / peak))}")
+
+def main():
+    parser = argparse.ArgumentParser(description="إحصائيات بيانات التدريب بمرور واحد")
+    parser.add_argument('paths', nargs='+', help="ملفات JSON/JSONL/Parquet أو مجلدات الأجزاء")
+    parser.add_argument('--json', action='store_true', help="طباعة التقرير بصيغة JSON")
+    args = parser.parse_args()
+
+    stats = DatasetStatistics().consume(iter_rows(args.paths)).report()
+    if args.json:
+        stats['intent_by_language'] = {f"{intent}/{language}": count
+                                       for (intent, language), count in stats['intent_by_language'].items()}
+        print(json.dumps(stats, ensure_ascii=False, indent=2))
+    else:
+        print_report(stats)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+import argparse
+import hashlib
+import json
+import os
+import random
+import zlib
+from array import array
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from dataset_stats import iter_rows, normalize_for_dedup
+
+_MERSENNE_PRIME = (1 << 31) - 1
+
+class MinHasher:
+    """توقيع MinHash لمجموعة char n-grams لكل نص"""
+
+    def __init__(self, num_perm: int = 128, ngram: int = 3, seed: int = 1):
+        rng = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self.ngram = ngram
+        # كل القيم أقل من العدد الأولي (31 بت) فلا يتجاوز a*x+b حدود 64 بت
+        self.a = rng.randint(1, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+        self.b = rng.randint(0, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+
+    def shingles(self, text: str) -> np.ndarray:
+        text = f" {normalize_for_dedup(text)} "
+        grams = {text[i:i + self.ngram] for i in range(max(len(text) - self.ngram + 1, 1))}
+        return np.fromiter((zlib.crc32(gram.encode('utf-8')) % _MERSENNE_PRIME for gram in grams), dtype=np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        hashes = self.shingles(text)
+        permuted = (np.outer(hashes, self.a) + self.b) % _MERSENNE_PRIME
+        return permuted.min(axis=0)
+
+class NearDuplicateIndex:
+    """فهرس LSH للنصوص شبه المتطابقة: نصان متشابهان إذا تشاركا band واحداً على الأقل
+
+    bands × rows = num_perm، وحد التشابه التقريبي (1/bands)^(1/rows).
+    لا تُخزن النصوص ولا التوقيعات ولا قواميس buckets: كل نص = bands مفتاحاً (8 بايت لكل مفتاح)
+    في مصفوفة واحدة متصلة، والتجميع وقياس التسرب فرز وبحث على أعمدتها بـ numpy.
+    """
+
+    def __init__(self, num_perm: int = 128, bands: int = 16, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.hasher = MinHasher(num_perm, seed=seed)
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.keys = array('Q')
+
+    def __len__(self) -> int:
+        return len(self.keys) // self.bands
+
+    def band_keys(self, text: str) -> List[int]:
+        signature = self.hasher.signature(text)
+        keys = []
+        for band in range(self.bands):
+            chunk = signature[band * self.rows:(band + 1) * self.rows].tobytes()
+            digest = hashlib.blake2b(chunk, digest_size=7, person=band.to_bytes(2, 'big')).digest()
+            keys.append(int.from_bytes(digest, 'big'))
+        return keys
+
+    def add(self, text: str) -> int:
+        """إضافة نص وإرجاع رقمه"""
+        self.keys.extend(self.band_keys(text))
+        return len(self) - 1
+
+    def key_matrix(self) -> np.ndarray:
+        """مفاتيح كل النصوص: صف لكل نص وعمود لكل band (بدون نسخ)"""
+        return np.frombuffer(self.keys, dtype=np.uint64).reshape(-1, self.bands)
+
+    def group_ids(self) -> List[int]:
+        """رقم المجموعة لكل نص = أصغر رقم نص متصل به عبر bands مشتركة"""
+        keys = self.key_matrix()
+        count = len(keys)
+        if not count:
+            return []
+        groups = np.arange(count)
+        # لكل band: ترتيب الصفوف حسب المفتاح وبدايات كل مجموعة مفاتيح متساوية
+        runs = []
+        for band in range(self.bands):
+            order = np.argsort(keys[:, band], kind='stable')
+            column = keys[order, band]
+            starts = np.flatnonzero(np.concatenate(([True], column[1:] != column[:-1])))
+            runs.append((order, starts, np.diff(np.append(starts, count))))
+
+        # كل صف يأخذ أصغر رقم في مجموعاته، ثم قفز المؤشرات حتى لا يتغير شيء
+        while True:
+            previous = groups.copy()
+            for order, starts, sizes in runs:
+                groups[order] = np.repeat(np.minimum.reduceat(groups[order], starts), sizes)
+            while True:
+                jumped = groups[groups]
+                if np.array_equal(jumped, groups):
+                    break
+                groups = jumped
+            if np.array_equal(groups, previous):
+                return groups.tolist()
+
+def split_leakage(keys: np.ndarray, is_test: np.ndarray) -> float:
+    """نسبة صفوف الاختبار التي تشارك صفاً من التدريب band واحداً على الأقل"""
+    test, train = keys[is_test], keys[~is_test]
+    if not len(test):
+        return 0.0
+    leaked = np.zeros(len(test), dtype=bool)
+    for band in range(keys.shape[1]):
+        leaked |= np.isin(test[:, band], train[:, band])
+    return float(leaked.mean())
+
+def cluster_near_duplicates(texts: Iterable[str], num_perm: int = 128, bands: int = 16) -> List[int]:
+    """رقم المجموعة لكل نص (رقم أول نص في مجموعته)"""
+    index = NearDuplicateIndex(num_perm, bands)
+    for text in texts:
+        index.add(text)
+    return index.group_ids()
+
+def assign_groups(group_ids: Sequence[int], labels: Sequence, test_size: float = 0.2,
+                  random_state: int = 42) -> Dict[int, bool]:
+    """توزيع المجموعات كاملة على التدريب/الاختبار مع الحفاظ تقريباً على نسب الفئات
+
+    كل مجموعة تُنسب لفئتها الغالبة، وتُضاف للاختبار ما دامت فئتها لم تبلغ حصتها.
+    """
+    group_sizes = Counter(group_ids)
+    group_labels = defaultdict(Counter)
+    for group_id, label in zip(group_ids, labels):
+        group_labels[group_id][label] += 1
+
+    label_totals = Counter(labels)
+    test_counts = Counter()
+    groups = sorted(group_sizes)
+    random.Random(random_state).shuffle(groups)
+
+    is_test = {}
+    for group_id in groups:
+        label = group_labels[group_id].most_common(1)[0][0]
+        target = test_size * label_totals[label]
+        is_test[group_id] = test_counts[label] + group_sizes[group_id] / 2 <= target
+        if is_test[group_id]:
+            test_counts[label] += group_sizes[group_id]
+    return is_test
+
+def leakage_rate(train_texts: Iterable[str], test_texts: Iterable[str], num_perm: int = 128,
+                 bands: int = 16) -> float:
+    """نسبة عينات الاختبار التي لها نص شبه مطابق في التدريب"""
+    index = NearDuplicateIndex(num_perm, bands)
+    for text in train_texts:
+        index.add(text)
+    train_count = len(index)
+    for text in test_texts:
+        index.add(text)
+    return split_leakage(index.key_matrix(), np.arange(len(index)) >= train_count)
+
+def group_train_test_split(texts: List[str], labels: List, test_size: float = 0.2, random_state: int = 42,
+                           report: Optional[Dict] = None):
+    """بديل train_test_split يضمن أن النصوص شبه المتطابقة في نفس الجهة"""
+    group_ids = cluster_near_duplicates(texts)
+    is_test = assign_groups(group_ids, labels, test_size, random_state)
+
+    X_train, X_test, y_train, y_test = [], [], [], []
+    for text, label, group_id in zip(texts, labels, group_ids):
+        if is_test[group_id]:
+            X_test.append(text)
+            y_test.append(label)
+        else:
+            X_train.append(text)
+            y_train.append(label)
+
+    if report is not None:
+        report['rows'] = len(texts)
+        report['groups'] = len(is_test)
+        report['duplicate_rows'] = len(texts) - len(is_test)
+        report['leakage_rate'] = leakage_rate(X_train, X_test)
+    return X_train, X_test, y_train, y_test
+
+def main():
+    parser = argparse.ArgumentParser(description="إزالة التكرار التقريبي وتقسيم البيانات حسب المجموعات")
+    parser.add_argument('paths', nargs='+', help="ملفات JSON/JSONL/Parquet أو مجلدات الأجزاء")
+    parser.add_argument('--output-dir', default='split_dataset')
+    parser.add_argument('--test-size', type=float, default=0.2)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--bands', type=int, default=16)
+    parser.add_argument('--num-perm', type=int, default=128)
+    args = parser.parse_args()
+
+    # المرور الأول: التجميع مع الاحتفاظ بالفئات فقط (لا النصوص)
+    index = NearDuplicateIndex(args.num_perm, args.bands)
+    labels = []
+    for row in iter_rows(args.paths):
+        index.add(row['text'])
+        labels.append(row['intent'])
+    group_ids = index.group_ids()
+    is_test = assign_groups(group_ids, labels, args.test_size, args.seed)
+    del labels
+
+    # المرور الثاني: كتابة كل عينة في جهتها، مع قياس التسرب مقابل تقسيم عشوائي من مفاتيح المرور الأول
+    os.makedirs(args.output_dir, exist_ok=True)
+    rng = random.Random(args.seed)
+    group_test = np.zeros(len(group_ids), dtype=bool)
+    random_test = np.zeros(len(group_ids), dtype=bool)
+    counts = Counter()
+    with open(os.path.join(args.output_dir, 'train.jsonl'), 'w', encoding='utf-8') as train_file, \
+            open(os.path.join(args.output_dir, 'test.jsonl'), 'w', encoding='utf-8') as test_file:
+        for row_id, (row, group_id) in enumerate(zip(iter_rows(args.paths), group_ids)):
+            split = 'test' if is_test[group_id] else 'train'
+            counts[split] += 1
+            (test_file if split == 'test' else train_file).write(json.dumps(row, ensure_ascii=False) + '\n')
+            group_test[row_id] = split == 'test'
+            random_test[row_id] = rng.random() < args.test_size
+
+    keys = index.key_matrix()
+    groups = len(is_test)
+    rows = len(group_ids)
+    print(f"Rows: {rows}, near-duplicate groups: {groups} ({1 - groups / max(rows, 1):.2%} redundant)")
+    print(f"Train: {counts['train']}, Test: {counts['test']}")
+    print(f"Leakage with random split: {split_leakage(keys, random_test):.2%}")
+    print(f"Leakage with group split: {split_leakage(keys, group_test):.2%}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+import hashlib
+import json
+import os
+from typing import Callable, Dict, List, Mapping, Optional, Union
+
+from arabic_normalizer import tokenize
+from query_analysis import Lexicon, QueryAnalysis, analyze
+
+class DrugOntology:
+    """تصنيف هرمي للأدوية (شبيه بـ ATC) مع عضوية مخزنة كـ bitsets
+
+    كل فئة لها bitset بأرقام الأدوية المنتمية لها أو لأي فئة فرعية منها،
+    وكل دواء له bitset بأرقام فئاته وأسلافها، فتصبح أسئلة الفئات تقاطعات أعداد صحيحة.
+    """
+
+    def __init__(self, classes: Dict[str, Dict], members: Dict[str, List[str]], version: str = '',
+                 membership_wording: Optional[Dict[str, List[str]]] = None):
+        self.version = version
+        # نسخة المحتوى: أي تعديل على الفئات أو الأعضاء يغير ما يُبنى منها (مثل جدول التداخلات)
+        self.content_version = hashlib.sha1(
+            json.dumps([classes, members], sort_keys=True, ensure_ascii=False).encode('utf-8')
+        ).hexdigest()[:12]
+        self.classes = classes
+        self.class_ids = {code: idx for idx, code in enumerate(classes)}
+        self.class_codes = list(classes)
+        self.drug_ids = {drug: idx for idx, drug in enumerate(members)}
+        self.drug_keys = list(members)
+
+        self.aliases = {}
+        for code, info in classes.items():
+            for alias in [info.get('name_ar', ''), info.get('name_en', '')] + info.get('aliases', []):
+                if alias:
+                    self.aliases.setdefault(alias.lower(), code)
+        # أسماء الفئات كعبارات كلمات مطبعة لإيجادها داخل السؤال
+        self.class_phrases = Lexicon((alias, alias) for alias in self.aliases)
+
+        # صيغة سؤال الانتماء: عبارة صريحة، أو أداة سؤال في البداية يتبعها "a/an/من"
+        wording = membership_wording or {}
+        self.question_words = {token for word in wording.get('questions', []) for token in tokenize(word)}
+        self.membership_markers = {token for word in wording.get('markers', []) for token in tokenize(word)}
+        self.membership_phrases = Lexicon((phrase, phrase) for phrase in wording.get('phrases', []))
+
+        # أسلاف كل فئة (تشمل الفئة نفسها) كـ bitset
+        self.ancestors = [0] * len(self.class_codes)
+        for code, idx in self.class_ids.items():
+            current = code
+            while current:
+                self.ancestors[idx] |= 1 << self.class_ids[current]
+                current = classes[current].get('parent')
+
+        self.class_members = [0] * len(self.class_codes)
+        self.drug_classes = [0] * len(self.drug_keys)
+        self.direct_classes = [0] * len(self.drug_keys)
+        for drug, codes in members.items():
+            drug_id = self.drug_ids[drug]
+            for code in codes:
+                class_id = self.class_ids[code]
+                self.direct_classes[drug_id] |= 1 << class_id
+                self.drug_classes[drug_id] |= self.ancestors[class_id]
+            for class_id in self._bits(self.drug_classes[drug_id]):
+                self.class_members[class_id] |= 1 << drug_id
+
+    @classmethod
+    def load(cls, path: str = 'drug_classes.json') -> 'DrugOntology':
+        """تحميل التصنيف من ملف البيانات"""
+        if not os.path.exists(path):
+            return cls({}, {})
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(data.get('classes', {}), data.get('members', {}), data.get('version', ''),
+                   data.get('membership_wording'))
+
+    @staticmethod
+    def _bits(bitset: int) -> List[int]:
+        indices = []
+        while bitset:
+            low = bitset & -bitset
+            indices.append(low.bit_length() - 1)
+            bitset ^= low
+        return indices
+
+    def resolve_class(self, text: str) -> Optional[str]:
+        """إرجاع رمز الفئة من اسمها أو أحد أسمائها البديلة"""
+        text = text.lower().strip()
+        if text in self.aliases:
+            return self.aliases[text]
+        if text.upper() in self.class_ids:
+            return text.upper()
+        return None
+
+    def mentioned_class(self, query: Union[str, QueryAnalysis]) -> Optional[str]:
+        """الفئة المذكورة في السؤال (أطول اسم فئة فيه)"""
+        analysis = query if isinstance(query, QueryAnalysis) else analyze(query)
+        for _, _, _, phrase in sorted(self.class_phrases.hits(analysis.tokens), key=lambda hit: (-hit[1], hit[2])):
+            code = self.resolve_class(phrase)
+            if code:
+                return code
+        return None
+
+    def asks_membership(self, query: Union[str, QueryAnalysis]) -> bool:
+        """هل السؤال عن انتماء الدواء للفئة ("is X a …" / "هل X من …") وليس عن جمعهما؟"""
+        tokens = (query if isinstance(query, QueryAnalysis) else analyze(query)).tokens
+        if self.membership_phrases.hits(tokens):
+            return True
+        return bool(tokens) and tokens[0] in self.question_words and any(
+            token in self.membership_markers for token in tokens[1:]
+        )
+
+    def class_info(self, code: str) -> Dict:
+        return self.classes.get(code, {})
+
+    def is_member(self, drug: str, code: str) -> bool:
+        """هل الدواء ينتمي للفئة أو لأي فئة فرعية منها؟"""
+        drug_id, class_id = self.drug_ids.get(drug), self.class_ids.get(code)
+        if drug_id is None or class_id is None:
+            return False
+        return bool(self.class_members[class_id] >> drug_id & 1)
+
+    def members(self, code: str) -> List[str]:
+        class_id = self.class_ids.get(code)
+        if class_id is None:
+            return []
+        return [self.drug_keys[drug_id] for drug_id in self._bits(self.class_members[class_id])]
+
+    def classes_of(self, drug: str, include_ancestors: bool = True) -> List[str]:
+        drug_id = self.drug_ids.get(drug)
+        if drug_id is None:
+            return []
+        bitset = self.drug_classes[drug_id] if include_ancestors else self.direct_classes[drug_id]
+        return [self.class_codes[class_id] for class_id in self._bits(bitset)]
+
+    def same_class_alternatives(self, drug: str) -> List[str]:
+        """الأدوية التي تشارك الدواء في فئته المباشرة"""
+        drug_id = self.drug_ids.get(drug)
+        if drug_id is None:
+            return []
+        bitset = 0
+        for class_id in self._bits(self.direct_classes[drug_id]):
+            bitset |= self.class_members[class_id]
+        bitset &= ~(1 << drug_id)
+        return [self.drug_keys[other] for other in self._bits(bitset)]
+
+    def alternative_names(self, drug: str, language: str, lookup: Callable[[str], Optional[Mapping]]) -> List[str]:
+        """أسماء بدائل نفس الفئة بلغة الرد (فقط الأدوية الموجودة في قاعدة الأدوية)"""
+        names = []
+        for other in self.same_class_alternatives(drug):
+            info = lookup(other)
+            if info and info.get(f'name_{language}'):
+                names.append(info[f'name_{language}'])
+        return names
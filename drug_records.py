@@ -0,0 +1,267 @@
+import argparse
+import sys
+import time
+import tracemalloc
+from array import array
+from collections.abc import Mapping
+from typing import Dict, Iterator, Tuple
+
+_MISSING = 0xFFFFFFFF
+
+def _compact(value):
+    """نصوص مدمجة (interned) وقوائم محولة إلى tuples"""
+    if isinstance(value, str):
+        return sys.intern(value)
+    if isinstance(value, list):
+        return tuple(_compact(item) for item in value)
+    return value
+
+def _freeze(value):
+    return tuple(value) if isinstance(value, list) else value
+
+class _RecordMixin:
+    """مقارنة السجلات المضغوطة مع القواميس العادية (القوائم تساوي الـ tuples)"""
+
+    __slots__ = ()
+
+    def __eq__(self, other):
+        if not isinstance(other, Mapping) or len(self) != len(other):
+            return NotImplemented if not isinstance(other, Mapping) else False
+        return all(key in other and _freeze(other[key]) == value for key, value in self.items())
+
+    __hash__ = None
+
+    def to_dict(self) -> Dict:
+        return {key: list(value) if isinstance(value, tuple) else value for key, value in self.items()}
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+class DrugRecord(_RecordMixin, Mapping):
+    """سجل دواء مضغوط: مخطط مفاتيح مشترك + tuple واحد للقيم بدل قاموس لكل دواء"""
+
+    __slots__ = ('_schema', '_values')
+
+    # كل مجموعة مفاتيح تُخزن مرة واحدة وتتشاركها كل السجلات
+    _schemas: Dict[Tuple[str, ...], Dict[str, int]] = {}
+
+    def __init__(self, schema: Dict[str, int], values: tuple):
+        self._schema = schema
+        self._values = values
+
+    @classmethod
+    def from_dict(cls, drug_info: Dict) -> 'DrugRecord':
+        keys = tuple(sys.intern(key) for key in drug_info)
+        schema = cls._schemas.get(keys)
+        if schema is None:
+            schema = cls._schemas.setdefault(keys, {key: idx for idx, key in enumerate(keys)})
+        return cls(schema, tuple(_compact(value) for value in drug_info.values()))
+
+    def __getitem__(self, key):
+        return self._values[self._schema[key]]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._schema)
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+class DrugTable(Mapping):
+    """مخزن عمودي للأدوية: كل حقل عمود مرمّز بقاموس قيم مشترك (dictionary encoding)
+
+    الحقول النصية: array من أرقام القيم. حقول القوائم: أرقام متتالية + offsets + علامة وجود.
+    الوصول بنمط القاموس يعيد DrugRow خفيفاً يفك الترميز عند الطلب.
+    """
+
+    def __init__(self):
+        self.keys_list = []
+        self.index = {}
+        self.pool = []
+        self._pool_ids = {}
+        self.scalar_columns = {}
+        self.list_columns = {}
+        self.field_order = []
+
+    @classmethod
+    def from_dicts(cls, drug_database: Dict[str, Dict]) -> 'DrugTable':
+        table = cls()
+        for drug_key, drug_info in drug_database.items():
+            table.add(drug_key, drug_info)
+        table._pool_ids = {}
+        return table
+
+    def _code(self, value) -> int:
+        key = (type(value), value)
+        code = self._pool_ids.get(key)
+        if code is None:
+            code = self._pool_ids[key] = len(self.pool)
+            self.pool.append(sys.intern(value) if isinstance(value, str) else value)
+        return code
+
+    def add(self, drug_key: str, drug_info: Dict):
+        row = len(self.keys_list)
+        self.keys_list.append(sys.intern(drug_key))
+        self.index[self.keys_list[-1]] = row
+
+        for field, value in drug_info.items():
+            if isinstance(value, list):
+                codes, offsets, present = self.list_columns.get(field) or self._new_list_column(field, row)
+                codes.extend(self._code(item) for item in value)
+                offsets.append(len(codes))
+                present.append(1)
+            else:
+                codes = self.scalar_columns.get(field) or self._new_scalar_column(field, row)
+                codes.append(self._code(value))
+
+        # الحقول الغائبة في هذا الدواء
+        for codes in self.scalar_columns.values():
+            if len(codes) == row:
+                codes.append(_MISSING)
+        for codes, offsets, present in self.list_columns.values():
+            if len(present) == row:
+                offsets.append(len(codes))
+                present.append(0)
+
+    def _new_scalar_column(self, field: str, rows: int) -> array:
+        self.field_order.append(sys.intern(field))
+        codes = self.scalar_columns[self.field_order[-1]] = array('I', [_MISSING] * rows)
+        return codes
+
+    def _new_list_column(self, field: str, rows: int) -> Tuple[array, array, bytearray]:
+        self.field_order.append(sys.intern(field))
+        column = self.list_columns[self.field_order[-1]] = (array('I'), array('I', [0] * (rows + 1)), bytearray(rows))
+        return column
+
+    def value(self, row: int, field: str, default=None):
+        codes = self.scalar_columns.get(field)
+        if codes is not None:
+            code = codes[row]
+            return default if code == _MISSING else self.pool[code]
+        column = self.list_columns.get(field)
+        if column is None:
+            return default
+        codes, offsets, present = column
+        if not present[row]:
+            return default
+        pool = self.pool
+        return tuple(pool[code] for code in codes[offsets[row]:offsets[row + 1]])
+
+    def has_value(self, row: int, field: str) -> bool:
+        codes = self.scalar_columns.get(field)
+        if codes is not None:
+            return codes[row] != _MISSING
+        column = self.list_columns.get(field)
+        return column is not None and bool(column[2][row])
+
+    def column(self, field: str) -> list:
+        """قراءة عمود كامل دفعة واحدة (للعمليات المجمعة)"""
+        return [self.value(row, field) for row in range(len(self.keys_list))]
+
+    def __getitem__(self, drug_key: str) -> 'DrugRow':
+        return DrugRow(self, self.index[drug_key])
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys_list)
+
+    def __len__(self) -> int:
+        return len(self.keys_list)
+
+    def __contains__(self, drug_key) -> bool:
+        return drug_key in self.index
+
+class DrugRow(_RecordMixin, Mapping):
+    """عرض دواء واحد من DrugTable بواجهة القاموس"""
+
+    __slots__ = ('_table', '_row')
+
+    def __init__(self, table: DrugTable, row: int):
+        self._table = table
+        self._row = row
+
+    def __getitem__(self, field: str):
+        if not self._table.has_value(self._row, field):
+            raise KeyError(field)
+        return self._table.value(self._row, field)
+
+    def get(self, field: str, default=None):
+        return self._table.value(self._row, field, default)
+
+    def __iter__(self) -> Iterator[str]:
+        return (field for field in self._table.field_order if self._table.has_value(self._row, field))
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+def compact_database(drug_database: Dict[str, Dict]) -> Dict[str, DrugRecord]:
+    """تحويل قاموس الأدوية إلى سجلات مضغوطة مع الحفاظ على الترتيب"""
+    return {sys.intern(drug_key): DrugRecord.from_dict(drug_info) for drug_key, drug_info in drug_database.items()}
+
+def synthetic_database(size: int, template: Dict[str, Dict]) -> Dict[str, Dict]:
+    """قاعدة أدوية مولدة بحجم كبير بنفس شكل القاعدة الحقيقية (أسماء فريدة ومفردات متكررة)"""
+    templates = list(template.values())
+    database = {}
+    for idx in range(size):
+        base = templates[idx % len(templates)]
+        drug_info = {}
+        for field, value in base.items():
+            if field in ('name_ar', 'name_en'):
+                drug_info[field] = f"{value} {idx}"
+            elif field == 'brand_names':
+                drug_info[field] = [f"{brand} {idx}" for brand in value]
+            elif isinstance(value, list):
+                # نسخ جديدة من النصوص كما يحدث عند قراءة JSON
+                drug_info[field] = [''.join(list(item)) for item in value]
+            elif isinstance(value, str):
+                drug_info[field] = ''.join(list(value))
+            else:
+                drug_info[field] = value
+        database[f"drug_{idx}"] = drug_info
+    return database
+
+def measure(build):
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - started
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current, elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description="مقارنة ذاكرة تمثيلات سجلات الأدوية")
+    parser.add_argument('--drugs', type=int, default=50_000)
+    parser.add_argument('--formulary', default='medical_dataset_final.json')
+    args = parser.parse_args()
+
+    import json
+    from main import DrugAPIHandler
+
+    with open(args.formulary, 'r', encoding='utf-8') as f:
+        template = json.load(f)['drug_database']
+    template.update({key: info.to_dict() for key, info in DrugAPIHandler().mock_drug_database.items()})
+
+    dicts, dict_bytes, dict_time = measure(lambda: synthetic_database(args.drugs, template))
+    records, record_bytes, record_time = measure(lambda: compact_database(synthetic_database(args.drugs, template)))
+    del records
+    table, table_bytes, table_time = measure(lambda: DrugTable.from_dicts(synthetic_database(args.drugs, template)))
+
+    keys = list(dicts)
+    started = time.perf_counter()
+    for key in keys:
+        dicts[key].get('warnings_en')
+    dict_access = (time.perf_counter() - started) / len(keys) * 1e9
+    started = time.perf_counter()
+    for key in keys:
+        table[key].get('warnings_en')
+    table_access = (time.perf_counter() - started) / len(keys) * 1e9
+
+    print(f"{args.drugs} drugs")
+    print(f"{'representation':<22} {'MB':>8} {'vs dict':>8} {'build s':>8}")
+    for name, size, elapsed in (('dict of dicts', dict_bytes, dict_time),
+                                ('DrugRecord (slots)', record_bytes, record_time),
+                                ('DrugTable (columnar)', table_bytes, table_time)):
+        print(f"{name:<22} {size / 1e6:>8.1f} {size / dict_bytes:>8.0%} {elapsed:>8.2f}")
+    print(f"Field access: dict {dict_access:.0f} ns, DrugTable {table_access:.0f} ns")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+import difflib
+from collections import Counter, defaultdict
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+# الكلمات المفتاحية للبحث في الاستخدامات (general_use)
+SEARCH_TERMS = [
+    # كلمات الصداع
+    'صداع', 'headache', 'رأس', 'head',
+    # كلمات الألم
+    'ألم', 'pain', 'وجع', 'ache',
+    # كلمات الحرارة
+    'حرارة', 'fever', 'سخونة', 'temperature',
+    # كلمات المضاد الحيوي
+    'التهاب', 'infection', 'بكتيريا', 'bacterial',
+    # كلمات عامة
+    'مسكن', 'painkiller', 'خافض', 'reducer'
+]
+
+class AhoCorasick:
+    """آلة Aho-Corasick لإيجاد كل الأنماط في النص بمرور واحد"""
+
+    def __init__(self, patterns: Dict[str, object]):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+
+        for pattern, value in patterns.items():
+            if not pattern:
+                continue
+            state = 0
+            for char in pattern:
+                next_state = self.goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self.goto)
+                    self.goto[state][char] = next_state
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                state = next_state
+            self.output[state].append((pattern, value))
+
+        # بناء روابط الفشل بالعرض (BFS)
+        queue = list(self.goto[0].values())
+        for state in queue:
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(char, 0)
+                if self.fail[next_state] == next_state:
+                    self.fail[next_state] = 0
+                self.output[next_state] = self.output[next_state] + self.output[self.fail[next_state]]
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, str, object]]:
+        """إرجاع (موقع النهاية، النمط، القيمة) لكل تطابق"""
+        state = 0
+        goto, fail, output = self.goto, self.fail, self.output
+        for position, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for pattern, value in output[state]:
+                yield position, pattern, value
+
+class NgramIndex:
+    """فهرس trigrams لتقليص المرشحين قبل حساب التشابه التقريبي"""
+
+    def __init__(self, keys):
+        self.postings = defaultdict(set)
+        for key in keys:
+            for gram in self.grams(key):
+                self.postings[gram].add(key)
+
+    @staticmethod
+    def grams(text: str) -> set:
+        padded = f"<{text}>"
+        return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+    def candidates(self, word: str, cutoff: float, limit: int = 32) -> List[str]:
+        """المرشحون الأكثر اشتراكاً في الـ trigrams بعد استبعاد ما لا يسمح طوله بالوصول للحد"""
+        shared = Counter()
+        for gram in self.grams(word):
+            shared.update(self.postings.get(gram, ()))
+        length = len(word)
+        # ترتيب ثابت عند التعادل (أبجدياً) حتى تتطابق النتائج مع الفهرس المبني مسبقاً
+        ranked = [
+            key for key, _ in sorted(shared.items(), key=lambda item: (-item[1], item[0]))
+            if 2 * min(length, len(key)) / (length + len(key)) >= cutoff
+        ]
+        return ranked[:limit]
+
+class DrugSearchIndex:
+    """فهرس مُجهز مسبقاً للبحث الذكي عن الأدوية بنفس أولوية المراحل الثلاث"""
+
+    def __init__(self, drug_synonyms: Dict[str, str], drug_database: Dict[str, Dict],
+                 normalize: Callable[[str], str], fuzzy_cutoff: float = 0.7, fuzzy_index=None):
+        self.normalize = normalize
+        self.drug_synonyms = drug_synonyms
+        self.fuzzy_cutoff = fuzzy_cutoff
+
+        # 1. أسماء الأدوية: الأولوية لترتيب الإدخال في drug_synonyms
+        synonym_ranks = {synonym: (rank, drug_key) for rank, (synonym, drug_key) in enumerate(drug_synonyms.items())}
+        # الصيغة المطبعة لكل اسم أيضاً، فـ"ادول" بلا همزة تطابق "أدول"
+        for synonym, entry in list(synonym_ranks.items()):
+            synonym_ranks.setdefault(normalize(synonym), entry)
+        self.empty_synonym = synonym_ranks.get('')
+        self.synonym_matcher = AhoCorasick(synonym_ranks)
+
+        # 2. فهرس مقلوب: كلمة مفتاحية -> أول دواء (بترتيب القاعدة) يذكرها في استخداماته
+        raw_terms, normalized_terms = {}, {}
+        for term in SEARCH_TERMS:
+            term_normalized = normalize(term)
+            for rank, (drug_key, drug_info) in enumerate(drug_database.items()):
+                use_ar = drug_info.get('general_use_ar', '').lower()
+                use_en = drug_info.get('general_use_en', '').lower()
+                if term in use_ar or term_normalized in normalize(use_ar) or term in use_en:
+                    entry = (rank, drug_key)
+                    raw_terms[term] = min(raw_terms.get(term, entry), entry)
+                    normalized_terms[term_normalized] = min(normalized_terms.get(term_normalized, entry), entry)
+                    break
+        self.raw_term_matcher = AhoCorasick(raw_terms)
+        self.normalized_term_matcher = AhoCorasick(normalized_terms)
+
+        # 3. فهرس n-grams للبحث التقريبي (أو نسخته المبنية مسبقاً من ملف الفهارس)
+        self.fuzzy_index = fuzzy_index or NgramIndex(drug_synonyms.keys())
+
+    def match_synonym(self, query_lower: str, query_normalized: str) -> Optional[str]:
+        best = self.empty_synonym
+        for text in (query_lower, query_normalized):
+            for _, _, entry in self.synonym_matcher.iter_matches(text):
+                if best is None or entry < best:
+                    best = entry
+        return best[1] if best else None
+
+    def match_use(self, query_lower: str, query_normalized: str) -> Optional[str]:
+        best = None
+        for matcher, text in ((self.raw_term_matcher, query_lower), (self.normalized_term_matcher, query_normalized)):
+            for _, _, entry in matcher.iter_matches(text):
+                if best is None or entry < best:
+                    best = entry
+        return best[1] if best else None
+
+    def match_fuzzy(self, query_lower: str) -> Optional[str]:
+        for word in query_lower.split():
+            if len(word) > 3:
+                candidates = self.fuzzy_index.candidates(word, self.fuzzy_cutoff)
+                matches = difflib.get_close_matches(word, candidates, n=1, cutoff=self.fuzzy_cutoff)
+                if matches:
+                    return self.drug_synonyms[matches[0]]
+        return None
+
+    def search(self, query: str) -> Optional[str]:
+        """البحث بنفس الأولوية: الأسماء ثم الاستخدامات ثم البحث التقريبي"""
+        query_normalized = self.normalize(query)
+        query_lower = query.lower()
+
+        return (self.match_synonym(query_lower, query_normalized)
+                or self.match_use(query_lower, query_normalized)
+                or self.match_fuzzy(query_lower))
@@ -0,0 +1,252 @@
+import hashlib
+import json
+import os
+import sys
+import threading
+from types import MappingProxyType
+from typing import Callable, Dict, Mapping, NamedTuple, Optional
+
+from drug_ontology import DrugOntology
+from drug_records import DrugTable
+from drug_search_index import AhoCorasick, DrugSearchIndex
+from index_artifact import DEFAULT_ARTIFACT, IndexArtifact
+from query_analysis import Lexicon
+from response_templates import ResponseRenderer
+from shared_formulary import content_version, publish
+from symptom_router import SymptomRouter
+
+# ترتيب فحص السلامة: الأطفال ثم الحمل ثم الطوارئ
+SAFETY_CATEGORIES = ('children', 'pregnancy', 'emergency')
+
+class FormularySnapshot(NamedTuple):
+    """نسخة كاملة وثابتة من قاعدة البيانات وكل الفهارس المبنية منها"""
+    version: int
+    formulary_version: str
+    drug_database: Mapping[str, Dict]
+    drug_synonyms: Mapping[str, str]
+    symptom_routing: Mapping[str, list]
+    safety_keywords: Mapping[str, Dict]
+    safety_matchers: Mapping[str, AhoCorasick]
+    search_index: DrugSearchIndex
+    symptom_router: SymptomRouter
+    renderer: ResponseRenderer
+    drug_lexicon: Lexicon
+    ontology: DrugOntology
+    safety_version: str
+    error: Optional[str] = None
+
+    def safety_category(self, text: str, language: str) -> Optional[str]:
+        return safety_category(self.safety_matchers, text, language)
+
+def safety_category(safety_matchers: Mapping[str, AhoCorasick], text: str, language: str) -> Optional[str]:
+    """أول فئة سلامة (حسب الأولوية) تظهر كلماتها في النص"""
+    matcher = safety_matchers.get(language)
+    if matcher is None:
+        return None
+    best = None
+    for _, _, priority in matcher.iter_matches(text):
+        if best is None or priority < best:
+            best = priority
+            if best == 0:
+                break
+    return SAFETY_CATEGORIES[best] if best is not None else None
+
+def build_drug_synonyms(drug_database: Dict[str, Dict]) -> Dict[str, str]:
+    """قائمة أسماء الأدوية التجارية والعلمية -> مفتاح الدواء"""
+    drug_synonyms = {}
+    for drug_key, drug_info in drug_database.items():
+        for brand in drug_info.get('brand_names', []):
+            drug_synonyms[sys.intern(brand.lower())] = drug_key
+        drug_synonyms[sys.intern(drug_info.get('name_ar', '').lower())] = drug_key
+        drug_synonyms[sys.intern(drug_info.get('name_en', '').lower())] = drug_key
+    return drug_synonyms
+
+def build_safety_matchers(safety_keywords: Dict[str, Dict]) -> Dict[str, AhoCorasick]:
+    """آلة Aho-Corasick لكل لغة تعيد أولوية فئة السلامة لكل كلمة"""
+    patterns = {}
+    for priority, category in enumerate(SAFETY_CATEGORIES):
+        for language, words in safety_keywords.get(category, {}).items():
+            language_patterns = patterns.setdefault(language, {})
+            for word in words:
+                language_patterns.setdefault(word, priority)
+    return {language: AhoCorasick(words) for language, words in patterns.items()}
+
+def build_snapshot(data: Dict, formulary_version: str, version: int, normalize: Callable[[str], str],
+                   previous: Optional[FormularySnapshot] = None, error: Optional[str] = None,
+                   artifact: Optional[IndexArtifact] = None, ontology: Optional[DrugOntology] = None) -> FormularySnapshot:
+    """بناء كل الفهارس من بيانات القاعدة (يُستدعى خارج مسار الطلبات)
+
+    إذا توفر ملف فهارس مبني من نفس النسخة، تُقرأ آلة السلامة وفهرس البحث التقريبي منه مباشرة.
+    """
+    symptom_routing = data.get('symptom_routing', {})
+    safety_keywords = data.get('safety_keywords', {})
+
+    # الجدول وقاموس الأسماء في ذاكرة مشتركة بين العمليات، وإلا تخزين عمودي خاص بالعملية
+    raw_database = data.get('drug_database', {})
+    drug_synonyms = build_drug_synonyms(raw_database)
+    shared = publish('formulary', formulary_version, raw_database, {'drug_synonyms': drug_synonyms}) if raw_database else None
+    if shared is not None:
+        drug_database = shared.drug_table()
+        drug_synonyms = shared.string_map('drug_synonyms')
+    else:
+        drug_database = DrugTable.from_dicts(raw_database)
+        drug_synonyms = MappingProxyType(drug_synonyms)
+    search_index = DrugSearchIndex(drug_synonyms, drug_database, normalize,
+                                   fuzzy_index=artifact.fuzzy_index() if artifact else None)
+    symptom_router = SymptomRouter(symptom_routing, search_index.search)
+    drug_lexicon = Lexicon(drug_synonyms.items())
+
+    # البدائل تبدأ بأدوية نفس الفئة من التصنيف
+    ontology = ontology or DrugOntology({}, {})
+    renderer = ResponseRenderer(
+        'compact', drug_database.get, formulary_version,
+        alternatives=lambda drug_key, language: ontology.alternative_names(drug_key, language, drug_database.get)
+    )
+    if previous is not None:
+        # الأدوية التي لم تتغير تحتفظ بردودها المولدة سابقاً
+        unchanged = [
+            drug_key for drug_key, drug_info in drug_database.items()
+            if previous.drug_database.get(drug_key) == drug_info
+        ]
+        renderer.reuse(previous.renderer, unchanged)
+    renderer.prerender(drug_database)
+
+    return FormularySnapshot(
+        version=version,
+        formulary_version=formulary_version,
+        drug_database=drug_database,
+        drug_synonyms=drug_synonyms,
+        symptom_routing=MappingProxyType(symptom_routing),
+        safety_keywords=MappingProxyType(safety_keywords),
+        safety_matchers=MappingProxyType(
+            artifact.safety_matchers() if artifact else build_safety_matchers(safety_keywords)
+        ),
+        search_index=search_index,
+        symptom_router=symptom_router,
+        renderer=renderer,
+        drug_lexicon=drug_lexicon,
+        ontology=ontology,
+        safety_version=content_version(safety_keywords),
+        error=error
+    )
+
+class FormularyReloader:
+    """مراقبة ملف قاعدة البيانات وإعادة بناء الفهارس في الخلفية
+
+    النسخة الجديدة تُبنى بالكامل ثم تُستبدل بإسناد مرجع واحد، فالطلبات الجارية
+    تكمل على النسخة القديمة ولا ترى أبداً فهرساً نصف مبني.
+    """
+
+    def __init__(self, path: str, normalize: Callable[[str], str], poll_interval: float = 2.0,
+                 artifact_path: str = DEFAULT_ARTIFACT, ontology_path: str = 'drug_classes.json'):
+        self.path = path
+        self.ontology = DrugOntology.load(ontology_path)
+        self.artifact_path = artifact_path
+        self.normalize = normalize
+        self.poll_interval = poll_interval
+        self._build_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._watcher = None
+        self._stat = None
+        self._snapshot = None
+        self.reload(force=True)
+
+    @property
+    def snapshot(self) -> FormularySnapshot:
+        return self._snapshot
+
+    @property
+    def version(self) -> int:
+        return self._snapshot.version
+
+    def _file_stat(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def reload(self, force: bool = False) -> bool:
+        """إعادة البناء إذا تغير الملف، وإرجاع True عند تبديل النسخة"""
+        with self._build_lock:
+            stat = self._file_stat()
+            if not force and stat == self._stat:
+                return False
+
+            previous = self._snapshot
+            version = previous.version + 1 if previous else 1
+            try:
+                if stat is None:
+                    raise FileNotFoundError(f"ملف قاعدة البيانات غير موجود: {self.path}")
+                with open(self.path, 'rb') as f:
+                    raw = f.read()
+                formulary_version = hashlib.sha1(raw).hexdigest()[:12]
+                if previous and not previous.error and formulary_version == previous.formulary_version:
+                    # تغير التوقيت فقط دون المحتوى
+                    self._stat = stat
+                    return False
+                artifact = IndexArtifact.open(self.artifact_path, formulary_version)
+                snapshot = build_snapshot(json.loads(raw.decode('utf-8')), formulary_version, version,
+                                          self.normalize, previous, artifact=artifact, ontology=self.ontology)
+            except Exception as e:
+                if previous and not previous.error:
+                    # ملف تالف: نبقي النسخة الحالية ونعيد المحاولة عند التعديل التالي
+                    self._stat = stat
+                    print(f"Formulary reload failed, keeping version {previous.version}: {e}")
+                    return False
+                snapshot = build_snapshot({}, 'empty', version, self.normalize, error=str(e))
+
+            self._stat = stat
+            self._snapshot = snapshot
+            return True
+
+    def start(self) -> 'FormularyReloader':
+        """تشغيل thread المراقبة (مرة واحدة)"""
+        if self._watcher is None:
+            self._watcher = threading.Thread(target=self._watch, name='formulary-reloader', daemon=True)
+            self._watcher.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+
+    def _after_fork(self):
+        # الـ threads لا تنتقل مع fork: أقفال جديدة وتشغيل المراقبة في العملية الابنة
+        self._build_lock = threading.Lock()
+        self._stopped = threading.Event()
+        if self._watcher is not None:
+            self._watcher = None
+            self.start()
+
+    def _watch(self):
+        while not self._stopped.wait(self.poll_interval):
+            try:
+                if self.reload():
+                    print(f"Formulary reloaded: version {self.version} ({self._snapshot.formulary_version})")
+            except Exception as e:
+                print(f"Formulary watcher error: {e}")
+
+_reloaders = {}
+_reloaders_lock = threading.Lock()
+
+def get_formulary_reloader(path: str, normalize: Callable[[str], str],
+                           poll_interval: float = 2.0) -> FormularyReloader:
+    """مراقب مشترك لكل ملف، حتى تتشارك كل الجلسات نفس النسخة ولا يُعاد البناء لكل جلسة"""
+    key = os.path.abspath(path)
+    with _reloaders_lock:
+        reloader = _reloaders.get(key)
+        if reloader is None:
+            reloader = FormularyReloader(path, normalize, poll_interval).start()
+            _reloaders[key] = reloader
+        return reloader
+
+def _after_fork_in_child():
+    global _reloaders_lock
+    _reloaders_lock = threading.Lock()
+    for reloader in _reloaders.values():
+        reloader._after_fork()
+
+os.register_at_fork(after_in_child=_after_fork_in_child)
@@ -0,0 +1,387 @@
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from collections.abc import Mapping
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from drug_search_index import AhoCorasick, NgramIndex
+
+MAGIC = b'MEDIDX\x00\x01'
+FORMAT_VERSION = 1
+DEFAULT_ARTIFACT = 'medical_index.bin'
+
+class ArtifactWriter:
+    """كتابة مصفوفات مسماة + جدول نصوص مرتب واحد في ملف ثنائي"""
+
+    def __init__(self):
+        self.strings = set()
+        self.arrays = {}
+
+    def add_strings(self, values):
+        self.strings.update(values)
+
+    def finalize_strings(self):
+        # الترتيب حسب بايتات UTF-8 يجعل مقارنة الأرقام = مقارنة النصوص
+        encoded = sorted(value.encode('utf-8') for value in self.strings)
+        self.string_ids = {value.decode('utf-8'): idx for idx, value in enumerate(encoded)}
+        offsets = array('I', [0])
+        for value in encoded:
+            offsets.append(offsets[-1] + len(value))
+        self.arrays['strings.blob'] = array('B', b''.join(encoded))
+        self.arrays['strings.offsets'] = offsets
+
+    def sid(self, value: str) -> int:
+        return self.string_ids[value]
+
+    def add_array(self, name: str, typecode: str, values):
+        self.arrays[name] = array(typecode, values)
+
+    def add_string_map(self, name: str, mapping: Dict[str, str]):
+        """قاموس نص -> نص: بترتيب الإدخال للمرور عليه، ومرتباً بأرقام المفاتيح للبحث"""
+        pairs = [(self.sid(key), self.sid(value)) for key, value in mapping.items()]
+        self.add_array(f'map.{name}.keys', 'I', [key for key, _ in pairs])
+        self.add_array(f'map.{name}.values', 'I', [value for _, value in pairs])
+        pairs.sort()
+        self.add_array(f'map.{name}.sorted_keys', 'I', [key for key, _ in pairs])
+        self.add_array(f'map.{name}.sorted_values', 'I', [value for _, value in pairs])
+
+    def write(self, path: str, metadata: Dict):
+        sections = {}
+        offset = 0
+        for name, values in self.arrays.items():
+            length = len(values) * values.itemsize
+            sections[name] = [offset, length, values.typecode]
+            offset += length + (-length % 8)
+
+        header = json.dumps({**metadata, 'format': FORMAT_VERSION, 'sections': sections},
+                            ensure_ascii=False).encode('utf-8')
+        header += b' ' * (-(len(MAGIC) + 4 + len(header)) % 8)
+
+        # كتابة ملف مؤقت ثم استبداله حتى لا تقرأ العمليات الأخرى ملفاً ناقصاً
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(MAGIC)
+            f.write(struct.pack('<I', len(header)))
+            f.write(header)
+            for values in self.arrays.values():
+                data = values.tobytes()
+                f.write(data)
+                f.write(b'\0' * (-len(data) % 8))
+        os.replace(tmp_path, path)
+
+class IndexArtifact:
+    """قراءة الملف عبر mmap: كل الفهارس views على صفحات الملف دون نسخ"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"Not an index artifact: {path}")
+        header_length = struct.unpack_from('<I', self._mmap, len(MAGIC))[0]
+        data_start = len(MAGIC) + 4 + header_length
+        self.header = json.loads(self._mmap[len(MAGIC) + 4:data_start].decode('utf-8'))
+        if self.header.get('format') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported index format: {self.header.get('format')}")
+
+        view = memoryview(self._mmap)
+        self.arrays = {
+            name: view[data_start + offset:data_start + offset + length].cast(typecode)
+            for name, (offset, length, typecode) in self.header['sections'].items()
+        }
+        self._blob = self.arrays['strings.blob']
+        self._offsets = self.arrays['strings.offsets']
+
+    @classmethod
+    def open(cls, path: str = DEFAULT_ARTIFACT, formulary_version: Optional[str] = None) -> Optional['IndexArtifact']:
+        """فتح الملف إن وُجد وكان مبنياً من نفس نسخة قاعدة البيانات"""
+        if not os.path.exists(path):
+            return None
+        try:
+            artifact = cls(path)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring index artifact {path}: {e}")
+            return None
+        if formulary_version and artifact.formulary_version != formulary_version:
+            return None
+        return artifact
+
+    @property
+    def formulary_version(self) -> str:
+        return self.header.get('formulary_version', '')
+
+    def section_version(self, name: str) -> Optional[str]:
+        """نسخة مدخلات مجموعة أقسام (يقارنها القارئ بنسخة بياناته قبل استخدامها)"""
+        return self.header.get('versions', {}).get(name)
+
+    def string(self, sid: int) -> str:
+        return self._string_bytes(sid).decode('utf-8')
+
+    def _string_bytes(self, sid: int) -> bytes:
+        return bytes(self._blob[self._offsets[sid]:self._offsets[sid + 1]])
+
+    def find_string(self, value: str) -> Optional[int]:
+        """رقم النص في الجدول المرتب (بحث ثنائي على صفحات الملف)"""
+        target = value.encode('utf-8')
+        low, high = 0, len(self._offsets) - 1
+        while low < high:
+            middle = (low + high) // 2
+            if self._string_bytes(middle) < target:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(self._offsets) - 1 and self._string_bytes(low) == target:
+            return low
+        return None
+
+    def _find_id(self, ids, sid: int) -> Optional[int]:
+        position = bisect_left(ids, sid)
+        return position if position < len(ids) and ids[position] == sid else None
+
+    def safety_matchers(self, prefix: str = 'safety') -> Dict[str, 'MappedAhoCorasick']:
+        languages = sorted(name[len(prefix) + 1:-len('.fail')] for name in self.arrays
+                           if name.startswith(f'{prefix}.') and name.endswith('.fail'))
+        return {language: MappedAhoCorasick(self, f"{prefix}.{language}") for language in languages}
+
+    def fuzzy_index(self) -> 'MappedNgramIndex':
+        return MappedNgramIndex(self)
+
+    def string_map(self, name: str) -> 'MappedStringMap':
+        return MappedStringMap(self, name)
+
+class MappedAhoCorasick:
+    """آلة Aho-Corasick مسطحة (CSR) تُقرأ مباشرة من الملف بنفس واجهة AhoCorasick"""
+
+    def __init__(self, artifact: IndexArtifact, prefix: str):
+        self.artifact = artifact
+        arrays = artifact.arrays
+        self.goto_offsets = arrays[f'{prefix}.goto_offsets']
+        self.goto_chars = arrays[f'{prefix}.goto_chars']
+        self.goto_targets = arrays[f'{prefix}.goto_targets']
+        self.fail = arrays[f'{prefix}.fail']
+        self.out_offsets = arrays[f'{prefix}.out_offsets']
+        self.out_patterns = arrays[f'{prefix}.out_patterns']
+        self.out_values = arrays[f'{prefix}.out_values']
+
+    def _next(self, state: int, code: int) -> Optional[int]:
+        start, end = self.goto_offsets[state], self.goto_offsets[state + 1]
+        position = bisect_left(self.goto_chars, code, start, end)
+        if position < end and self.goto_chars[position] == code:
+            return self.goto_targets[position]
+        return None
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, str, int]]:
+        state = 0
+        for position, char in enumerate(text):
+            code = ord(char)
+            next_state = self._next(state, code)
+            while next_state is None and state:
+                state = self.fail[state]
+                next_state = self._next(state, code)
+            state = next_state or 0
+            for idx in range(self.out_offsets[state], self.out_offsets[state + 1]):
+                yield position, self.artifact.string(self.out_patterns[idx]), self.out_values[idx]
+
+class MappedNgramIndex:
+    """فهرس trigrams من الملف بنفس واجهة NgramIndex"""
+
+    def __init__(self, artifact: IndexArtifact):
+        self.artifact = artifact
+        self.grams_ids = artifact.arrays['fuzzy.grams']
+        self.post_offsets = artifact.arrays['fuzzy.post_offsets']
+        self.postings = artifact.arrays['fuzzy.postings']
+
+    def candidates(self, word: str, cutoff: float, limit: int = 32) -> List[str]:
+        shared = Counter()
+        for gram in NgramIndex.grams(word):
+            sid = self.artifact.find_string(gram)
+            position = self.artifact._find_id(self.grams_ids, sid) if sid is not None else None
+            if position is not None:
+                shared.update(self.postings[self.post_offsets[position]:self.post_offsets[position + 1]])
+        length = len(word)
+        ranked = []
+        # أرقام النصوص مرتبة أبجدياً، فالترتيب عند التعادل مطابق لـ NgramIndex
+        for sid, _ in sorted(shared.items(), key=lambda item: (-item[1], item[0])):
+            key = self.artifact.string(sid)
+            if 2 * min(length, len(key)) / (length + len(key)) >= cutoff:
+                ranked.append(key)
+                if len(ranked) == limit:
+                    break
+        return ranked
+
+class MappedStringMap(Mapping):
+    """قاموس نص -> نص للقراءة فقط من الملف، بترتيب الإدخال الأصلي"""
+
+    def __init__(self, artifact: IndexArtifact, name: str):
+        self.artifact = artifact
+        arrays = artifact.arrays
+        self.keys_ids = arrays[f'map.{name}.keys']
+        self.values_ids = arrays[f'map.{name}.values']
+        self.sorted_keys = arrays[f'map.{name}.sorted_keys']
+        self.sorted_values = arrays[f'map.{name}.sorted_values']
+
+    def __getitem__(self, key: str) -> str:
+        sid = self.artifact.find_string(key) if isinstance(key, str) else None
+        position = self.artifact._find_id(self.sorted_keys, sid) if sid is not None else None
+        if position is None:
+            raise KeyError(key)
+        return self.artifact.string(self.sorted_values[position])
+
+    def __iter__(self) -> Iterator[str]:
+        return (self.artifact.string(sid) for sid in self.keys_ids)
+
+    def __len__(self) -> int:
+        return len(self.keys_ids)
+
+    def items(self):
+        string = self.artifact.string
+        return [(string(key), string(value)) for key, value in zip(self.keys_ids, self.values_ids)]
+
+def _flatten_automaton(writer: ArtifactWriter, prefix: str, automaton: AhoCorasick):
+    goto_offsets, goto_chars, goto_targets = [0], [], []
+    for transitions in automaton.goto:
+        for char, target in sorted(transitions.items(), key=lambda item: ord(item[0])):
+            goto_chars.append(ord(char))
+            goto_targets.append(target)
+        goto_offsets.append(len(goto_chars))
+    out_offsets, out_patterns, out_values = [0], [], []
+    for outputs in automaton.output:
+        for pattern, value in outputs:
+            out_patterns.append(writer.sid(pattern))
+            out_values.append(value)
+        out_offsets.append(len(out_patterns))
+
+    writer.add_array(f'{prefix}.goto_offsets', 'I', goto_offsets)
+    writer.add_array(f'{prefix}.goto_chars', 'I', goto_chars)
+    writer.add_array(f'{prefix}.goto_targets', 'I', goto_targets)
+    writer.add_array(f'{prefix}.fail', 'I', automaton.fail)
+    writer.add_array(f'{prefix}.out_offsets', 'I', out_offsets)
+    writer.add_array(f'{prefix}.out_patterns', 'I', out_patterns)
+    writer.add_array(f'{prefix}.out_values', 'I', out_values)
+
+def _write_interactions(writer: ArtifactWriter, interaction_index):
+    """العقد بترتيب أرقامها مع أسمائها، وكل زوج بأرقام طرفيه وخطورته وسببه"""
+    nodes = sorted(interaction_index.ids, key=interaction_index.ids.get)
+    writer.add_array('interactions.nodes', 'I', [writer.sid(node) for node in nodes])
+    writer.add_array('interactions.names_ar', 'I', [writer.sid(interaction_index.name(node, 'ar')) for node in nodes])
+    writer.add_array('interactions.names_en', 'I', [writer.sid(interaction_index.name(node, 'en')) for node in nodes])
+    rows = list(interaction_index.matrix.values())
+    writer.add_array('interactions.a', 'I', [interaction_index.ids[row.drug_a] for row in rows])
+    writer.add_array('interactions.b', 'I', [interaction_index.ids[row.drug_b] for row in rows])
+    writer.add_array('interactions.severity', 'B', [row.severity for row in rows])
+    writer.add_array('interactions.via_ar', 'I', [writer.sid(row.via_ar) for row in rows])
+    writer.add_array('interactions.via_en', 'I', [writer.sid(row.via_en) for row in rows])
+
+def compile_artifact(formulary_path: str, output_path: str, ontology_path: str = 'drug_classes.json') -> Dict:
+    """بناء فهارس البوتين وكتابتها في ملف واحد
+
+    أقسام البوت الخفيف تُقرأ فقط إذا طابقت formulary_version ملف قاعدته، وأقسام البوت المتقدم
+    (آلة السلامة، قواميس الأسماء، جدول التداخلات) لكل منها نسخة مدخلاتها في versions.
+    """
+    from drug_ontology import DrugOntology
+    from formulary_reloader import build_drug_synonyms, build_safety_matchers
+    from main import IntentClassifier
+
+    with open(formulary_path, 'rb') as f:
+        raw = f.read()
+    data = json.loads(raw.decode('utf-8'))
+    drug_database = data.get('drug_database', {})
+
+    drug_synonyms = build_drug_synonyms(drug_database)
+    safety_matchers = build_safety_matchers(data.get('safety_keywords', {}))
+    fuzzy_index = NgramIndex(drug_synonyms.keys())
+
+    # البوت المتقدم: المصنف بدون ملف فهارس يبني كل مكوناته من بيانات main.py والتصنيف
+    classifier = IntentClassifier(DrugOntology.load(ontology_path))
+    advanced_matchers = classifier.safety_checker.matchers
+    string_maps = {
+        'drug_synonyms': dict(classifier.symptom_parser.drug_synonyms.items()),
+        'slang_normalization': dict(classifier.symptom_parser.slang_normalization.items())
+    }
+    interaction_index = classifier.interaction_index
+
+    writer = ArtifactWriter()
+    writer.add_strings(drug_synonyms)
+    for matcher in list(safety_matchers.values()) + list(advanced_matchers.values()):
+        for outputs in matcher.output:
+            writer.add_strings(pattern for pattern, _ in outputs)
+    writer.add_strings(fuzzy_index.postings)
+    for mapping in string_maps.values():
+        writer.add_strings(mapping)
+        writer.add_strings(mapping.values())
+    writer.add_strings(interaction_index.ids)
+    writer.add_strings(name for names in interaction_index.names.values() for name in names.values())
+    writer.add_strings(via for row in interaction_index.matrix.values() for via in (row.via_ar, row.via_en))
+    writer.finalize_strings()
+
+    for language, matcher in safety_matchers.items():
+        _flatten_automaton(writer, f'safety.{language}', matcher)
+    for language, matcher in advanced_matchers.items():
+        _flatten_automaton(writer, f'advanced.safety.{language}', matcher)
+    for name, mapping in string_maps.items():
+        writer.add_string_map(name, mapping)
+    _write_interactions(writer, interaction_index)
+
+    grams = sorted(fuzzy_index.postings, key=writer.sid)
+    post_offsets, postings = [0], []
+    for gram in grams:
+        postings.extend(sorted(writer.sid(key) for key in fuzzy_index.postings[gram]))
+        post_offsets.append(len(postings))
+    writer.add_array('fuzzy.grams', 'I', [writer.sid(gram) for gram in grams])
+    writer.add_array('fuzzy.post_offsets', 'I', post_offsets)
+    writer.add_array('fuzzy.postings', 'I', postings)
+
+    metadata = {
+        'formulary_version': hashlib.sha1(raw).hexdigest()[:12],
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'safety_languages': sorted(safety_matchers),
+        'versions': {
+            'advanced.safety': classifier.safety_checker.version,
+            'advanced.symptom_parser': classifier.symptom_parser.version,
+            'interactions': interaction_index.version
+        },
+        'counts': {
+            'strings': len(writer.string_ids),
+            'synonyms': len(drug_synonyms),
+            'trigrams': len(grams),
+            'advanced_synonyms': len(string_maps['drug_synonyms']),
+            'interactions': len(interaction_index.matrix)
+        }
+    }
+    writer.write(output_path, metadata)
+    return metadata
+
+def main():
+    parser = argparse.ArgumentParser(description="بناء ملف الفهارس المسبق وقراءته")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    compile_parser = subparsers.add_parser('compile', help="بناء الملف من قاعدة البيانات")
+    compile_parser.add_argument('--formulary', default='medical_dataset_final.json')
+    compile_parser.add_argument('--output', default=DEFAULT_ARTIFACT)
+    compile_parser.add_argument('--ontology', default='drug_classes.json')
+
+    inspect_parser = subparsers.add_parser('inspect', help="عرض محتوى الملف")
+    inspect_parser.add_argument('path', nargs='?', default=DEFAULT_ARTIFACT)
+    args = parser.parse_args()
+
+    if args.command == 'compile':
+        metadata = compile_artifact(args.formulary, args.output, args.ontology)
+        print(f"Wrote {args.output} ({os.path.getsize(args.output)} bytes), "
+              f"formulary version {metadata['formulary_version']}")
+        print(json.dumps(metadata['counts'], indent=2))
+    else:
+        artifact = IndexArtifact(args.path)
+        header = {key: value for key, value in artifact.header.items() if key != 'sections'}
+        print(json.dumps(header, ensure_ascii=False, indent=2))
+        for name, (offset, length, typecode) in artifact.header['sections'].items():
+            print(f"  {name:<28} {typecode} {length:>10} bytes @ {offset}")
+
+if __name__ == "__main__":
+    main()
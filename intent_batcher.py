@@ -0,0 +1,187 @@
+import argparse
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import Future
+from queue import Empty, Queue
+from typing import Callable, List, Optional, Sequence
+
+import numpy as np
+
+from intent_student import StudentIntentModel
+
+class MicroBatcher:
+    """تجميع طلبات التصنيف المتزامنة في دفعة واحدة قبل تمريرها للنموذج
+
+    يجمع الطلبات لمدة أقصاها max_wait_ms أو حتى max_batch_size عنصر،
+    ثم يستدعي predict_batch مرة واحدة ويعيد كل نتيجة لصاحبها.
+    """
+
+    def __init__(self, predict_batch: Callable[[List[str]], Sequence], max_batch_size: int = 32,
+                 max_wait_ms: float = 5.0):
+        self.predict_batch = predict_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = Queue()
+        self._stopped = threading.Event()
+        self._worker = threading.Thread(target=self._run, name='intent-micro-batcher', daemon=True)
+        self._worker.start()
+
+    def submit(self, text: str) -> Future:
+        """إضافة طلب للطابور وإرجاع Future بالنتيجة"""
+        if self._stopped.is_set():
+            raise RuntimeError("MicroBatcher is closed")
+        future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def classify(self, text: str, timeout: Optional[float] = None):
+        """استدعاء متزامن للـ threads"""
+        return self.submit(text).result(timeout)
+
+    async def classify_async(self, text: str):
+        """استدعاء غير متزامن لـ asyncio"""
+        return await asyncio.wrap_future(self.submit(text))
+
+    def close(self):
+        self._stopped.set()
+        self._queue.put(None)
+        self._worker.join()
+
+    def _collect_batch(self, first) -> List:
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except Empty:
+                break
+            if item is None:
+                self._stopped.set()
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while not self._stopped.is_set():
+            first = self._queue.get()
+            if first is None:
+                break
+            # الطلبات التي أُلغيت أثناء الانتظار تُستبعد قبل التمرير للنموذج
+            batch = [(text, future) for text, future in self._collect_batch(first)
+                     if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            texts = [text for text, _ in batch]
+            try:
+                results = list(self.predict_batch(texts))
+                if len(results) != len(batch):
+                    raise RuntimeError(f"predict_batch returned {len(results)} results for {len(batch)} texts")
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+        # إلغاء ما تبقى في الطابور بعد الإغلاق
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except Empty:
+                break
+            if item is not None:
+                item[1].cancel()
+
+def student_predict_batch(model) -> Callable[[List[str]], List]:
+    """تحويل نموذج الطالب إلى دالة دفعات ترجع (intent, confidence) لكل نص"""
+    def predict(texts: List[str]) -> List:
+        probs = model.predict_proba(texts)
+        best = probs.argmax(axis=1)
+        return [(model.id_to_intent[int(idx)], float(probs[i, idx])) for i, idx in enumerate(best)]
+    return predict
+
+def teacher_predict_batch(model, tokenizer, id_to_intent) -> Callable[[List[str]], List]:
+    """تحويل نموذج mBERT إلى دالة دفعات: padding حتى أطول نص في الدفعة ثم تمرير واحد"""
+    import torch
+
+    model.eval()
+
+    def predict(texts: List[str]) -> List:
+        inputs = tokenizer(texts, truncation=True, padding=True, max_length=128, return_tensors='pt')
+        with torch.no_grad():
+            probs = torch.softmax(model(**inputs).logits, dim=-1)
+        confidences, best = probs.max(dim=-1)
+        return [(id_to_intent[int(idx)], float(conf)) for idx, conf in zip(best, confidences)]
+    return predict
+
+def run_load(batcher: MicroBatcher, texts: List[str], concurrency: int, requests_per_worker: int) -> dict:
+    """مولد حمل: عدة threads ترسل طلبات متتالية وتقيس زمن كل طلب"""
+    latencies = []
+    lock = threading.Lock()
+
+    def worker(worker_id: int):
+        local = []
+        for i in range(requests_per_worker):
+            text = texts[(worker_id + i) % len(texts)]
+            started = time.perf_counter()
+            batcher.classify(text)
+            local.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        'concurrency': concurrency,
+        'throughput': len(latencies) / elapsed,
+        'p50_ms': float(np.percentile(latencies_ms, 50)),
+        'p95_ms': float(np.percentile(latencies_ms, 95)),
+        'p99_ms': float(np.percentile(latencies_ms, 99)),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="قياس الإنتاجية مقابل زمن الاستجابة للـ micro-batching")
+    parser.add_argument('--model-dir', default='./mbert_medical_intent')
+    parser.add_argument('--dataset', default='medical_chatbot_dataset.json')
+    parser.add_argument('--batch-sizes', default='1,8,32')
+    parser.add_argument('--wait-ms', default='0,2,5')
+    parser.add_argument('--concurrency', default='1,4,16,64')
+    parser.add_argument('--requests', type=int, default=200, help="عدد الطلبات لكل thread")
+    args = parser.parse_args()
+
+    model = StudentIntentModel.load(args.model_dir)
+    if model is None:
+        print("Student model not found. Run: python train_model.py --distill")
+        return
+
+    with open(args.dataset, 'r', encoding='utf-8') as f:
+        texts = [row['text'] for row in json.load(f)]
+
+    print(f"{'batch':>6} {'wait_ms':>8} {'conc':>6} {'req/s':>10} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for batch_size in [int(x) for x in args.batch_sizes.split(',')]:
+        for wait_ms in [float(x) for x in args.wait_ms.split(',')]:
+            batcher = MicroBatcher(student_predict_batch(model), batch_size, wait_ms)
+            for concurrency in [int(x) for x in args.concurrency.split(',')]:
+                result = run_load(batcher, texts, concurrency, args.requests)
+                print(f"{batch_size:>6} {wait_ms:>8.1f} {concurrency:>6} {result['throughput']:>10.0f} "
+                      f"{result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} {result['p99_ms']:>8.2f}")
+            batcher.close()
+
+if __name__ == "__main__":
+    main()
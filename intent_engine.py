@@ -0,0 +1,86 @@
+import json
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Union
+
+from query_analysis import Lexicon, QueryAnalysis, analyze
+
+DEFAULT_LEXICON = 'intent_lexicon.json'
+
+class IntentScore(NamedTuple):
+    intent: str
+    score: float
+    confidence: float
+
+class IntentEngine:
+    """مصنف نوايا متعدد التسميات من عبارات موزونة مُجمعة في فهارس مقلوبة
+
+    كل إصابات العبارات تُجمع في تمريرة واحدة على كلمات الاستعلام، ووزن العبارة يُضاعف
+    إذا كانت قريبة من اسم دواء. كلفة الطلب لا تعتمد على عدد العبارات في الملف.
+    """
+
+    def __init__(self, intents: Dict[str, Dict[str, Dict[str, float]]], filters: Optional[Dict[str, List[str]]] = None,
+                 threshold: float = 0.5, proximity_window: int = 3, proximity_boost: float = 1.5):
+        self.intents = list(intents)
+        self.priority = {intent: order for order, intent in enumerate(self.intents)}
+        self.threshold = threshold
+        self.proximity_window = proximity_window
+        self.proximity_boost = proximity_boost
+
+        # فهرس لكل لغة، وفهرس لكل اللغات للبوت الذي لا يفرق بينها
+        languages = sorted({language for phrases in intents.values() for language in phrases})
+        self.lexicons = {
+            language: Lexicon(
+                (phrase, (intent, weight))
+                for intent, phrases in intents.items()
+                for phrase, weight in phrases.get(language, {}).items()
+            )
+            for language in languages
+        }
+        self.lexicons[None] = Lexicon(
+            (phrase, (intent, weight))
+            for intent, phrases in intents.items()
+            for language in languages
+            for phrase, weight in phrases.get(language, {}).items()
+        )
+        self.filters = Lexicon.from_groups(filters or {})
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_LEXICON) -> 'IntentEngine':
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(data['intents'], data.get('filters'), **data.get('scoring', {}))
+
+    def rank(self, query: Union[str, QueryAnalysis], language: Optional[str] = None,
+             drugs: Optional[Lexicon] = None) -> List[IntentScore]:
+        """النوايا التي تجاوزت العتبة مرتبة بالنقاط، مع الثقة (نصيب كل نية من مجموع النقاط)"""
+        analysis = query if isinstance(query, QueryAnalysis) else analyze(query)
+        lexicon = self.lexicons.get(language) or self.lexicons[None]
+
+        drug_spans = [(start, start + size) for start, size, _, _ in drugs.hits(analysis.tokens)] if drugs else []
+        scores = {}
+        for start, size, _, (intent, weight) in lexicon.hits(analysis.tokens):
+            end = start + size
+            near_drug = any(start - self.proximity_window < drug_end and drug_start < end + self.proximity_window
+                            for drug_start, drug_end in drug_spans)
+            scores[intent] = scores.get(intent, 0.0) + weight * (self.proximity_boost if near_drug else 1.0)
+
+        ranked = sorted(
+            ((intent, score) for intent, score in scores.items() if score >= self.threshold),
+            key=lambda item: (-item[1], self.priority[item[0]])
+        )
+        total = sum(score for _, score in ranked)
+        return [IntentScore(intent, round(score, 3), round(score / total, 3)) for intent, score in ranked]
+
+    def best(self, query: Union[str, QueryAnalysis], language: Optional[str] = None,
+             drugs: Optional[Lexicon] = None) -> Optional[str]:
+        ranked = self.rank(query, language, drugs)
+        return ranked[0].intent if ranked else None
+
+    def filter(self, query: Union[str, QueryAnalysis]) -> Optional[str]:
+        """تحية أو كلام عام قبل البحث الطبي"""
+        return self.filters.first(query)
+
+@lru_cache(maxsize=None)
+def get_intent_engine(path: str = DEFAULT_LEXICON) -> IntentEngine:
+    """محرك مشترك بين البوتين (يُحمل مرة واحدة لكل عملية)"""
+    return IntentEngine.load(path)
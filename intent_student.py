@@ -0,0 +1,115 @@
+import json
+import os
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+STUDENT_FILENAME = 'student_model.npz'
+FEATURE_VERSION = 1
+
+# توحيد أشكال الحروف قبل استخراج الـ n-grams (ثابت لأن النموذج المحفوظ يعتمد عليه)
+_FOLD_TABLE = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ى': 'ي', 'ة': 'ه', 'ـ': None
+})
+
+class StudentIntentModel:
+    """نموذج طالب صغير (fastText-style) مقطّر من mBERT للتصنيف السريع على المعالج"""
+
+    def __init__(self, embeddings: np.ndarray, weight: np.ndarray, bias: np.ndarray,
+                 id_to_intent: Dict[int, str], ngram_range: Tuple[int, int] = (2, 4)):
+        self.embeddings = embeddings
+        self.weight = weight
+        self.bias = bias
+        self.id_to_intent = id_to_intent
+        self.intent_to_id = {intent: idx for idx, intent in id_to_intent.items()}
+        self.ngram_range = ngram_range
+        self.num_buckets = embeddings.shape[0]
+
+    @staticmethod
+    def featurize(text: str, num_buckets: int, ngram_range: Tuple[int, int] = (2, 4)) -> List[int]:
+        """تحويل النص إلى أرقام buckets لـ char n-grams والكلمات (hashing ثابت بين العمليات)"""
+        text = str(text).lower().translate(_FOLD_TABLE)
+        min_n, max_n = ngram_range
+        features = []
+
+        for word in text.split():
+            features.append(zlib.crc32(f"w:{word}".encode('utf-8')) % num_buckets)
+            padded = f"<{word}>"
+            for n in range(min_n, max_n + 1):
+                for i in range(len(padded) - n + 1):
+                    features.append(zlib.crc32(padded[i:i + n].encode('utf-8')) % num_buckets)
+
+        return features
+
+    def predict_logits(self, texts: List[str]) -> np.ndarray:
+        """حساب الـ logits لدفعة نصوص بعملية مصفوفات واحدة"""
+        features = [self.featurize(text, self.num_buckets, self.ngram_range) for text in texts]
+        counts = np.array([len(f) for f in features], dtype=np.int64)
+        hidden = np.zeros((len(texts), self.embeddings.shape[1]), dtype=np.float32)
+
+        non_empty = counts > 0
+        if non_empty.any():
+            flat = np.fromiter((b for f in features for b in f), dtype=np.int64, count=int(counts.sum()))
+            starts = np.concatenate(([0], np.cumsum(counts[non_empty])[:-1]))
+            sums = np.add.reduceat(self.embeddings[flat], starts, axis=0)
+            hidden[non_empty] = sums / counts[non_empty, None]
+
+        return hidden @ self.weight.T + self.bias
+
+    def predict_proba(self, texts: List[str]) -> np.ndarray:
+        logits = self.predict_logits(texts)
+        logits -= logits.max(axis=1, keepdims=True)
+        exp = np.exp(logits)
+        return exp / exp.sum(axis=1, keepdims=True)
+
+    def predict(self, text: str) -> Tuple[str, float]:
+        """إرجاع النية الأرجح مع درجة الثقة"""
+        probs = self.predict_proba([text])[0]
+        best = int(np.argmax(probs))
+        return self.id_to_intent[best], float(probs[best])
+
+    def save(self, directory: str = './mbert_medical_intent') -> str:
+        """حفظ النموذج بجانب intent_mappings.json"""
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, STUDENT_FILENAME)
+        np.savez(
+            path,
+            embeddings=self.embeddings,
+            weight=self.weight,
+            bias=self.bias,
+            ngram_range=np.array(self.ngram_range),
+            feature_version=np.array(FEATURE_VERSION)
+        )
+
+        mappings_path = os.path.join(directory, 'intent_mappings.json')
+        if not os.path.exists(mappings_path):
+            with open(mappings_path, 'w') as f:
+                json.dump({
+                    'intent_to_id': self.intent_to_id,
+                    'id_to_intent': self.id_to_intent
+                }, f)
+        return path
+
+    @classmethod
+    def load(cls, directory: str = './mbert_medical_intent') -> Optional['StudentIntentModel']:
+        """تحميل النموذج الطالب إن وجد"""
+        path = os.path.join(directory, STUDENT_FILENAME)
+        if not os.path.exists(path):
+            return None
+
+        data = np.load(path)
+        if int(data['feature_version']) != FEATURE_VERSION:
+            return None
+
+        with open(os.path.join(directory, 'intent_mappings.json'), 'r') as f:
+            mappings = json.load(f)
+        id_to_intent = {int(idx): intent for idx, intent in mappings['id_to_intent'].items()}
+
+        return cls(
+            data['embeddings'],
+            data['weight'],
+            data['bias'],
+            id_to_intent,
+            tuple(int(n) for n in data['ngram_range'])
+        )
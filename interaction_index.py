@@ -0,0 +1,236 @@
+from itertools import combinations
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from drug_ontology import DrugOntology
+from index_artifact import IndexArtifact
+
+SEVERITY_LEVELS = {'low': 1, 'medium': 2, 'high': 3}
+SEVERITY_LABELS = {
+    'ar': {1: 'خطورة منخفضة', 2: 'خطورة متوسطة', 3: 'خطورة عالية'},
+    'en': {1: 'low severity', 2: 'medium severity', 3: 'high severity'}
+}
+SEVERITY_ICONS = {1: '🟡', 2: '🟠', 3: '🔴'}
+
+# تُرفع عند تغيير قواعد بناء الجدول حتى لا تُقرأ جداول مترجمة بالقواعد القديمة
+RULES_VERSION = 2
+
+# عبارات لا تمثل تداخلاً فعلياً
+NON_INTERACTIONS = {'few interactions', 'قليلة التداخل'}
+
+class Interaction(NamedTuple):
+    drug_a: str
+    drug_b: str
+    severity: int
+    via_ar: str
+    via_en: str
+
+class InteractionIndex:
+    """مصفوفة تداخلات متماثلة ومتفرقة بين معرّفات الأدوية الموحدة
+
+    version نسخة المدخلات (قاعدة الأدوية والأسماء والتصنيف)، وإذا طابقت نسخة جدول
+    التداخلات في ملف الفهارس تُقرأ المصفوفة منه بدل تحليل نصوص التداخلات.
+    """
+
+    def __init__(self, drug_database: Dict[str, Dict], drug_synonyms: Dict[str, str], ontology: DrugOntology,
+                 artifact: Optional[IndexArtifact] = None, version: str = ''):
+        self.drug_database = drug_database
+        self.drug_synonyms = {synonym.lower(): key for synonym, key in drug_synonyms.items()}
+        self.ontology = ontology
+        self.version = f"{version}.r{RULES_VERSION}" if version else ''
+
+        self.ids = {}
+        self.names = {}
+        # مفتاح الزوج (أصغر معرف، أكبر معرف) -> أخطر تداخل معروف بينهما
+        self.matrix = {}
+        self.adjacency = {}
+        if artifact is not None and self.version and artifact.section_version('interactions') == self.version:
+            self._load(artifact)
+        else:
+            self._build()
+
+        self.name_lookup = {
+            name.lower(): drug_id
+            for drug_id, names in self.names.items()
+            for name in names.values()
+        }
+
+    def _build(self):
+        """تحويل نصوص التداخلات في قاعدة الأدوية إلى أزواج (مع أعضاء الفئات)"""
+        for drug_key, drug_info in self.drug_database.items():
+            self._node(drug_key, drug_info.get('name_ar', drug_key), drug_info.get('name_en', drug_key))
+
+        for drug_key, drug_info in self.drug_database.items():
+            entries = zip(drug_info.get('interactions_ar', []), drug_info.get('interactions_en', []))
+            for via_ar, via_en in entries:
+                for target, severity in self._resolve_targets(via_ar, via_en):
+                    if target != drug_key:
+                        self._add(drug_key, target, Interaction(drug_key, target, severity, via_ar, via_en))
+
+        # أدوية نفس الفئة تتداخل فيما بينها إذا كانت الفئة معلمة بذلك
+        for code, drug_class in self.ontology.classes.items():
+            if drug_class.get('interacts_within'):
+                severity = SEVERITY_LEVELS.get(drug_class.get('severity'), SEVERITY_LEVELS['low'])
+                for drug_a, drug_b in combinations(self.ontology.members(code), 2):
+                    self._member_node(drug_a)
+                    self._member_node(drug_b)
+                    self._add(drug_a, drug_b, Interaction(
+                        drug_a, drug_b, severity, drug_class['name_ar'], drug_class['name_en']
+                    ))
+
+    def _load(self, artifact: IndexArtifact):
+        """العقد وأسماؤها وأزواج التداخل من ملف الفهارس"""
+        arrays, string = artifact.arrays, artifact.string
+        nodes = [string(sid) for sid in arrays['interactions.nodes']]
+        self.ids = {node: idx for idx, node in enumerate(nodes)}
+        self.names = {
+            node: {'ar': string(name_ar), 'en': string(name_en)}
+            for node, name_ar, name_en in zip(nodes, arrays['interactions.names_ar'], arrays['interactions.names_en'])
+        }
+        rows = zip(arrays['interactions.a'], arrays['interactions.b'], arrays['interactions.severity'],
+                   arrays['interactions.via_ar'], arrays['interactions.via_en'])
+        for a, b, severity, via_ar, via_en in rows:
+            self._add(nodes[a], nodes[b], Interaction(nodes[a], nodes[b], severity, string(via_ar), string(via_en)))
+
+    def _node(self, drug_id: str, name_ar: str, name_en: str) -> int:
+        if drug_id not in self.ids:
+            self.ids[drug_id] = len(self.ids)
+        # أعضاء الفئات يُسجلون بمعرفهم فقط حتى يظهر اسمهم الفعلي
+        if self.names.get(drug_id, {}).get('en', drug_id) == drug_id:
+            self.names[drug_id] = {'ar': name_ar, 'en': name_en}
+        return self.ids[drug_id]
+
+    def _member_node(self, drug_id: str) -> int:
+        drug_info = self.drug_database.get(drug_id, {})
+        return self._node(drug_id, drug_info.get('name_ar', drug_id), drug_info.get('name_en', drug_id))
+
+    def _danger(self, drug_id: str) -> int:
+        drug_info = self.drug_database.get(drug_id, {})
+        return SEVERITY_LEVELS.get(drug_info.get('danger_level'), SEVERITY_LEVELS['low'])
+
+    def _add(self, drug_a: str, drug_b: str, interaction: Interaction):
+        a, b = self.ids[drug_a], self.ids[drug_b]
+        key = (a, b) if a < b else (b, a)
+        current = self.matrix.get(key)
+        if current is None or interaction.severity > current.severity:
+            self.matrix[key] = interaction
+        self.adjacency.setdefault(drug_a, set()).add(drug_b)
+        self.adjacency.setdefault(drug_b, set()).add(drug_a)
+
+    def _lookup_synonym(self, text: str) -> Optional[str]:
+        text = text.lower().strip()
+        candidates = [text, text[2:]] if text.startswith('ال') else [text]
+        for candidate in candidates:
+            if candidate in self.drug_synonyms:
+                return self.drug_synonyms[candidate]
+            if candidate in self.drug_database:
+                return candidate
+        return None
+
+    def _resolve_targets(self, via_ar: str, via_en: str) -> List[Tuple[str, int]]:
+        """تحويل نص التداخل إلى دواء أو أعضاء فئة أو مادة غير دوائية"""
+        if via_en.lower() in NON_INTERACTIONS or via_ar in NON_INTERACTIONS:
+            return []
+
+        code = self.ontology.resolve_class(via_en) or self.ontology.resolve_class(via_ar)
+        if code:
+            # الفئة نفسها عقدة، وكل أعضائها المعروفين يرثون التداخل
+            drug_class = self.ontology.class_info(code)
+            severity = SEVERITY_LEVELS.get(drug_class.get('severity'), SEVERITY_LEVELS['low'])
+            self._node(f"class:{code}", drug_class.get('name_ar', via_ar), drug_class.get('name_en', via_en))
+            targets = [(f"class:{code}", severity)]
+            for member in self.ontology.members(code):
+                self._member_node(member)
+                targets.append((member, severity))
+            return targets
+
+        drug_id = self._lookup_synonym(via_en) or self._lookup_synonym(via_ar)
+        if drug_id:
+            self._node(drug_id, via_ar, via_en)
+            return [(drug_id, SEVERITY_LEVELS['low'])]
+
+        # مادة غير دوائية (كحول، جريب فروت...) تبقى عقدة مستقلة
+        substance_id = f"substance:{via_en.lower()}"
+        self._node(substance_id, via_ar, via_en)
+        return [(substance_id, SEVERITY_LEVELS['low'])]
+
+    def resolve(self, drug_name: str) -> Optional[str]:
+        """إرجاع المعرف الموحد للدواء إن كان معروفاً في المصفوفة"""
+        drug_id = self._lookup_synonym(drug_name)
+        if drug_id in self.ids:
+            return drug_id
+        code = self.ontology.resolve_class(drug_name)
+        if code and f"class:{code}" in self.ids:
+            return f"class:{code}"
+        return self.name_lookup.get(drug_name.lower().strip())
+
+    def interacts_with(self, drug_id: str) -> Iterable[str]:
+        return self.adjacency.get(drug_id, set())
+
+    def check_all(self, drug_ids: List[str]) -> List[Interaction]:
+        """فحص كل الأزواج في القائمة مرتبة حسب الخطورة"""
+        unique_ids = list(dict.fromkeys(drug_id for drug_id in drug_ids if drug_id in self.ids))
+        found = []
+        for drug_a, drug_b in combinations(unique_ids, 2):
+            a, b = self.ids[drug_a], self.ids[drug_b]
+            interaction = self.matrix.get((a, b) if a < b else (b, a))
+            if interaction:
+                found.append(interaction)
+        return sorted(found, key=lambda item: (-item.severity, self.ids[item.drug_a], self.ids[item.drug_b]))
+
+    def name(self, drug_id: str, language: str) -> str:
+        return self.names.get(drug_id, {}).get(language, drug_id)
+
+    def format_report(self, drug_ids: List[str], language: str) -> str:
+        """تقرير التداخلات لكل الأزواج باللغة المطلوبة"""
+        interactions = self.check_all(drug_ids)
+        names = [self.name(drug_id, language) for drug_id in dict.fromkeys(drug_ids)]
+
+        if not interactions:
+            if language == 'ar':
+                return f"""✅ **لا يوجد تداخل معروف بين {' و '.join(names)}**
+
+**💡 ملاحظة:** يمكن {'تناولهما' if len(names) == 2 else 'تناولها'} معاً عموماً
+**👨‍⚕️ لكن استشر الصيدلي للتأكد من التوقيت المناسب**"""
+            else:
+                return f"""✅ **No known interaction between {' and '.join(names)}**
+
+**💡 Note:** Generally safe to take together
+**👨‍⚕️ But consult pharmacist for proper timing**"""
+
+        lines = []
+        for interaction in interactions:
+            icon = SEVERITY_ICONS[interaction.severity]
+            label = SEVERITY_LABELS[language][interaction.severity]
+            via = interaction.via_ar if language == 'ar' else interaction.via_en
+            lines.append(
+                f"• {icon} **{self.name(interaction.drug_a, language)} + {self.name(interaction.drug_b, language)}**"
+                f" - {label} ({via})"
+            )
+        pairs_text = '\n'.join(lines)
+
+        # خطورة الدواء نفسه مستقلة عن خطورة التداخل فتُعرض منفصلة
+        dangerous = [(drug_id, self._danger(drug_id)) for drug_id in dict.fromkeys(drug_ids)]
+        dangerous = [(drug_id, level) for drug_id, level in dangerous if level > SEVERITY_LEVELS['low']]
+        if dangerous:
+            heading = "**🔹 خطورة الأدوية نفسها:**" if language == 'ar' else "**🔹 Drug danger levels:**"
+            pairs_text += f"\n\n{heading}\n" + '\n'.join(
+                f"• {SEVERITY_ICONS[level]} {self.name(drug_id, language)} - {SEVERITY_LABELS[language][level]}"
+                for drug_id, level in dangerous
+            )
+
+        if language == 'ar':
+            return f"""⚠️ **تحذير: قد يوجد تداخل بين الأدوية التالية**
+
+{pairs_text}
+
+**🚫 لا ينصح بتناولها معاً بدون استشارة طبية**
+
+**👨‍⚕️ استشر صيدلي أو طبيب قبل الجمع بينها**"""
+        else:
+            return f"""⚠️ **Warning: Possible interactions between these medications**
+
+{pairs_text}
+
+**🚫 Not recommended to take together without medical consultation**
+
+**👨‍⚕️ Consult pharmacist or doctor before combining**"""
@@ -1,182 +1,127 @@
 
 import streamlit as st
+import hashlib
 import json
 import re
+from collections import OrderedDict
 from datetime import datetime
 from typing import Dict, List, Optional
-import difflib
-import os
+import threading
 from medical_api_handler import EnhancedMedicalBot
+from drug_search_index import DrugSearchIndex
+from symptom_router import SymptomRouter, SymptomSuggestion
+from response_templates import ResponseRenderer, class_membership_response
+from formulary_reloader import FormularySnapshot, get_formulary_reloader
+from arabic_normalizer import normalize_text
+from intent_engine import get_intent_engine
+from response_cache import canonical_query, get_response_cache
+
+# نوايا المحرك المشترك -> نوايا البوت الخفيف
+ENGINE_INTENTS = {
+    'GET_DOSAGE': 'dosage_request',
+    'GET_ALTERNATIVES': 'alternatives_request',
+    'GET_INTERACTION': 'interaction_check',
+    'GET_SIDE_EFFECTS': 'side_effects',
+    'GET_WARNINGS': 'warnings'
+}
+
+# عدد الردود المحفوظة لكل جلسة
+SESSION_ANSWERS = 64
+
+# ربط نوايا البوت الخفيف بقوالب الردود
+RESPONSE_INTENTS = {
+    'dosage_request': 'dosage',
+    'alternatives_request': 'alternatives',
+    'interaction_check': 'interactions',
+    'side_effects': 'side_effects',
+    'warnings': 'warnings',
+    'drug_info': 'drug_info'
+}
 
 class LightweightMedicalBot:
     def __init__(self):
+        self._local = threading.local()
         self.load_dataset()
-        self.setup_safety_rules()
+        # الردود المحسوبة بالقواعد مشتركة بين كل الجلسات
+        self.response_cache = get_response_cache('lightweight')
         # إضافة البوت المحسن مع APIs
         self.enhanced_bot = EnhancedMedicalBot()
     
     def load_dataset(self):
-        """تحميل قاعدة البيانات من ملف JSON"""
-        try:
-            if not os.path.exists('medical_dataset_final.json'):
-                st.error("❌ ملف قاعدة البيانات غير موجود: medical_dataset_final.json")
-                self.drug_database = {}
-                self.safety_keywords = {}
-                return
-                
-            with open('medical_dataset_final.json', 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                self.drug_database = data.get('drug_database', {})
-                self.safety_keywords = data.get('safety_keywords', {})
-                
-        except Exception as e:
-            st.error(f"❌ خطأ في تحميل قاعدة البيانات: {str(e)}")
-            self.drug_database = {}
-            self.safety_keywords = {}
-    
-    def setup_safety_rules(self):
-        """إعداد قوائم السلامة"""
-        self.child_keywords = self.safety_keywords.get('children', {})
-        self.pregnancy_keywords = self.safety_keywords.get('pregnancy', {})
-        self.emergency_keywords = self.safety_keywords.get('emergency', {})
-        
-        # قائمة أسماء الأدوية التجارية
-        self.drug_synonyms = {}
-        for drug_key, drug_info in self.drug_database.items():
-            brand_names = drug_info.get('brand_names', [])
-            for brand in brand_names:
-                self.drug_synonyms[brand.lower()] = drug_key
-            self.drug_synonyms[drug_info.get('name_ar', '').lower()] = drug_key
-            self.drug_synonyms[drug_info.get('name_en', '').lower()] = drug_key
+        """ربط البوت بنسخة قاعدة البيانات المشتركة (يُعاد تحميلها تلقائياً عند تعديل الملف)"""
+        self.reloader = get_formulary_reloader('medical_dataset_final.json', self.normalize_arabic_text)
+        error = self.reloader.snapshot.error
+        if error:
+            st.error(f"❌ خطأ في تحميل قاعدة البيانات: {error}")
+    
+    @property
+    def snapshot(self) -> FormularySnapshot:
+        """النسخة المثبتة للطلب الحالي، أو أحدث نسخة خارج الطلبات"""
+        return getattr(self._local, 'snapshot', None) or self.reloader.snapshot
+    
+    @property
+    def drug_database(self):
+        return self.snapshot.drug_database
+    
+    @property
+    def drug_synonyms(self):
+        return self.snapshot.drug_synonyms
+    
+    @property
+    def formulary_version(self) -> str:
+        return self.snapshot.formulary_version
+    
+    @property
+    def search_index(self) -> DrugSearchIndex:
+        return self.snapshot.search_index
+    
+    @property
+    def symptom_router(self) -> SymptomRouter:
+        return self.snapshot.symptom_router
+    
+    @property
+    def renderer(self) -> ResponseRenderer:
+        return self.snapshot.renderer
     
     def check_safety_violations(self, user_input: str, language: str) -> Dict:
-        """فحص انتهاكات السلامة"""
-        user_input_lower = user_input.lower()
+        """فحص انتهاكات السلامة (الأطفال ثم الحوامل ثم الطوارئ) بمرور واحد على النص"""
+        category = self.snapshot.safety_category(user_input.lower(), language)
         
-        # فحص كلمات الأطفال
-        child_words = self.child_keywords.get(language, [])
-        for word in child_words:
-            if word in user_input_lower:
-                return {
-                    'violation': True,
-                    'type': 'child_detected',
-                    'message': '🚫 هذه حالة أطفال، استشر الصيدلي مباشرة.' if language == 'ar' else '🚫 Pediatric case, consult pharmacist directly.'
-                }
+        if category == 'children':
+            return {
+                'violation': True,
+                'type': 'child_detected',
+                'message': '🚫 هذه حالة أطفال، استشر الصيدلي مباشرة.' if language == 'ar' else '🚫 Pediatric case, consult pharmacist directly.'
+            }
         
-        # فحص كلمات الحوامل
-        pregnancy_words = self.pregnancy_keywords.get(language, [])
-        for word in pregnancy_words:
-            if word in user_input_lower:
-                return {
-                    'violation': True,
-                    'type': 'pregnancy_detected',
-                    'message': '🚫 الحوامل والمرضعات، استشر الصيدلي مباشرة.' if language == 'ar' else '🚫 Pregnant/nursing women, consult pharmacist directly.'
-                }
+        if category == 'pregnancy':
+            return {
+                'violation': True,
+                'type': 'pregnancy_detected',
+                'message': '🚫 الحوامل والمرضعات، استشر الصيدلي مباشرة.' if language == 'ar' else '🚫 Pregnant/nursing women, consult pharmacist directly.'
+            }
         
-        # فحص كلمات الطوارئ
-        emergency_words = self.emergency_keywords.get(language, [])
-        for word in emergency_words:
-            if word in user_input_lower:
-                return {
-                    'violation': True,
-                    'type': 'emergency_detected',
-                    'message': '🚨 هذه علامة خطر. توجه للطوارئ فوراً أو اتصل بـ 997.' if language == 'ar' else '🚨 Emergency sign. Go to emergency or call 997.'
-                }
+        if category == 'emergency':
+            return {
+                'violation': True,
+                'type': 'emergency_detected',
+                'message': '🚨 هذه علامة خطر. توجه للطوارئ فوراً أو اتصل بـ 997.' if language == 'ar' else '🚨 Emergency sign. Go to emergency or call 997.'
+            }
         
         return {'violation': False}
     
-    def normalize_arabic_text(self, text: str) -> str:
-        """تطبيع النص العربي"""
-        text = text.lower()
-        # إزالة الهمزات
-        text = text.replace('أ', 'ا').replace('إ', 'ا').replace('آ', 'ا')
-        text = text.replace('ى', 'ي').replace('ة', 'ه')
-        return text.strip()
-    
-    def check_symptom_query(self, query: str) -> Optional[List[str]]:
-        """فحص استفسارات الأعراض وربطها بالأدوية المناسبة"""
-        symptom_map = {
-            "صداع": ["باراسيتامول", "بندول"],
-            "حرارة": ["باراسيتامول", "بندول"],
-            "سخونة": ["باراسيتامول", "بندول"],
-            "زكام": ["باراسيتامول"],
-            "برد": ["باراسيتامول"],
-            "التهاب": ["أوجمنتين"],
-            "بكتيريا": ["أوجمنتين"],
-            "عدوى": ["أوجمنتين"],
-            "ألم": ["باراسيتامول", "بندول"],
-            "وجع": ["باراسيتامول", "بندول"],
-            "headache": ["باراسيتامول", "بندول"],
-            "fever": ["باراسيتامول", "بندول"],
-            "pain": ["باراسيتامول", "بندول"],
-            "cold": ["باراسيتامول"],
-            "infection": ["أوجمنتين"],
-            "bacterial": ["أوجمنتين"]
-        }
-        
-        query_lower = query.lower()
-        query_normalized = self.normalize_arabic_text(query)
-        
-        for symptom, drugs in symptom_map.items():
-            symptom_normalized = self.normalize_arabic_text(symptom)
-            if (symptom in query_lower or 
-                symptom_normalized in query_normalized or
-                f"دواء {symptom}" in query_lower or
-                f"للـ{symptom}" in query_lower or
-                f"لل{symptom}" in query_lower or
-                f"medicine for {symptom}" in query_lower):
-                return drugs
-        
-        return None
+    @staticmethod
+    def normalize_arabic_text(text: str) -> str:
+        """تطبيع النص العربي (التشكيل والتطويل وأشكال الحروف)"""
+        return normalize_text(text)
+    
+    def check_symptom_query(self, query: str) -> Optional[List[SymptomSuggestion]]:
+        """فحص استفسارات الأعراض وربطها بالأدوية المناسبة (مرتبة حسب الأولوية)"""
+        return self.symptom_router.route(query) or None
 
     def smart_search(self, query: str) -> Optional[str]:
-        """البحث الذكي في قاعدة البيانات"""
-        query_normalized = self.normalize_arabic_text(query)
-        query_lower = query.lower()
-        
-        # 1. البحث المباشر في أسماء الأدوية والأسماء التجارية
-        for synonym, drug_key in self.drug_synonyms.items():
-            if synonym in query_lower or synonym in query_normalized:
-                return drug_key
-        
-        # 2. البحث في الاستخدامات (general_use)
-        for drug_key, drug_info in self.drug_database.items():
-            # البحث في الاستخدام العربي
-            use_ar = drug_info.get('general_use_ar', '').lower()
-            use_ar_normalized = self.normalize_arabic_text(use_ar)
-            
-            # البحث في الاستخدام الإنجليزي
-            use_en = drug_info.get('general_use_en', '').lower()
-            
-            # فحص الكلمات المفتاحية
-            search_terms = [
-                # كلمات الصداع
-                'صداع', 'headache', 'رأس', 'head',
-                # كلمات الألم
-                'ألم', 'pain', 'وجع', 'ache',
-                # كلمات الحرارة
-                'حرارة', 'fever', 'سخونة', 'temperature',
-                # كلمات المضاد الحيوي
-                'التهاب', 'infection', 'بكتيريا', 'bacterial',
-                # كلمات عامة
-                'مسكن', 'painkiller', 'خافض', 'reducer'
-            ]
-            
-            for term in search_terms:
-                term_normalized = self.normalize_arabic_text(term)
-                if ((term in query_lower or term_normalized in query_normalized) and
-                    (term in use_ar or term_normalized in use_ar_normalized or term in use_en)):
-                    return drug_key
-        
-        # 3. البحث التقريبي في أسماء الأدوية
-        words = query_lower.split()
-        for word in words:
-            if len(word) > 3:
-                matches = difflib.get_close_matches(word, self.drug_synonyms.keys(), n=1, cutoff=0.7)
-                if matches:
-                    return self.drug_synonyms[matches[0]]
-        
-        return None
+        """البحث الذكي في قاعدة البيانات (الأسماء ثم الاستخدامات ثم البحث التقريبي)"""
+        return self.search_index.search(query)
     
     def find_drug(self, text: str) -> Optional[str]:
         """البحث عن دواء في النص باستخدام البحث الذكي"""
@@ -184,39 +129,12 @@ class LightweightMedicalBot:
     
     def detect_intent_filter(self, query: str) -> str:
         """فلتر النوايا قبل البحث الطبي"""
-        greetings = ["مرحبا", "هلا", "السلام عليكم", "hello", "hi", "hey", "أهلا", "سلام", "هلو"]
-        smalltalk = ["كيفك", "شلونك", "كيف الحال", "وش الاخبار", "how are you", "what's up", "كيف حالك"]
-        
-        q = query.strip().lower()
-        
-        # تحيات
-        for g in greetings:
-            if g in q:
-                return "greeting"
-        
-        # كلام عام
-        for s in smalltalk:
-            if s in q:
-                return "smalltalk"
-        
-        return "medical"
+        return get_intent_engine().filter(query) or "medical"
     
     def detect_intent(self, user_input: str) -> str:
         """كشف نية المستخدم"""
-        text_lower = user_input.lower()
-        
-        if any(word in text_lower for word in ['جرعة', 'كمية', 'dosage', 'dose']):
-            return 'dosage_request'
-        elif any(word in text_lower for word in ['بديل', 'بدائل', 'alternative']):
-            return 'alternatives_request'
-        elif any(word in text_lower for word in ['تداخل', 'تفاعل', 'interaction']):
-            return 'interaction_check'
-        elif any(word in text_lower for word in ['أعراض جانبية', 'side effects']):
-            return 'side_effects'
-        elif any(word in text_lower for word in ['تحذير', 'warning']):
-            return 'warnings'
-        else:
-            return 'drug_info'
+        intent = get_intent_engine().best(user_input, drugs=self.snapshot.drug_lexicon)
+        return ENGINE_INTENTS.get(intent, 'drug_info')
     
     def detect_language(self, text: str) -> str:
         """كشف لغة النص"""
@@ -225,12 +143,22 @@ class LightweightMedicalBot:
     
     def process_user_input(self, user_input: str) -> str:
         """معالجة مدخل المستخدم وإرجاع الرد"""
+        # تثبيت نسخة واحدة من قاعدة البيانات طوال الطلب حتى لو أعيد تحميلها أثناءه
         if not user_input or not user_input.strip():
             return "يرجى كتابة سؤالك أولاً"
         
-        # كشف اللغة
-        language = self.detect_language(user_input)
-        
+        snapshot = self._local.snapshot = self.reloader.snapshot
+        try:
+            # كشف اللغة
+            language = self.detect_language(user_input)
+            return self.response_cache.respond(
+                user_input, language, (snapshot.formulary_version, snapshot.safety_version),
+                lambda query: self._process_user_input(query, language)
+            )
+        finally:
+            self._local.snapshot = None
+    
+    def _process_user_input(self, user_input: str, language: str) -> str:
         # فحص السلامة أولاً
         safety_check = self.check_safety_violations(user_input, language)
         if safety_check['violation']:
@@ -258,26 +186,22 @@ class LightweightMedicalBot:
             if symptom_result:
                 if language == 'ar':
                     response = "🔎 بناءً على الأعراض، هذه الأدوية مناسبة:\n\n"
-                    for drug in symptom_result:
-                        # البحث عن معلومات الدواء
-                        drug_key = self.find_drug(drug)
-                        if drug_key and drug_key in self.drug_database:
-                            drug_info = self.drug_database[drug_key]
-                            response += f"💊 **{drug_info.get('name_ar', drug)}** - {drug_info.get('general_use_ar', 'مسكن وخافض حرارة')}\n"
+                    for suggestion in symptom_result:
+                        drug_info = self.drug_database.get(suggestion.drug_key)
+                        if drug_info:
+                            response += f"💊 **{drug_info.get('name_ar', suggestion.name)}** - {drug_info.get('general_use_ar', 'مسكن وخافض حرارة')}\n"
                         else:
-                            response += f"💊 **{drug}** - مسكن وخافض حرارة\n"
+                            response += f"💊 **{suggestion.name}** - مسكن وخافض حرارة\n"
                     response += "\n⚠️ **مهم:** استشر الصيدلي للجرعة المناسبة"
                     response += "\n\n⚠️ **تنبيه طبي:** المعلومات المقدمة هنا لأغراض تعليمية عامة فقط ولا تغني عن الاستشارة الطبية المتخصصة."
                 else:
                     response = "🔎 Based on symptoms, these medications are suitable:\n\n"
-                    for drug in symptom_result:
-                        # البحث عن معلومات الدواء
-                        drug_key = self.find_drug(drug)
-                        if drug_key and drug_key in self.drug_database:
-                            drug_info = self.drug_database[drug_key]
-                            response += f"💊 **{drug_info.get('name_en', drug)}** - {drug_info.get('general_use_en', 'pain reliever and fever reducer')}\n"
+                    for suggestion in symptom_result:
+                        drug_info = self.drug_database.get(suggestion.drug_key)
+                        if drug_info:
+                            response += f"💊 **{drug_info.get('name_en', suggestion.name)}** - {drug_info.get('general_use_en', 'pain reliever and fever reducer')}\n"
                         else:
-                            response += f"💊 **{drug}** - pain reliever and fever reducer\n"
+                            response += f"💊 **{suggestion.name}** - pain reliever and fever reducer\n"
                     response += "\n⚠️ **Important:** Consult pharmacist for proper dosage"
                     response += "\n\n⚠️ **Medical Disclaimer:** Information provided here is for general educational purposes only and does not replace professional medical consultation."
                 return response
@@ -287,25 +211,21 @@ class LightweightMedicalBot:
             if not drug_key:
                 return self.handle_unknown_drug(user_input, language)
             
-            drug_info = self.drug_database.get(drug_key)
-            if not drug_info:
+            if not self.drug_database.get(drug_key):
                 return self.handle_unknown_drug(user_input, language)
             
             # تحديد نوع الطلب
             intent = self.detect_intent(user_input)
             
-            if intent == 'dosage_request':
-                return self.handle_dosage_request(drug_info, language)
-            elif intent == 'alternatives_request':
-                return self.handle_alternatives(drug_info, language)
-            elif intent == 'interaction_check':
-                return self.handle_interactions(drug_info, language)
-            elif intent == 'side_effects':
-                return self.handle_side_effects(drug_info, language)
-            elif intent == 'warnings':
-                return self.handle_warnings(drug_info, language)
-            else:
-                return self.handle_drug_info(drug_info, language)
+            # دواء مع اسم فئة بدون طلب آخر: "هل X من الفئة؟" انتماء، و"X مع فئة يتداخل معها" تداخل
+            class_code = self.snapshot.ontology.mentioned_class(user_input)
+            if intent == 'drug_info' and class_code:
+                if self.snapshot.ontology.asks_membership(user_input):
+                    return self.answer_class_question(drug_key, class_code, language)
+                if self.interacts_with_class(drug_key, class_code):
+                    intent = 'interaction_check'
+            
+            return self.renderer.render(drug_key, RESPONSE_INTENTS.get(intent, 'drug_info'), language)
         
         # إذا لم نتمكن من تحديد النية
         if language == 'ar':
@@ -313,132 +233,24 @@ class LightweightMedicalBot:
         else:
             return "Sorry, I couldn't understand your request. Please write a clear medical question or drug name."
     
-    def handle_dosage_request(self, drug_info: Dict, language: str) -> str:
-        """رفض إعطاء جرعات"""
-        if language == 'ar':
-            return f"""🚫 لا يمكنني إعطاء جرعة {drug_info['name_ar']}
-
-⚠️ الجرعة تحتاج حساب دقيق حسب العمر والوزن والحالة الصحية.
-
-👨‍⚕️ استشر صيدلي أو طبيب للجرعة الصحيحة"""
-        else:
-            return f"""🚫 Cannot provide dosage for {drug_info['name_en']}
-
-⚠️ Dosage requires precise calculation based on age, weight, and condition.
-
-👨‍⚕️ Consult pharmacist or doctor for correct dosage"""
-    
-    def handle_alternatives(self, drug_info: Dict, language: str) -> str:
-        """معالجة البدائل"""
-        if language == 'ar':
-            alternatives = drug_info.get('alternatives_ar', [])
-            alternatives_text = '\n• '.join(alternatives) if alternatives else "لا توجد بدائل مسجلة"
-            return f"""💊 بدائل {drug_info['name_ar']}:
-
-• {alternatives_text}
-
-👨‍⚕️ استشر الصيدلي قبل التبديل"""
-        else:
-            alternatives = drug_info.get('alternatives_en', [])
-            alternatives_text = '\n• '.join(alternatives) if alternatives else "No alternatives recorded"
-            return f"""💊 Alternatives to {drug_info['name_en']}:
-
-• {alternatives_text}
-
-👨‍⚕️ Consult pharmacist before switching"""
-    
-    def handle_interactions(self, drug_info: Dict, language: str) -> str:
-        """معالجة التداخلات"""
-        if language == 'ar':
-            interactions = drug_info.get('interactions_ar', [])
-            interactions_text = '\n• '.join(interactions) if interactions else "لا توجد تداخلات مسجلة"
-            return f"""⚠️ تداخلات {drug_info['name_ar']}:
-
-• {interactions_text}
-
-👨‍⚕️ تجنب هذه المواد مع الدواء"""
-        else:
-            interactions = drug_info.get('interactions_en', [])
-            interactions_text = '\n• '.join(interactions) if interactions else "No interactions recorded"
-            return f"""⚠️ {drug_info['name_en']} interactions:
-
-• {interactions_text}
-
-👨‍⚕️ Avoid these substances with the medication"""
-    
-    def handle_side_effects(self, drug_info: Dict, language: str) -> str:
-        """معالجة الآثار الجانبية"""
-        if language == 'ar':
-            return f"""⚠️ الآثار الجانبية المحتملة لـ {drug_info['name_ar']}:
-
-• غثيان خفيف
-• صداع طفيف
-• اضطراب معدة
-
-⚠️ توقف واستشر طبيب إذا ظهرت:
-• حساسية أو طفح جلدي
-• صعوبة تنفس
-• ألم شديد
-
-👨‍⚕️ استشر الصيدلي لمعلومات محددة"""
-        else:
-            return f"""⚠️ Possible side effects of {drug_info['name_en']}:
-
-• Mild nausea
-• Slight headache
-• Stomach upset
-
-⚠️ Stop and consult doctor if you experience:
-• Allergic reaction or rash
-• Breathing difficulties
-• Severe pain
-
-👨‍⚕️ Consult pharmacist for specific information"""
-    
-    def handle_warnings(self, drug_info: Dict, language: str) -> str:
-        """معالجة التحذيرات"""
-        if language == 'ar':
-            warnings = drug_info.get('warnings_ar', [])
-            warnings_text = '\n• '.join(warnings) if warnings else "لا توجد تحذيرات مسجلة"
-            return f"""⚠️ تحذيرات مهمة لـ {drug_info['name_ar']}:
-
-• {warnings_text}
-
-👨‍⚕️ استشر طبيب قبل الاستخدام"""
-        else:
-            warnings = drug_info.get('warnings_en', [])
-            warnings_text = '\n• '.join(warnings) if warnings else "No warnings recorded"
-            return f"""⚠️ Important warnings for {drug_info['name_en']}:
-
-• {warnings_text}
-
-👨‍⚕️ Consult doctor before use"""
-    
-    def handle_drug_info(self, drug_info: Dict, language: str) -> str:
-        """معلومات عامة عن الدواء"""
-        if language == 'ar':
-            return f"""💊 {drug_info['name_ar']} ({drug_info['name_en']})
-
-🔹 الاستخدام: {drug_info.get('general_use_ar', 'غير محدد')}
-🔹 التحذيرات: {', '.join(drug_info.get('warnings_ar', ['لا توجد'])[:2])}
-🔹 التداخلات: {', '.join(drug_info.get('interactions_ar', ['لا توجد'])[:2])}
-
-⚠️ بدون جرعة - استشر الصيدلي
-
-⚠️ **تنبيه طبي:** المعلومات المقدمة هنا لأغراض تعليمية عامة فقط ولا تغني عن الاستشارة الطبية المتخصصة."""
-        else:
-            return f"""💊 {drug_info['name_en']} ({drug_info['name_ar']})
-
-🔹 Use: {drug_info.get('general_use_en', 'Not specified')}
-🔹 Warnings: {', '.join(drug_info.get('warnings_en', ['None'])[:2])}
-🔹 Interactions: {', '.join(drug_info.get('interactions_en', ['None'])[:2])}
-
-⚠️ No dosage - consult pharmacist
-
-⚠️ **Medical Disclaimer:** Information provided here is for general educational purposes only and does not replace professional medical consultation."""
+    def interacts_with_class(self, drug_key: str, class_code: str) -> bool:
+        """هل في تداخلات الدواء المسجلة اسم الفئة أو أحد أسمائها؟"""
+        drug_info = self.drug_database.get(drug_key, {})
+        entries = drug_info.get('interactions_en', []) + drug_info.get('interactions_ar', [])
+        return any(self.snapshot.ontology.resolve_class(entry) == class_code for entry in entries)
+
+    def answer_class_question(self, drug_key: str, class_code: str, language: str) -> str:
+        """هل الدواء من الفئة؟ (عضوية bitset تشمل الفئات الفرعية)"""
+        ontology = self.snapshot.ontology
+        drug_info = self.drug_database.get(drug_key)
+        drug_classes = [ontology.class_info(code) for code in ontology.classes_of(drug_key, include_ancestors=False)]
+        return class_membership_response(drug_info.get(f'name_{language}', drug_key), ontology.class_info(class_code),
+                                         ontology.is_member(drug_key, class_code), drug_classes, language)
     
     def handle_unknown_drug(self, query: str, language: str) -> str:
         """معالجة الاستفسارات باستخدام APIs الطبية والـ AI - لا نقول أبداً 'لم أجد'"""
+        # رد الخدمات الخارجية لا يُخزن
+        self.response_cache.skip()
         
         # استخدام النظام المحسن: API ثم AI
         return self.enhanced_bot.process_medical_query(query, language)
@@ -450,6 +262,22 @@ def process_user_input(user_text):
     
     return st.session_state.bot.process_user_input(user_text)
 
+def answer_once(user_text: str) -> str:
+    """الرد على النص مرة واحدة في الجلسة: إعادة تشغيل السكربت لا تعيد المعالجة ولا طلبات APIs"""
+    if 'bot' not in st.session_state:
+        st.session_state.bot = LightweightMedicalBot()
+    fingerprint = hashlib.sha1(
+        f"{st.session_state.bot.formulary_version}\n{canonical_query(user_text)}".encode('utf-8')
+    ).hexdigest()
+    answers = st.session_state.setdefault('answers', OrderedDict())
+    if fingerprint in answers:
+        answers.move_to_end(fingerprint)
+    else:
+        answers[fingerprint] = process_user_input(user_text)
+        if len(answers) > SESSION_ANSWERS:
+            answers.popitem(last=False)
+    return answers[fingerprint]
+
 def main():
     st.set_page_config(
         page_title="البوت الطبي الآمن - النسخة الخفيفة",
@@ -478,13 +306,17 @@ def main():
     
     st.markdown("---")
     
-    # واجهة الإدخال المطلوبة
-    user_input = st.text_input("اكتب سؤالك:")
+    # واجهة الإدخال المطلوبة: المعالجة عند الإرسال فقط، لا عند كل إعادة تشغيل
+    with st.form('query_form'):
+        user_input = st.text_input("اكتب سؤالك:")
+        submitted = st.form_submit_button("إرسال")
     
-    if user_input:
+    if submitted and user_input.strip():
         with st.spinner("جاري المعالجة..."):
-            response = process_user_input(user_input)
-            st.write(response)
+            st.session_state.last_answer = answer_once(user_input)
+    
+    if st.session_state.get('last_answer'):
+        st.write(st.session_state.last_answer)
     
     # أمثلة للاستخدام
     st.markdown("### 💡 أمثلة للتجربة:")
@@ -492,20 +324,20 @@ def main():
     
     with col1:
         if st.button("معلومات عن بندول"):
-            response = process_user_input("معلومات عن بندول")
+            response = answer_once("معلومات عن بندول")
             st.write(response)
         
         if st.button("بدائل أوجمنتين"):
-            response = process_user_input("بدائل أوجمنتين")
+            response = answer_once("بدائل أوجمنتين")
             st.write(response)
     
     with col2:
         if st.button("تداخل الأدوية"):
-            response = process_user_input("تداخل باراسيتامول")
+            response = answer_once("تداخل باراسيتامول")
             st.write(response)
         
         if st.button("Information about Paracetamol"):
-            response = process_user_input("Information about Paracetamol")
+            response = answer_once("Information about Paracetamol")
             st.write(response)
     
     # تحذيرات الأمان
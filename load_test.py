@@ -0,0 +1,383 @@
+import abc
+import argparse
+import io
+import json
+import os
+import random
+import threading
+import time
+import urllib.request
+import uuid
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from response_cache import cache_stats
+
+# استفسارات واقعية ثنائية اللغة لكل فئة
+QUERIES = {
+    'safety': [
+        "جرعة بندول للطفل", "دواء آمن للحامل", "عندي ألم في الصدر", "ابني عمره سنتين عنده حرارة",
+        "pregnant can I take panadol", "dose for my baby", "chest pain and shortness of breath"
+    ],
+    'drug_info': [
+        "معلومات عن بندول", "بدائل أوجمنتين", "أعراض جانبية أوجمنتين", "تحذير بندول", "جرعة Augmentin",
+        "Information about Paracetamol", "panadol side effects", "alternatives to augmentin", "warning augmentin",
+        "عندي صداع", "أبي دواء للحرارة", "كحة ناشفة من يومين", "I have headache", "fever"
+    ],
+    'interaction': [
+        "تداخل باراسيتامول", "تداخل Brufen مع Panadol", "interaction paracetamol",
+        "Brufen and Panadol together", "warfarin with aspirin", "هل أقدر آخذ بندول مع بروفين"
+    ],
+    'unknown': [
+        "معلومات عن ميتفورمين", "what is atorvastatin", "omeprazole side effects", "لوسارتان للضغط",
+        "is sertraline addictive", "ما هو دواء الليريكا"
+    ],
+    'smalltalk': ["مرحبا", "hello", "كيفك", "how are you", "السلام عليكم"],
+    'ocr': ["Panadol 500mg\nAugmentin 625mg", "Brufen 400mg\nPanadol 1000mg", "Zanidip 10mg"]
+}
+
+# أوزان الفئات لكل سيناريو حمل
+MIXES = {
+    'default': {'safety': 0.15, 'drug_info': 0.40, 'interaction': 0.15, 'unknown': 0.15, 'smalltalk': 0.10, 'ocr': 0.05},
+    'pharmacy_rush': {'safety': 0.10, 'drug_info': 0.55, 'interaction': 0.25, 'unknown': 0.05, 'smalltalk': 0.05},
+    'api_heavy': {'safety': 0.05, 'drug_info': 0.20, 'interaction': 0.05, 'unknown': 0.65, 'smalltalk': 0.05},
+    'ocr_heavy': {'drug_info': 0.40, 'interaction': 0.20, 'smalltalk': 0.10, 'ocr': 0.30},
+}
+
+class StubAPIHandler(BaseHTTPRequestHandler):
+    """محاكاة OpenFDA و OpenAI محلياً بزمن استجابة قابل للضبط"""
+
+    latency = 0.05
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, payload: Dict):
+        time.sleep(random.expovariate(1.0 / self.latency) if self.latency else 0)
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.startswith('/drug/label.json'):
+            # نصف الأدوية غير موجودة حتى يصل جزء من الطلبات إلى نموذج AI
+            if random.random() < 0.5:
+                self._reply({'results': []})
+                return
+            self._reply({'results': [{
+                'openfda': {'brand_name': ['Stubdrug'], 'generic_name': ['stubamine']},
+                'indications_and_usage': ['Used for load testing only.'],
+                'warnings': ['Do not use in production.'],
+                'adverse_reactions': ['Latency.'],
+                'drug_interactions': ['None known.']
+            }]})
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        self.rfile.read(length)
+        if self.path.endswith('/chat/completions'):
+            self._reply({
+                'id': 'stub', 'object': 'chat.completion', 'created': int(time.time()), 'model': 'stub',
+                'choices': [{'index': 0, 'finish_reason': 'stop',
+                             'message': {'role': 'assistant', 'content': 'This is general educational information only.'}}],
+                'usage': {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0}
+            })
+        else:
+            self.send_error(404)
+
+def start_stub_server(latency_ms: float) -> ThreadingHTTPServer:
+    """تشغيل الخادم المحلي وتوجيه التطبيق إليه عبر متغيرات البيئة"""
+    StubAPIHandler.latency = latency_ms / 1000.0
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubAPIHandler)
+    threading.Thread(target=server.serve_forever, name='stub-api', daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    os.environ['OPENFDA_BASE_URL'] = f"{base}/drug"
+    os.environ['OPENAI_API_BASE'] = f"{base}/v1"
+    os.environ.setdefault('OPENAI_API_KEY', 'stub-key')
+    return server
+
+def prescription_image(text: str):
+    """صورة وصفة بسيطة لاختبار مسار OCR"""
+    from PIL import Image, ImageDraw
+
+    image = Image.new('RGB', (480, 60 + 40 * text.count('\n')), 'white')
+    ImageDraw.Draw(image).multiline_text((20, 20), text, fill='black', spacing=16)
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    buffer.seek(0)
+    return buffer
+
+class Session(abc.ABC):
+    """جلسة مستخدم واحدة: واجهة موحدة لكل أنواع الأهداف"""
+
+    @abc.abstractmethod
+    def send(self, category: str, query: str):
+        ...
+
+class LightweightSession(Session):
+    def __init__(self):
+        from lightweight_chatbot import LightweightMedicalBot
+        self.bot = LightweightMedicalBot()
+
+    def send(self, category: str, query: str):
+        if category == 'ocr':
+            query = query.split('\n')[0]
+        return self.bot.process_user_input(query)
+
+class AdvancedSession(Session):
+    def __init__(self):
+        from main import AdvancedMedicalChatbot
+        self.bot = AdvancedMedicalChatbot()
+
+    def send(self, category: str, query: str):
+        if category == 'ocr':
+            from PIL import Image
+            from main import PrescriptionOCR
+            # نفس مسار التطبيق عند رفع وصفة
+            return PrescriptionOCR().extract_drug_info(Image.open(prescription_image(query)))
+        return self.bot.process_query(query, self.bot.detect_language(query))
+
+class StreamlitSession(Session):
+    """تشغيل سكربت Streamlit الحقيقي (بما فيه إعادة التشغيل الكاملة لكل رسالة) عبر AppTest"""
+
+    def __init__(self, script: str):
+        from streamlit.testing.v1 import AppTest
+        self.app = AppTest.from_file(script, default_timeout=60)
+        self.app.run()
+        self.is_main = os.path.basename(script) == 'main.py'
+
+    def send(self, category: str, query: str):
+        if category == 'ocr':
+            query = query.split('\n')[0]
+        if self.is_main:
+            self.app.text_area(key='user_input_area').input(query)
+            next(button for button in self.app.button if button.label == 'إرسال | Send').click()
+        else:
+            self.app.text_input[0].input(query)
+            next(button for button in self.app.button if button.label == 'إرسال').click()
+        self.app.run()
+        if self.app.exception:
+            raise RuntimeError(self.app.exception[0].message)
+
+class HTTPSession(Session):
+    """واجهة JSON بدون واجهة رسومية: POST {session_id, message}"""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.session_id = uuid.uuid4().hex
+
+    def send(self, category: str, query: str):
+        body = json.dumps({'session_id': self.session_id, 'message': query}, ensure_ascii=False).encode('utf-8')
+        request = urllib.request.Request(self.url, data=body, headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(request, timeout=60) as response:
+            if response.status != 200:
+                raise RuntimeError(f"HTTP {response.status}")
+            return json.loads(response.read().decode('utf-8'))
+
+class ResourceSampler:
+    """قراءة CPU و RSS للعمليات من /proc على فترات منتظمة"""
+
+    def __init__(self, pids: List[int], interval: float = 1.0):
+        self.pids = pids
+        self.interval = interval
+        self.samples = []
+        self._stopped = threading.Event()
+        self._ticks = os.sysconf('SC_CLK_TCK')
+        self._page = os.sysconf('SC_PAGE_SIZE')
+        self._thread = threading.Thread(target=self._run, name='resource-sampler', daemon=True)
+
+    def _read(self, pid: int):
+        try:
+            with open(f'/proc/{pid}/stat') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+            with open(f'/proc/{pid}/statm') as f:
+                rss_pages = int(f.read().split()[1])
+        except OSError:
+            return None
+        # utime و stime هما الحقلان 14 و 15 (بعد اسم العملية)
+        return (int(fields[11]) + int(fields[12])) / self._ticks, rss_pages * self._page
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        started = time.perf_counter()
+        previous = {pid: self._read(pid) for pid in self.pids}
+        last = started
+        while not self._stopped.wait(self.interval):
+            now = time.perf_counter()
+            for pid in self.pids:
+                current = self._read(pid)
+                if current is None or previous.get(pid) is None:
+                    continue
+                cpu = (current[0] - previous[pid][0]) / (now - last) * 100
+                self.samples.append({'t': round(now - started, 2), 'pid': pid, 'cpu_percent': round(cpu, 1),
+                                     'rss_mb': round(current[1] / 1e6, 1)})
+                previous[pid] = current
+            last = now
+
+class LoadGenerator:
+    """وصول الجلسات بتوزيع Poisson، وكل جلسة ترسل عدة رسائل مع زمن تفكير عشوائي"""
+
+    def __init__(self, session_factory: Callable[[], Session], mix: Dict[str, float], arrival_rate: float,
+                 duration: float, turns: int = 5, think_time: float = 3.0, seed: int = 42):
+        self.session_factory = session_factory
+        self.categories = list(mix)
+        self.weights = [mix[category] for category in self.categories]
+        self.arrival_rate = arrival_rate
+        self.duration = duration
+        self.turns = turns
+        self.think_time = think_time
+        self.rng = random.Random(seed)
+        self.results = []
+        self.lock = threading.Lock()
+        self.active = 0
+        self.peak_active = 0
+
+    def _record(self, **result):
+        with self.lock:
+            self.results.append(result)
+
+    def _session(self, seed: int):
+        rng = random.Random(seed)
+        with self.lock:
+            self.active += 1
+            self.peak_active = max(self.peak_active, self.active)
+        try:
+            started = time.perf_counter()
+            try:
+                session = self.session_factory()
+            except Exception as e:
+                self._record(category='session_start', latency=time.perf_counter() - started, error=str(e))
+                return
+            self._record(category='session_start', latency=time.perf_counter() - started, error=None)
+
+            for turn in range(max(1, int(rng.expovariate(1.0 / self.turns)) + 1)):
+                category = rng.choices(self.categories, self.weights)[0]
+                query = rng.choice(QUERIES[category])
+                started = time.perf_counter()
+                error = None
+                try:
+                    session.send(category, query)
+                except Exception as e:
+                    error = f"{type(e).__name__}: {e}"
+                self._record(category=category, latency=time.perf_counter() - started, error=error)
+                if self.think_time:
+                    time.sleep(rng.expovariate(1.0 / self.think_time))
+        finally:
+            with self.lock:
+                self.active -= 1
+
+    def run(self) -> float:
+        threads = []
+        started = time.perf_counter()
+        next_arrival = 0.0
+        while next_arrival < self.duration:
+            delay = started + next_arrival - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            thread = threading.Thread(target=self._session, args=(self.rng.getrandbits(32),), daemon=True)
+            thread.start()
+            threads.append(thread)
+            next_arrival += self.rng.expovariate(self.arrival_rate)
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - started
+
+def summarize(results: List[Dict], elapsed: float) -> Dict:
+    by_category = defaultdict(list)
+    for result in results:
+        by_category[result['category']].append(result)
+    by_category['all'] = [result for result in results if result['category'] != 'session_start']
+
+    summary = {}
+    for category, items in by_category.items():
+        latencies_ms = np.array([item['latency'] for item in items]) * 1000
+        errors = [item['error'] for item in items if item['error']]
+        summary[category] = {
+            'requests': len(items),
+            'throughput': len(items) / elapsed if elapsed else 0.0,
+            'error_rate': len(errors) / len(items) if items else 0.0,
+            'p50_ms': float(np.percentile(latencies_ms, 50)) if len(items) else 0.0,
+            'p95_ms': float(np.percentile(latencies_ms, 95)) if len(items) else 0.0,
+            'p99_ms': float(np.percentile(latencies_ms, 99)) if len(items) else 0.0,
+            'sample_error': errors[0] if errors else None
+        }
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description="اختبار حمل بجلسات محادثة متزامنة")
+    parser.add_argument('--target', choices=['lightweight', 'advanced', 'streamlit', 'http'], default='lightweight')
+    parser.add_argument('--script', default='main.py', help="سكربت Streamlit للهدف streamlit")
+    parser.add_argument('--url', default='http://127.0.0.1:8000/chat', help="عنوان الواجهة للهدف http")
+    parser.add_argument('--pids', default='', help="أرقام عمليات الخادم لقياس CPU/RSS (للهدف http)")
+    parser.add_argument('--mix', choices=sorted(MIXES), default='default')
+    parser.add_argument('--rate', type=float, default=2.0, help="معدل وصول الجلسات في الثانية")
+    parser.add_argument('--duration', type=float, default=30.0, help="مدة وصول الجلسات بالثواني")
+    parser.add_argument('--turns', type=float, default=5, help="متوسط عدد الرسائل لكل جلسة")
+    parser.add_argument('--think-time', type=float, default=3.0, help="متوسط زمن التفكير بين الرسائل")
+    parser.add_argument('--stub-latency-ms', type=float, default=80.0)
+    parser.add_argument('--no-stub', action='store_true', help="استخدام APIs الحقيقية بدل الخادم المحلي")
+    parser.add_argument('--sample-interval', type=float, default=1.0)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help="حفظ النتائج الكاملة كـ JSON")
+    args = parser.parse_args()
+
+    if not args.no_stub:
+        start_stub_server(args.stub_latency_ms)
+
+    factories = {
+        'lightweight': LightweightSession,
+        'advanced': AdvancedSession,
+        'streamlit': lambda: StreamlitSession(args.script),
+        'http': lambda: HTTPSession(args.url),
+    }
+    pids = [int(pid) for pid in args.pids.split(',') if pid] or [os.getpid()]
+    sampler = ResourceSampler(pids, args.sample_interval).start()
+
+    generator = LoadGenerator(factories[args.target], MIXES[args.mix], args.rate, args.duration,
+                              args.turns, args.think_time, args.seed)
+    elapsed = generator.run()
+    sampler.stop()
+    summary = summarize(generator.results, elapsed)
+
+    print(f"target={args.target} mix={args.mix} rate={args.rate}/s duration={elapsed:.1f}s "
+          f"peak sessions={generator.peak_active}")
+    print(f"{'category':<14} {'reqs':>6} {'req/s':>8} {'err%':>6} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for category, stats in sorted(summary.items()):
+        print(f"{category:<14} {stats['requests']:>6} {stats['throughput']:>8.1f} {stats['error_rate']:>6.1%} "
+              f"{stats['p50_ms']:>9.1f} {stats['p95_ms']:>9.1f} {stats['p99_ms']:>9.1f}")
+    for category, stats in sorted(summary.items()):
+        if stats['sample_error']:
+            print(f"  {category} error: {stats['sample_error']}")
+
+    # ذاكرة الردود في نفس العملية (أهداف lightweight و advanced)
+    for name, stats in cache_stats().items():
+        print(f"response cache {name}: hit rate {stats['hit_rate']:.1%} ({stats['hits']}/{stats['hits'] + stats['misses']}), "
+              f"entries {stats['entries']}, skipped {stats['skipped']}, invalidations {stats['invalidations']}")
+
+    if sampler.samples:
+        print(f"\n{'t(s)':>6} {'pid':>8} {'cpu%':>7} {'rss MB':>8}")
+        for sample in sampler.samples:
+            print(f"{sample['t']:>6.1f} {sample['pid']:>8} {sample['cpu_percent']:>7.1f} {sample['rss_mb']:>8.1f}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'summary': summary, 'resources': sampler.samples, 'args': vars(args)}, f,
+                      ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
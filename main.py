@@ -1,22 +1,65 @@
 import streamlit as st
-from PIL import Image
-import pandas as pd
-import numpy as np
 import json
+import os
 import re
+import hashlib
+import threading
+import time
+import uuid
 from datetime import datetime
-import requests
-import io
-import easyocr
-import cv2
+from streamlit.errors import StreamlitAPIException
 from typing import Dict, List, Tuple, Optional
 from difflib import SequenceMatcher
-import Levenshtein
+from response_templates import ResponseRenderer, class_membership_response
+from interaction_index import InteractionIndex
+from drug_ontology import DrugOntology
+from drug_records import compact_database
+from formulary_reloader import build_safety_matchers, safety_category
+from index_artifact import DEFAULT_ARTIFACT, IndexArtifact
+from shared_formulary import content_version, publish
+from arabic_normalizer import tokenize
+from query_analysis import Lexicon, analyze
+from intent_engine import get_intent_engine
+from response_cache import get_response_cache
+from chat_history_store import ChatHistoryStore
+
+# عدد الرسائل المعروضة في كل صفحة من المحادثة
+CHAT_PAGE_SIZE = 10
+
+# أجزاء الصفحة التي تُعاد وحدها عند التفاعل معها (وفي إصدارات Streamlit القديمة تُعاد الصفحة كلها)
+fragment = getattr(st, 'fragment', None) or getattr(st, 'experimental_fragment', None) or (lambda func: func)
+
+def rerun_fragment():
+    """إعادة تشغيل الجزء الحالي فقط، أو الصفحة كلها إذا لم تتوفر الأجزاء"""
+    try:
+        st.rerun(scope='fragment')
+    except (TypeError, StreamlitAPIException):
+        st.rerun()
+
+# قارئ OCR (easyocr + torch) يُحمّل عند أول وصفة فقط ويُشارك داخل العملية
+_ocr_reader = None
+_ocr_lock = threading.Lock()
+
+def get_ocr_reader():
+    global _ocr_reader
+    with _ocr_lock:
+        if _ocr_reader is None:
+            import easyocr
+            _ocr_reader = easyocr.Reader(['ar', 'en'])
+    return _ocr_reader
+
+def start_ocr_warmup() -> Optional[threading.Thread]:
+    """تحميل OCR في الخلفية بعد بدء التشغيل إذا فُعّل MEDICAL_BOT_OCR_WARMUP"""
+    if os.getenv('MEDICAL_BOT_OCR_WARMUP', '0') != '1' or _ocr_reader is not None:
+        return None
+    thread = threading.Thread(target=get_ocr_reader, name='ocr-warmup', daemon=True)
+    thread.start()
+    return thread
 
 class DrugAPIHandler:
     def __init__(self):
         # قاعدة بيانات شاملة للأدوية الشائعة
-        self.mock_drug_database = {
+        mock_drug_database = {
             "paracetamol": {
                 "name_ar": "باراسيتامول",
                 "name_en": "Paracetamol",
@@ -147,20 +190,34 @@ class DrugAPIHandler:
             }
         }
 
-    def search_drug(self, drug_name: str, language: str = 'ar') -> Optional[Dict]:
-        """البحث عن دواء في قاعدة البيانات"""
+        # نسخة قاعدة البيانات لإبطال الردود المخزنة عند تغيرها
+        self.formulary_version = hashlib.sha1(
+            json.dumps(mock_drug_database, sort_keys=True, ensure_ascii=False).encode('utf-8')
+        ).hexdigest()[:12]
+
+        # جدول مشترك بين العمليات (أو سجلات مضغوطة خاصة إذا تعذرت المشاركة)
+        shared = publish('mock_formulary', self.formulary_version, drug_database=mock_drug_database)
+        self.mock_drug_database = shared.drug_table() if shared else compact_database(mock_drug_database)
+
+    def resolve_drug_key(self, drug_name: str) -> Optional[str]:
+        """إرجاع مفتاح الدواء في قاعدة البيانات"""
         drug_name_clean = drug_name.lower().strip()
 
         for key, drug_info in self.mock_drug_database.items():
             if (drug_name_clean in key.lower() or
                 drug_name_clean in drug_info.get('name_ar', '').lower() or
                 drug_name_clean in drug_info.get('name_en', '').lower()):
-                return drug_info
+                return key
 
         return None
 
+    def search_drug(self, drug_name: str, language: str = 'ar') -> Optional[Dict]:
+        """البحث عن دواء في قاعدة البيانات"""
+        drug_key = self.resolve_drug_key(drug_name)
+        return self.mock_drug_database[drug_key] if drug_key else None
+
 class MedicalSafetyChecker:
-    def __init__(self):
+    def __init__(self, artifact: Optional[IndexArtifact] = None):
         # قائمة إجبارية بكلمات الأطفال
         self.child_keywords = {
             'ar': [
@@ -205,50 +262,58 @@ class MedicalSafetyChecker:
             ]
         }
 
+        # نسخة القواعد: أي تعديل على الكلمات يبطل الردود المخزنة
+        self.version = content_version([self.child_keywords, self.pregnancy_keywords, self.emergency_keywords])
+
+        # آلة Aho-Corasick لكل لغة من ملف الفهارس إن كان مبنياً من نفس الكلمات، وإلا تُبنى هنا
+        if artifact is not None and artifact.section_version('advanced.safety') == self.version:
+            self.matchers = artifact.safety_matchers('advanced.safety')
+        else:
+            self.matchers = build_safety_matchers({
+                'children': self.child_keywords,
+                'pregnancy': self.pregnancy_keywords,
+                'emergency': self.emergency_keywords
+            })
+
     def check_safety_violations(self, user_input: str, language: str) -> Dict:
         """فحص انتهاكات السلامة الطبية 100%"""
-        user_input_lower = user_input.lower()
+        # تمريرة واحدة على النص، والأولوية: الأطفال ثم الحمل ثم الطوارئ
+        category = safety_category(self.matchers, user_input.lower(), language)
 
-        # 1) فحص كلمات الأطفال - ممنوع منعاً باتاً
-        child_words = self.child_keywords.get(language, [])
-        for word in child_words:
-            if word in user_input_lower:
-                return {
-                    'violation': True,
-                    'type': 'child_detected',
-                    'action': 'refer_to_pharmacist',
-                    'message_ar': 'هذه حالة أطفال، وجرعات الأطفال لازم تُحسب حسب الوزن والعمر. تحويل هذه الحالة للصيدلي مباشرة.',
-                    'message_en': 'This is a pediatric case. Child dosages must be calculated based on weight and age. Referring this case directly to pharmacist.'
-                }
+        # 1) كلمات الأطفال - ممنوع منعاً باتاً
+        if category == 'children':
+            return {
+                'violation': True,
+                'type': 'child_detected',
+                'action': 'refer_to_pharmacist',
+                'message_ar': 'هذه حالة أطفال، وجرعات الأطفال لازم تُحسب حسب الوزن والعمر. تحويل هذه الحالة للصيدلي مباشرة.',
+                'message_en': 'This is a pediatric case. Child dosages must be calculated based on weight and age. Referring this case directly to pharmacist.'
+            }
 
-        # 2) فحص كلمات الحوامل - ممنوع منعاً باتاً
-        pregnancy_words = self.pregnancy_keywords.get(language, [])
-        for word in pregnancy_words:
-            if word in user_input_lower:
-                return {
-                    'violation': True,
-                    'type': 'pregnancy_detected',
-                    'action': 'refer_to_pharmacist',
-                    'message_ar': 'الحوامل والمرضعات لهم أدوية محدودة. تحويل هذه الحالة للصيدلي مباشرة.',
-                    'message_en': 'Pregnant and breastfeeding women have limited medication options. Referring this case directly to pharmacist.'
-                }
+        # 2) كلمات الحوامل - ممنوع منعاً باتاً
+        if category == 'pregnancy':
+            return {
+                'violation': True,
+                'type': 'pregnancy_detected',
+                'action': 'refer_to_pharmacist',
+                'message_ar': 'الحوامل والمرضعات لهم أدوية محدودة. تحويل هذه الحالة للصيدلي مباشرة.',
+                'message_en': 'Pregnant and breastfeeding women have limited medication options. Referring this case directly to pharmacist.'
+            }
 
-        # 3) فحص كلمات الطوارئ - تحويل فوري
-        emergency_words = self.emergency_keywords.get(language, [])
-        for word in emergency_words:
-            if word in user_input_lower:
-                return {
-                    'violation': True,
-                    'type': 'emergency_detected',
-                    'action': 'emergency_referral',
-                    'message_ar': '🚨 هذه علامة خطر. توجه للطوارئ فوراً أو اتصل بـ 997.',
-                    'message_en': '🚨 This is a danger sign. Go to emergency immediately or call 997.'
-                }
+        # 3) كلمات الطوارئ - تحويل فوري
+        if category == 'emergency':
+            return {
+                'violation': True,
+                'type': 'emergency_detected',
+                'action': 'emergency_referral',
+                'message_ar': '🚨 هذه علامة خطر. توجه للطوارئ فوراً أو اتصل بـ 997.',
+                'message_en': '🚨 This is a danger sign. Go to emergency immediately or call 997.'
+            }
 
         return {'violation': False}
 
 class AdvancedSymptomParser:
-    def __init__(self):
+    def __init__(self, artifact: Optional[IndexArtifact] = None):
         # قاموس شامل للألفاظ العامية الطبية
         self.slang_normalization = {
             # ألفاظ الألم العامة
@@ -415,6 +480,21 @@ class AdvancedSymptomParser:
             'warfarin': 'warfarin'
         }
 
+        # القواميس الثابتة تُقرأ من ملف الفهارس (أو النسخة المشتركة بين العمليات) بدل نسخة لكل عملية
+        string_maps = {'drug_synonyms': self.drug_synonyms, 'slang_normalization': self.slang_normalization}
+        self.version = content_version(string_maps)
+        if artifact is not None and artifact.section_version('advanced.symptom_parser') == self.version:
+            shared = artifact
+        else:
+            shared = publish('symptom_parser', self.version, string_maps=string_maps)
+        if shared is not None:
+            self.drug_synonyms = shared.string_map('drug_synonyms')
+            self.slang_normalization = shared.string_map('slang_normalization')
+
+        # العامية والأسماء مفهرسة بكلماتها المطبعة: "يكح" و"الكحّة" و"كحه" تصل لنفس المفتاح
+        self.slang_lexicon = Lexicon((slang, tuple(tokenize(formal))) for slang, formal in self.slang_normalization.items())
+        self.drug_lexicon = Lexicon(self.drug_synonyms.items())
+
     def normalize_text(self, text: str) -> str:
         """تطبيع النص العامي إلى فصيح"""
         normalized = text.lower()
@@ -422,46 +502,46 @@ class AdvancedSymptomParser:
             normalized = normalized.replace(slang, formal)
         return normalized
 
-    def extract_drug_names(self, text: str) -> List[str]:
-        """استخراج أسماء الأدوية من النص"""
-        text_lower = text.lower()
-        found_drugs = []
-
-        for synonym, standard_name in self.drug_synonyms.items():
-            if synonym in text_lower:
-                found_drugs.append(standard_name)
+    def normalized_tokens(self, text: str) -> List[str]:
+        """كلمات النص المطبعة مع استبدال العامية بالفصحى كلمةً كلمة (الأطول أولاً)"""
+        tokens = analyze(text).tokens
+        index = self.slang_lexicon.index
+        result = []
+        position = 0
+        while position < len(tokens):
+            for size in range(min(self.slang_lexicon.max_tokens, len(tokens) - position), 0, -1):
+                entry = index.get(tokens[position:position + size])
+                if entry is not None:
+                    result.extend(entry[1])
+                    position += size
+                    break
+            else:
+                result.append(tokens[position])
+                position += 1
+        return result
 
-        return list(set(found_drugs))  # إزالة التكرار
+    def extract_drug_names(self, text: str) -> List[str]:
+        """استخراج أسماء الأدوية من النص (بدون تكرار)"""
+        return self.drug_lexicon.matches(text)
 
 class IntentClassifier:
-    def __init__(self):
-        self.symptom_parser = AdvancedSymptomParser()
+    def __init__(self, ontology: Optional[DrugOntology] = None, artifact: Optional[IndexArtifact] = None):
+        # تصنيف فئات الأدوية لأسئلة "هل الدواء من فئة كذا؟"
+        self.ontology = ontology or DrugOntology.load('drug_classes.json')
+        # كل مكون يقرأ أقسامه من ملف الفهارس إذا طابقت نسخة بياناته، وإلا يبنيها
+        self.symptom_parser = AdvancedSymptomParser(artifact)
         self.drug_api = DrugAPIHandler()
-        self.safety_checker = MedicalSafetyChecker()
+        self.safety_checker = MedicalSafetyChecker(artifact)
 
-        # Intent patterns for accurate classification
-        self.intent_patterns = {
-            'GET_DOSAGE': {
-                'ar': ['جرعة', 'جرعات', 'كمية', 'مقدار', 'كم مرة', 'كيف آخذ', 'طريقة استخدام'],
-                'en': ['dosage', 'dose', 'how much', 'how many times', 'how to take', 'quantity', 'amount']
-            },
-            'GET_ALTERNATIVES': {
-                'ar': ['بديل', 'بدائل', 'مثيل', 'أي دواء آخر', 'شبيه', 'نفس التأثير'],
-                'en': ['alternative', 'alternatives', 'similar', 'replacement', 'substitute', 'other drug']
-            },
-            'GET_INTERACTION': {
-                'ar': ['تداخل', 'تفاعل', 'مع بعض', 'آمان', 'يتعارض', 'ينفع مع'],
-                'en': ['interaction', 'interactions', 'together', 'with', 'safe', 'conflict', 'mix', 'combine']
-            },
-            'GET_SIDE_EFFECTS': {
-                'ar': ['أعراض جانبية', 'آثار جانبية', 'مضاعفات', 'أضرار'],
-                'en': ['side effects', 'side effect', 'adverse effects', 'reactions', 'complications']
-            },
-            'GET_WARNINGS': {
-                'ar': ['تحذيرات', 'تحذير', 'خطورة', 'احتياطات', 'انتبه'],
-                'en': ['warnings', 'warning', 'precautions', 'cautions', 'contraindications']
-            }
-        }
+        # مصفوفة التداخلات بين كل الأدوية المعروفة (تفرق "دواء مع فئة" عن سؤال الانتماء)
+        self.interaction_index = InteractionIndex(
+            self.drug_api.mock_drug_database, self.symptom_parser.drug_synonyms, self.ontology, artifact,
+            version=content_version([self.drug_api.formulary_version, self.symptom_parser.version,
+                                     self.ontology.content_version])
+        )
+
+        # عبارات النوايا وأوزانها من intent_lexicon.json (مشتركة مع البوت الخفيف)
+        self.intent_engine = get_intent_engine()
 
         # الردود الجاهزة لكل عرض
         self.symptom_responses = {
@@ -497,6 +577,14 @@ class IntentClassifier:
             }
         }
 
+        # فهرس مقلوب بالكلمات المطبعة بدل البحث عن كل عرض كنص جزئي
+        self.symptom_lexicon = Lexicon((symptom, symptom) for symptom in self.symptom_responses)
+
+    def find_symptom(self, user_input: str) -> Optional[str]:
+        """أول عرض (بترتيب الردود) مذكور في النص بعد تطبيع العامية"""
+        symptoms = self.symptom_lexicon.match_tokens(self.symptom_parser.normalized_tokens(user_input))
+        return symptoms[0] if symptoms else None
+
     def fuzzy_match_drug(self, input_drug: str) -> Tuple[str, float]:
         """Fuzzy matching للأدوية مع تهجئة خاطئة"""
         best_match = None
@@ -551,7 +639,9 @@ class IntentClassifier:
 
     def detect_intent(self, user_input: str, language: str) -> str:
         """كشف الـ Intent بدقة عالية مع أولوية للأدوية"""
-        user_input_lower = user_input.lower()
+        # كل النوايا مرتبة بالنقاط، والعبارات القريبة من اسم دواء أثقل
+        ranked = self.intent_engine.rank(user_input, language, drugs=self.symptom_parser.drug_lexicon)
+        matched_intent = ranked[0].intent if ranked else None
 
         # فحص الأدوية أولاً - أهم شي
         detected_drugs = self.symptom_parser.extract_drug_names(user_input)
@@ -560,20 +650,16 @@ class IntentClassifier:
 
         if all_detected_drugs:
             # فحص Intent patterns للأدوية مع أولوية للأوامر المحددة
-            for intent, patterns in self.intent_patterns.items():
-                lang_patterns = patterns.get(language, [])
-                for pattern in lang_patterns:
-                    if pattern in user_input_lower:
-                        if intent == 'GET_DOSAGE':
-                            return 'GET_DOSAGE'
-                        elif intent == 'GET_ALTERNATIVES':
-                            return 'GET_ALTERNATIVES'
-                        elif intent == 'GET_INTERACTION':
-                            return 'GET_INTERACTION'
-                        elif intent == 'GET_SIDE_EFFECTS':
-                            return 'GET_SIDE_EFFECTS'
-                        elif intent == 'GET_WARNINGS':
-                            return 'GET_WARNINGS'
+            if matched_intent:
+                return matched_intent
+
+            # دواء مع اسم فئة: "هل X من الفئة؟" انتماء، و"X مع فئة يتداخل معها" تداخل
+            class_code = self.ontology.mentioned_class(user_input)
+            if class_code:
+                if self.ontology.asks_membership(user_input):
+                    return 'GET_CLASS_MEMBERSHIP'
+                if self.interacts_with_class(all_detected_drugs, class_code):
+                    return 'GET_INTERACTION'
 
             # إذا كان فيه دوائين أو أكثر = تداخل
             if len(all_detected_drugs) >= 2:
@@ -583,20 +669,21 @@ class IntentClassifier:
             return 'GET_DRUG_INFO'
 
         # فحص Intent patterns العامة (بدون أدوية)
-        for intent, patterns in self.intent_patterns.items():
-            lang_patterns = patterns.get(language, [])
-            for pattern in lang_patterns:
-                if pattern in user_input_lower:
-                    return intent
+        if matched_intent:
+            return matched_intent
 
         # فحص الأعراض فقط إذا ما لقينا أدوية
-        normalized_text = self.symptom_parser.normalize_text(user_input)
-        for symptom in self.symptom_responses.keys():
-            if symptom in normalized_text:
-                return 'GET_SYMPTOM_SUGGESTION'
+        if self.find_symptom(user_input):
+            return 'GET_SYMPTOM_SUGGESTION'
 
         return 'CLARIFY'
 
+    def interacts_with_class(self, drug_names: List[str], code: str) -> bool:
+        """هل لأحد الأدوية تداخل مسجل مع الفئة في مصفوفة التداخلات؟"""
+        class_node = f"class:{code}"
+        return any(class_node in self.interaction_index.interacts_with(self.interaction_index.resolve(drug_name))
+                   for drug_name in drug_names)
+
     def classify_input(self, user_input: str, language: str) -> Dict:
         """تصنيف محسّن للمدخلات"""
 
@@ -624,6 +711,13 @@ class IntentClassifier:
             else:
                 return {'classification': 'UnknownDrug', 'original_input': user_input}
 
+        elif intent == 'GET_CLASS_MEMBERSHIP':
+            detected_drugs = self.symptom_parser.extract_drug_names(user_input)
+            if not detected_drugs:
+                detected_drugs = self._extract_drugs_with_fuzzy(user_input)
+            return {'classification': 'ClassMembership', 'drugs': detected_drugs,
+                    'class': self.ontology.mentioned_class(user_input)}
+
         elif intent == 'GET_DOSAGE':
             detected_drugs = self.symptom_parser.extract_drug_names(user_input)
             if not detected_drugs:
@@ -650,6 +744,11 @@ class IntentClassifier:
                 # محاولة استخراج دوائين من النص
                 detected_drugs = self._extract_drugs_with_fuzzy(user_input)
 
+            # الفئة المذكورة طرف في الفحص إذا كان للدواء تداخل معها
+            class_code = self.ontology.mentioned_class(user_input)
+            if class_code and self.interacts_with_class(detected_drugs, class_code):
+                detected_drugs = detected_drugs + [class_code]
+
             if len(detected_drugs) >= 2:
                 return {'classification': 'InteractionCheck', 'drugs': detected_drugs}
             elif len(detected_drugs) == 1:
@@ -679,22 +778,49 @@ class IntentClassifier:
                 return {'classification': 'UnknownDrug', 'original_input': user_input}
 
         elif intent == 'GET_SYMPTOM_SUGGESTION':
-            normalized_text = self.symptom_parser.normalize_text(user_input)
-            for symptom, response_data in self.symptom_responses.items():
-                if symptom in normalized_text:
-                    return {
-                        'classification': 'SymptomAdvice',
-                        'symptom': symptom,
-                        'response': response_data[f'response_{language}']
-                    }
+            symptom = self.find_symptom(user_input)
+            if symptom:
+                return {
+                    'classification': 'SymptomAdvice',
+                    'symptom': symptom,
+                    'response': self.symptom_responses[symptom][f'response_{language}']
+                }
 
         return {'classification': 'Clarify'}
 
 class AdvancedMedicalChatbot:
     def __init__(self):
+        # زمن كل مرحلة تهيئة (يعرضه startup_report.py)
+        self.startup_timings = {}
+        started = time.perf_counter()
+
         self.setup_models()
+        started = self._record_stage('setup_models', started)
+        # تصنيف فئات الأدوية (للبدائل وأسئلة الفئات ومصفوفة التداخلات)
+        self.ontology = DrugOntology.load('drug_classes.json')
         self.drug_api = DrugAPIHandler()
-        self.intent_classifier = IntentClassifier()
+        # ملف الفهارس المبني مسبقاً (python index_artifact.py compile)، وكل قسم يُتحقق من نسخته عند قراءته
+        self.intent_classifier = IntentClassifier(self.ontology, IndexArtifact.open(DEFAULT_ARTIFACT))
+        # مصفوفة التداخلات يبنيها المصنف ويستخدمها في كشف النية
+        self.interaction_index = self.intent_classifier.interaction_index
+        started = self._record_stage('drug_api + intent_classifier + interaction index', started)
+
+        # ردود الأدوية مولدة مسبقاً لكل (دواء، نية، لغة)، والبدائل تبدأ بأدوية نفس الفئة
+        drug_lookup = self.drug_api.mock_drug_database.get
+        self.renderer = ResponseRenderer(
+            'detailed', drug_lookup, self.drug_api.formulary_version,
+            alternatives=lambda drug_key, language: self.ontology.alternative_names(drug_key, language, drug_lookup)
+        )
+        self.renderer.prerender(self.drug_api.mock_drug_database)
+        self._record_stage('prerender responses', started)
+
+        # الردود المحسوبة بالقواعد مشتركة بين كل الجلسات
+        self.response_cache = get_response_cache('advanced')
+
+    def _record_stage(self, stage: str, started: float) -> float:
+        now = time.perf_counter()
+        self.startup_timings[stage] = now - started
+        return now
 
     def setup_models(self):
         """تهيئة النظام بدون مكتبة transformers"""
@@ -706,6 +832,12 @@ class AdvancedMedicalChatbot:
             st.error(f"خطأ في تحميل النظام: {str(e)}")
 
     def process_query(self, user_input: str, language: str) -> str:
+        """معالجة الاستفسار (من ذاكرة الردود إن وُجد)"""
+        versions = (self.drug_api.formulary_version, self.intent_classifier.safety_checker.version)
+        return self.response_cache.respond(user_input, language, versions,
+                                           lambda query: self._process_query(query, language))
+
+    def _process_query(self, user_input: str, language: str) -> str:
         """معالجة الاستفسار مع Intent Classifier الجديد"""
 
         # تطبيق Intent Classifier
@@ -732,6 +864,9 @@ class AdvancedMedicalChatbot:
         elif classification_result['classification'] == 'InteractionCheck':
             return self.handle_interaction_check(classification_result['drugs'], language)
 
+        elif classification_result['classification'] == 'ClassMembership':
+            return self.handle_class_question(classification_result['drugs'], classification_result['class'], language)
+
         elif classification_result['classification'] == 'InteractionInfo':
             return self.handle_interaction_info(classification_result['drugs'], language)
 
@@ -752,230 +887,74 @@ class AdvancedMedicalChatbot:
 
         return "خطأ في المعالجة"
 
-    def handle_drug_info(self, detected_drugs: List[str], language: str) -> str:
-        """معالجة معلومات الدواء - بدون جرعات نهائياً"""
-        drug_name = detected_drugs[0]
-        drug_info = self.drug_api.search_drug(drug_name)
-
-        if not drug_info:
+    def render_drug_response(self, drug_name: str, intent: str, language: str) -> str:
+        """إرجاع الرد المخزن للدواء أو معالجته كدواء غير معروف"""
+        drug_key = self.drug_api.resolve_drug_key(drug_name)
+        if not drug_key:
             return self.handle_unknown_drug(drug_name, language)
+        return self.renderer.render(drug_key, intent, language)
 
-        if language == 'ar':
-            response = f"💊 **{drug_info['name_ar']} ({drug_info['name_en']})**\n\n"
-            response += f"🔹 **الاستخدام:** {drug_info['general_use_ar']}\n"
-            response += f"🔹 **تحذيرات مهمة:** {', '.join(drug_info['warnings_ar'][:2])}\n"
-            response += f"🔹 **التداخلات:** {', '.join(drug_info['interactions_ar'][:2])}\n"
-            response += "\n⚠️ **بدون جرعة نهائياً - استشر الصيدلي للجرعة المناسبة**"
-        else:
-            response = f"💊 **{drug_info['name_en']} ({drug_info['name_ar']})**\n\n"
-            response += f"🔹 **Use:** {drug_info['general_use_en']}\n"
-            response += f"🔹 **Important warnings:** {', '.join(drug_info['warnings_en'][:2])}\n"
-            response += f"🔹 **Interactions:** {', '.join(drug_info['interactions_en'][:2])}\n"
-            response += "\n⚠️ **No dosage provided - consult pharmacist for appropriate dose**"
-
-        return response
+    def handle_drug_info(self, detected_drugs: List[str], language: str) -> str:
+        """معالجة معلومات الدواء - بدون جرعات نهائياً"""
+        return self.render_drug_response(detected_drugs[0], 'drug_info', language)
+
+    def handle_class_question(self, detected_drugs: List[str], code: str, language: str) -> str:
+        """هل الدواء من الفئة؟ (عضوية bitset تشمل الفئات الفرعية)"""
+        answers = []
+        for drug_name in detected_drugs:
+            drug_id = self.interaction_index.resolve(drug_name)
+            if not drug_id:
+                return self.handle_unknown_drug(drug_name, language)
+            drug_classes = [self.ontology.class_info(class_code)
+                            for class_code in self.ontology.classes_of(drug_id, include_ancestors=False)]
+            answers.append(class_membership_response(
+                self.interaction_index.name(drug_id, language), self.ontology.class_info(code),
+                self.ontology.is_member(drug_id, code), drug_classes, language
+            ))
+        return '\n\n'.join(answers)
 
     def handle_dosage_request(self, detected_drugs: List[str], language: str) -> str:
         """معالجة طلبات الجرعة - ممنوع إعطاء جرعة"""
-        drug_name = detected_drugs[0]
-        drug_info = self.drug_api.search_drug(drug_name)
-
-        if not drug_info:
-            return self.handle_unknown_drug(drug_name, language)
-
-        if language == 'ar':
-            return f"""🚫 **لا يمكنني إعطاء جرعة {drug_info['name_ar']}**
-
-⚠️ **الجرعة تحتاج حساب دقيق حسب:**
-• العمر والوزن
-• الحالة الصحية
-• الأدوية الأخرى
-• شدة المرض
-
-**👨‍⚕️ استشر صيدلي أو طبيب للجرعة الصحيحة**"""
-        else:
-            return f"""🚫 **Cannot provide dosage for {drug_info['name_en']}**
-
-⚠️ **Dosage requires precise calculation based on:**
-• Age and weight
-• Medical condition
-• Other medications
-• Severity of illness
-
-**👨‍⚕️ Consult pharmacist or doctor for correct dosage**"""
+        return self.render_drug_response(detected_drugs[0], 'dosage', language)
 
     def handle_alternatives_request(self, detected_drugs: List[str], language: str) -> str:
         """معالجة طلبات البدائل"""
-        drug_name = detected_drugs[0]
-        drug_info = self.drug_api.search_drug(drug_name)
-
-        if not drug_info:
-            return self.handle_unknown_drug(drug_name, language)
-
-        if language == 'ar':
-            alternatives_list = '\n• '.join(drug_info['alternatives_ar'])
-            return f"""💊 **بدائل {drug_info['name_ar']}:**
-
-• {alternatives_list}
-
-**💡 ملاحظة:** البدائل قد تختلف في التركيز والتأثير
-**👨‍⚕️ استشر الصيدلي قبل التبديل**"""
-        else:
-            alternatives_list = '\n• '.join(drug_info['alternatives_en'])
-            return f"""💊 **Alternatives to {drug_info['name_en']}:**
-
-• {alternatives_list}
-
-**💡 Note:** Alternatives may vary in concentration and effect
-**👨‍⚕️ Consult pharmacist before switching**"""
+        return self.render_drug_response(detected_drugs[0], 'alternatives', language)
 
     def handle_interaction_check(self, detected_drugs: List[str], language: str) -> str:
-        """فحص التداخلات الدوائية"""
+        """فحص التداخلات الدوائية لكل أزواج الأدوية المذكورة"""
         if len(detected_drugs) < 2:
             if language == 'ar':
                 return "أحتاج اسمين من الأدوية لفحص التداخل"
             else:
                 return "I need two drug names to check interactions"
 
-        drug1_name = detected_drugs[0]
-        drug2_name = detected_drugs[1]
-
-        drug1_info = self.drug_api.search_drug(drug1_name)
-        drug2_info = self.drug_api.search_drug(drug2_name)
-
-        if not drug1_info or not drug2_info:
-            missing_drug = drug1_name if not drug1_info else drug2_name
-            return self.handle_unknown_drug(missing_drug, language)
-
-        # فحص التداخل البسيط
-        interaction_found = False
-        if language == 'ar':
-            drug1_interactions = drug1_info.get('interactions_ar', [])
-            for interaction in drug1_interactions:
-                if interaction.lower() in drug2_info['name_ar'].lower() or interaction.lower() in drug2_name.lower():
-                    interaction_found = True
-                    break
-
-        if language == 'ar':
-            if interaction_found:
-                return f"""⚠️ **تحذير: قد يوجد تداخل بين {drug1_info['name_ar']} و {drug2_info['name_ar']}**
+        drug_ids = []
+        for drug_name in detected_drugs:
+            drug_id = self.interaction_index.resolve(drug_name)
+            if not drug_id:
+                return self.handle_unknown_drug(drug_name, language)
+            drug_ids.append(drug_id)
 
-**🚫 لا ينصح بتناولهما معاً بدون استشارة طبية**
-
-**👨‍⚕️ استشر صيدلي أو طبيب قبل الجمع بينهما**"""
-            else:
-                return f"""✅ **لا يوجد تداخل معروف بين {drug1_info['name_ar']} و {drug2_info['name_ar']}**
-
-**💡 ملاحظة:** يمكن تناولهما معاً عموماً
-**👨‍⚕️ لكن استشر الصيدلي للتأكد من التوقيت المناسب**"""
-        else:
-            if interaction_found:
-                return f"""⚠️ **Warning: Possible interaction between {drug1_info['name_en']} and {drug2_info['name_en']}**
-
-**🚫 Not recommended to take together without medical consultation**
-
-**👨‍⚕️ Consult pharmacist or doctor before combining**"""
-            else:
-                return f"""✅ **No known interaction between {drug1_info['name_en']} and {drug2_info['name_en']}**
-
-**💡 Note:** Generally safe to take together
-**👨‍⚕️ But consult pharmacist for proper timing**"""
+        return self.interaction_index.format_report(drug_ids, language)
 
     def handle_interaction_info(self, detected_drugs: List[str], language: str) -> str:
         """معالجة معلومات التداخل لدواء واحد"""
-        drug_name = detected_drugs[0]
-        drug_info = self.drug_api.search_drug(drug_name)
-
-        if not drug_info:
-            return self.handle_unknown_drug(drug_name, language)
-
-        if language == 'ar':
-            interactions_list = '\n• '.join(drug_info['interactions_ar'])
-            return f"""⚠️ **تداخلات {drug_info['name_ar']}:**
-
-• {interactions_list}
-
-**💡 ملاحظة:** تجنب هذه المواد/الأدوية مع {drug_info['name_ar']}
-**👨‍⚕️ استشر الصيدلي قبل تناول أي دواء آخر**"""
-        else:
-            interactions_list = '\n• '.join(drug_info['interactions_en'])
-            return f"""⚠️ **{drug_info['name_en']} interactions:**
-
-• {interactions_list}
-
-**💡 Note:** Avoid these substances/drugs with {drug_info['name_en']}
-**👨‍⚕️ Consult pharmacist before taking any other medication**"""
+        return self.render_drug_response(detected_drugs[0], 'interactions', language)
 
     def handle_side_effects_request(self, detected_drugs: List[str], language: str) -> str:
         """معالجة طلبات الآثار الجانبية"""
-        drug_name = detected_drugs[0]
-        drug_info = self.drug_api.search_drug(drug_name)
-
-        if not drug_info:
-            return self.handle_unknown_drug(drug_name, language)
-
-        if language == 'ar':
-            return f"""⚠️ **الآثار الجانبية المحتملة لـ {drug_info['name_ar']}:**
-
-**الآثار الشائعة:**
-• غثيان خفيف
-• صداع طفيف
-• اضطراب معدة
-
-**⚠️ توقف عن استخدام الدواء واستشر طبيب إذا ظهرت:**
-• حساسية (طفح جلدي، تورم)
-• صعوبة تنفس
-• ألم شديد في المعدة
-
-**👨‍⚕️ استشر الصيدلي للآثار الجانبية المحددة لحالتك**"""
-        else:
-            return f"""⚠️ **Possible side effects of {drug_info['name_en']}:**
-
-**Common side effects:**
-• Mild nausea
-• Slight headache
-• Stomach upset
-
-**⚠️ Stop using and consult doctor if you experience:**
-• Allergic reaction (rash, swelling)
-• Breathing difficulties
-• Severe stomach pain
-
-**👨‍⚕️ Consult pharmacist for specific side effects for your condition**"""
+        return self.render_drug_response(detected_drugs[0], 'side_effects', language)
 
     def handle_warnings_request(self, detected_drugs: List[str], language: str) -> str:
         """معالجة طلبات التحذيرات"""
-        drug_name = detected_drugs[0]
-        drug_info = self.drug_api.search_drug(drug_name)
-
-        if not drug_info:
-            return self.handle_unknown_drug(drug_name, language)
-
-        if language == 'ar':
-            warnings_list = '\n• '.join(drug_info['warnings_ar'])
-            return f"""⚠️ **تحذيرات مهمة لـ {drug_info['name_ar']}:**
-
-• {warnings_list}
-
-**🚫 لا تستخدم إذا:**
-• لديك حساسية من المكونات
-• تتناول أدوية متعارضة
-
-**👨‍⚕️ استشر طبيب أو صيدلي قبل الاستخدام**"""
-        else:
-            warnings_list = '\n• '.join(drug_info['warnings_en'])
-            return f"""⚠️ **Important warnings for {drug_info['name_en']}:**
-
-• {warnings_list}
-
-**🚫 Do not use if:**
-• You are allergic to the ingredients
-• You are taking conflicting medications
-
-**👨‍⚕️ Consult doctor or pharmacist before use**"""
+        return self.render_drug_response(detected_drugs[0], 'warnings', language)
 
     def handle_unknown_drug(self, drug_name: str, language: str) -> str:
         """معالجة الأدوية غير المعروفة مع اقتراحات"""
+        # الرد يعيد نص المستخدم كما كتبه، فلا يُخزن بمفتاح الحروف الصغيرة
+        self.response_cache.skip()
+
         # محاولة fuzzy matching
         best_match, score = self.intent_classifier.fuzzy_match_drug(drug_name)
 
@@ -1046,11 +1025,13 @@ Write the problem clearly like: "I have headache" or "Cough for 2 days" """
 
 class PrescriptionOCR:
     def __init__(self):
-        self.reader = easyocr.Reader(['ar', 'en'])
+        self.reader = get_ocr_reader()
 
     def extract_drug_info(self, image) -> Dict:
         """استخراج اسم الدواء والتركيز من الوصفة الطبية"""
         try:
+            import numpy as np
+
             # تحويل الصورة إلى array
             img_array = np.array(image)
 
@@ -1107,21 +1088,25 @@ def main():
     except Exception as e:
         st.error(f"خطأ في التهيئة: {str(e)}")
 
+    # تحميل OCR في الخلفية (اختياري) دون تأخير أول رد نصي
+    start_ocr_warmup()
+
     st.title("💊 البوت الطبي الآمن مع قواعد السلامة الشاملة")
     st.markdown("### Safe Medical Bot with Comprehensive Safety Rules | بوت طبي آمن بقواعد سلامة شاملة")
 
-    # تهيئة المحادثة المستمرة
-    if 'chat_history' not in st.session_state:
-        st.session_state.chat_history = []
+    # تهيئة المحادثة المستمرة (نافذة محدودة في الذاكرة والأقدم في SQLite)
+    if 'chat_store' not in st.session_state:
+        st.session_state.chat_store = ChatHistoryStore(uuid.uuid4().hex)
+        st.session_state.chat_page = 0
 
     if 'user_data' not in st.session_state:
         st.session_state.user_data = {}
 
-    # تهيئة البوت
+    # تهيئة البوت (نسخة واحدة مشتركة بين كل الجلسات)
     if 'chatbot' not in st.session_state:
         with st.spinner("جاري تحميل النظام الآمن مع قواعد السلامة..."):
             try:
-                st.session_state.chatbot = AdvancedMedicalChatbot()
+                st.session_state.chatbot = get_chatbot()
             except Exception as e:
                 st.error(f"خطأ في تحميل النظام: {str(e)}")
                 st.stop()
@@ -1146,29 +1131,54 @@ def main():
         st.header("رفع الوصفة الطبية")
         uploaded_file = st.file_uploader("ارفع صورة الوصفة...", type=['png', 'jpg', 'jpeg'])
 
-    # واجهة المحادثة الرئيسية
+    # المحادثة والأمثلة جزء واحد (الأمثلة تملأ مربع الرسالة)، والوصفة جزء مستقل
+    chat_panel()
+
+    # معالجة الوصفة الطبية
+    if uploaded_file:
+        prescription_panel(uploaded_file)
+
+@st.cache_resource(show_spinner=False)
+def get_chatbot() -> 'AdvancedMedicalChatbot':
+    """البوت وكل فهارسه يُبنى مرة واحدة لكل عملية"""
+    return AdvancedMedicalChatbot()
+
+@fragment
+def chat_panel():
+    """واجهة المحادثة: الإرسال والتنقل بين الصفحات والأمثلة تعيد هذا الجزء فقط"""
     col1, col2 = st.columns([2, 1])
 
     with col1:
         st.header("واجهة المحادثة الآمنة | Safe Chat Interface")
 
-        # عرض تاريخ المحادثة
-        if st.session_state.chat_history:
+        # عرض صفحة واحدة فقط من المحادثة حتى يبقى زمن العرض ثابتاً مهما طالت
+        chat_store = st.session_state.chat_store
+        if len(chat_store):
             st.subheader("المحادثة | Conversation")
-            for i, (user_msg, bot_response, timestamp) in enumerate(st.session_state.chat_history):
+            page_count = chat_store.page_count(CHAT_PAGE_SIZE)
+            if page_count > 1:
+                col_older, col_page, col_newer = st.columns([1, 2, 1])
+                with col_older:
+                    if st.button("⬅️ أقدم | Older", disabled=st.session_state.chat_page >= page_count - 1):
+                        st.session_state.chat_page += 1
+                        rerun_fragment()
+                with col_page:
+                    st.caption(f"صفحة {page_count - st.session_state.chat_page} من {page_count}")
+                with col_newer:
+                    if st.button("أحدث | Newer ➡️", disabled=st.session_state.chat_page == 0):
+                        st.session_state.chat_page -= 1
+                        rerun_fragment()
+
+            turns = chat_store.page(st.session_state.chat_page, CHAT_PAGE_SIZE)
+            for i, turn in enumerate(turns):
                 with st.container():
-                    st.markdown(f"**أنت ({timestamp}):** {user_msg}")
-                    st.markdown(f"**البوت:** {bot_response}")
-                    if i < len(st.session_state.chat_history) - 1:
+                    st.markdown(f"**أنت ({turn.timestamp}):** {turn.user_msg}")
+                    st.markdown(f"**البوت:** {turn.bot_response}")
+                    if i < len(turns) - 1:
                         st.markdown("---")
 
         # إدخال الرسالة الجديدة
-        example_value = st.session_state.get('selected_example', '')
-        if example_value:
-            st.session_state.selected_example = ''
-
         user_input = st.text_area("اكتب رسالتك (عربي/إنجليزي):",
-                                 value=example_value,
                                  placeholder="مثال: عندي صداع، أو معلومات عن بندول",
                                  key="user_input_area")
 
@@ -1177,12 +1187,13 @@ def main():
         with col_send:
             if st.button("إرسال | Send", type="primary"):
                 if user_input:
-                    process_user_message(user_input, uploaded_file)
+                    process_user_message(user_input)
 
         with col_clear:
             if st.button("مسح المحادثة | Clear Chat"):
-                st.session_state.chat_history = []
-                st.rerun()
+                st.session_state.chat_store.clear()
+                st.session_state.chat_page = 0
+                rerun_fragment()
 
     with col2:
         st.header("قواعد السلامة النشطة")
@@ -1202,15 +1213,13 @@ def main():
             "كحة ناشفة من يومين"
         ]
 
+        # المثال يُكتب في مربع الرسالة قبل إعادة الجزء، بدون إعادة تشغيل إضافية
         for example in examples:
-            if st.button(f"جرب: {example}", key=f"example_{hash(example)}"):
-                st.session_state.selected_example = example
-                st.rerun()
+            st.button(f"جرب: {example}", key=f"example_{hash(example)}",
+                      on_click=select_example, args=(example,))
 
-    # معالجة الوصفة الطبية
-    if uploaded_file:
-        st.header("تحليل الوصفة الطبية")
-        process_prescription(uploaded_file)
+def select_example(example: str):
+    st.session_state.user_input_area = example
 
 def process_user_message(user_input: str, uploaded_file=None):
     """معالجة رسالة المستخدم"""
@@ -1222,20 +1231,36 @@ def process_user_message(user_input: str, uploaded_file=None):
 
     # إضافة للمحادثة المحفوظة
     timestamp = datetime.now().strftime("%H:%M:%S")
-    st.session_state.chat_history.append((user_input, response, timestamp))
+    st.session_state.chat_store.append(user_input, response, timestamp)
+    st.session_state.chat_page = 0
+
+    rerun_fragment()
 
-    st.rerun()
+@st.cache_data(max_entries=16, show_spinner=False)
+def read_prescription(image_bytes: bytes) -> Dict:
+    """OCR للوصفة مرة واحدة لكل صورة (بمحتواها)، ونتيجته بيانات عادية قابلة للتخزين"""
+    import io
+    from PIL import Image
+
+    ocr_result = PrescriptionOCR().extract_drug_info(Image.open(io.BytesIO(image_bytes)))
+    for drug in ocr_result.get('drugs_found', []):
+        drug['drug_info'] = {field: list(value) if isinstance(value, tuple) else value
+                             for field, value in drug['drug_info'].items()}
+    return ocr_result
+
+@fragment
+def prescription_panel(uploaded_file):
+    """تحليل الوصفة: لا يُعاد مع أحداث المحادثة، ونتيجة OCR محفوظة لنفس الصورة"""
+    st.header("تحليل الوصفة الطبية")
+    process_prescription(uploaded_file)
 
 def process_prescription(uploaded_file):
     """معالجة الوصفة الطبية المرفوعة"""
-    ocr_processor = PrescriptionOCR()
-
     try:
-        image = Image.open(uploaded_file)
-        st.image(image, caption="الوصفة الطبية المرفوعة", use_column_width=True)
+        st.image(uploaded_file, caption="الوصفة الطبية المرفوعة", use_column_width=True)
 
         with st.spinner("جاري قراءة الوصفة..."):
-            ocr_result = ocr_processor.extract_drug_info(image)
+            ocr_result = read_prescription(uploaded_file.getvalue())
 
         if ocr_result['success']:
             st.success(ocr_result['message_ar'])
@@ -1252,6 +1277,14 @@ def process_prescription(uploaded_file):
 
                         st.error("⚠️ **ممنوع عرض الجرعات - استشر الصيدلي**")
 
+                # فحص التداخلات بين كل أدوية الوصفة
+                if len(ocr_result['drugs_found']) >= 2:
+                    interaction_index = st.session_state.chatbot.interaction_index
+                    drug_ids = [interaction_index.resolve(drug['drug_info']['name_en'])
+                                for drug in ocr_result['drugs_found']]
+                    st.subheader("فحص التداخلات بين أدوية الوصفة:")
+                    st.markdown(interaction_index.format_report([d for d in drug_ids if d], 'ar'))
+
             # عرض النص الخام المستخرج
             with st.expander("النص المستخرج من الصورة"):
                 st.write(ocr_result['raw_text'])
@@ -5,6 +5,103 @@ import os
 from typing import Dict, List, Optional, Any
 import openai
 from datetime import datetime
+from query_analysis import Lexicon
+
+# ردود جاهزة للأعراض الشائعة (عند فشل AI APIs)
+FALLBACK_SYMPTOM_RESPONSES = {
+    'ar': {
+        'صداع': """🔍 هذه معلومات عامة تعليمية فقط
+
+💊 **الصداع العام:**
+• يمكن أن يكون بسبب التوتر، قلة النوم، أو الجفاف
+• المسكنات البسيطة قد تساعد (مثل الباراسيتامول)
+• الراحة وشرب الماء مهم
+
+⚠️ **راجع الطبيب إذا:**
+• الصداع شديد ومفاجئ
+• مصحوب بحمى أو تيبس الرقبة
+• يزداد سوءاً مع الوقت
+
+**استشر طبيبك للحصول على المشورة الطبية المناسبة**""",
+
+        'سعال': """🔍 هذه معلومات عامة تعليمية فقط
+
+💊 **السعال العام:**
+• قد يكون بسبب التهاب الجهاز التنفسي العلوي
+• السوائل الدافئة والعسل قد تساعد
+• تجنب المهيجات مثل الدخان
+
+⚠️ **راجع الطبيب إذا:**
+• السعال مستمر أكثر من أسبوعين
+• مصحوب بدم أو حمى عالية
+• صعوبة في التنفس
+
+**استشر طبيبك للحصول على المشورة الطبية المناسبة**""",
+
+        'حرارة': """🔍 هذه معلومات عامة تعليمية فقط
+
+💊 **الحمى العامة:**
+• علامة على أن الجسم يحارب العدوى
+• الراحة وشرب السوائل مهم
+• خافضات الحرارة قد تساعد في الراحة
+
+⚠️ **راجع الطبيب إذا:**
+• الحرارة أعلى من 39 درجة
+• مستمرة أكثر من 3 أيام
+• مصحوبة بأعراض خطيرة
+
+**استشر طبيبك للحصول على المشورة الطبية المناسبة**"""
+    },
+    'en': {
+        'headache': """🔍 This is general educational information only
+
+💊 **General Headache:**
+• Can be caused by stress, lack of sleep, or dehydration  
+• Simple pain relievers may help (like paracetamol)
+• Rest and drinking water is important
+
+⚠️ **See doctor if:**
+• Headache is severe and sudden
+• Accompanied by fever or neck stiffness
+• Gets worse over time
+
+**Consult your doctor for appropriate medical advice**""",
+
+        'cough': """🔍 This is general educational information only
+
+💊 **General Cough:**
+• May be due to upper respiratory tract inflammation
+• Warm fluids and honey may help
+• Avoid irritants like smoke
+
+⚠️ **See doctor if:**
+• Cough persists more than two weeks
+• Accompanied by blood or high fever
+• Difficulty breathing
+
+**Consult your doctor for appropriate medical advice**""",
+
+        'fever': """🔍 This is general educational information only
+
+💊 **General Fever:**
+• Sign that body is fighting infection
+• Rest and fluid intake is important
+• Fever reducers may help comfort
+
+⚠️ **See doctor if:**
+• Temperature above 39°C
+• Persists more than 3 days  
+• Accompanied by serious symptoms
+
+**Consult your doctor for appropriate medical advice**"""
+    }
+}
+
+# فهرس الأعراض لكل لغة بالكلمات المطبعة
+FALLBACK_SYMPTOM_LEXICONS = {
+    language: Lexicon((symptom, symptom) for symptom in responses)
+    for language, responses in FALLBACK_SYMPTOM_RESPONSES.items()
+}
 
 class MedicalAPIHandler:
     def __init__(self):
@@ -12,13 +109,15 @@ class MedicalAPIHandler:
         
     def setup_apis(self):
         """إعداد الـ APIs الطبية"""
-        # OpenFDA API - مجاني ولا يحتاج API key
-        self.openfda_base_url = "https://api.fda.gov/drug"
+        # OpenFDA API - مجاني ولا يحتاج API key (يمكن توجيهه لخادم محلي في اختبارات الحمل)
+        self.openfda_base_url = os.getenv('OPENFDA_BASE_URL', "https://api.fda.gov/drug")
         
         # OpenAI API - يحتاج API key
         self.openai_api_key = os.getenv('OPENAI_API_KEY')
         if self.openai_api_key:
             openai.api_key = self.openai_api_key
+        if os.getenv('OPENAI_API_BASE'):
+            openai.api_base = os.getenv('OPENAI_API_BASE')
             
         # NHS API - مجاني
         self.nhs_base_url = "https://api.nhs.uk/medicines"
@@ -159,105 +258,11 @@ End every answer with: "Consult your doctor for appropriate medical advice" """
     def get_fallback_ai_response(self, query: str, language: str) -> str:
         """رد بديل عند فشل AI APIs"""
         
-        # تحليل بسيط للكلمات المفتاحية
-        query_lower = query.lower()
-        
-        # ردود جاهزة للأعراض الشائعة
-        symptom_responses = {
-            'ar': {
-                'صداع': """🔍 هذه معلومات عامة تعليمية فقط
-
-💊 **الصداع العام:**
-• يمكن أن يكون بسبب التوتر، قلة النوم، أو الجفاف
-• المسكنات البسيطة قد تساعد (مثل الباراسيتامول)
-• الراحة وشرب الماء مهم
-
-⚠️ **راجع الطبيب إذا:**
-• الصداع شديد ومفاجئ
-• مصحوب بحمى أو تيبس الرقبة
-• يزداد سوءاً مع الوقت
-
-**استشر طبيبك للحصول على المشورة الطبية المناسبة**""",
-
-                'سعال': """🔍 هذه معلومات عامة تعليمية فقط
-
-💊 **السعال العام:**
-• قد يكون بسبب التهاب الجهاز التنفسي العلوي
-• السوائل الدافئة والعسل قد تساعد
-• تجنب المهيجات مثل الدخان
-
-⚠️ **راجع الطبيب إذا:**
-• السعال مستمر أكثر من أسبوعين
-• مصحوب بدم أو حمى عالية
-• صعوبة في التنفس
-
-**استشر طبيبك للحصول على المشورة الطبية المناسبة**""",
-
-                'حرارة': """🔍 هذه معلومات عامة تعليمية فقط
-
-💊 **الحمى العامة:**
-• علامة على أن الجسم يحارب العدوى
-• الراحة وشرب السوائل مهم
-• خافضات الحرارة قد تساعد في الراحة
-
-⚠️ **راجع الطبيب إذا:**
-• الحرارة أعلى من 39 درجة
-• مستمرة أكثر من 3 أيام
-• مصحوبة بأعراض خطيرة
-
-**استشر طبيبك للحصول على المشورة الطبية المناسبة**"""
-            },
-            'en': {
-                'headache': """🔍 This is general educational information only
-
-💊 **General Headache:**
-• Can be caused by stress, lack of sleep, or dehydration  
-• Simple pain relievers may help (like paracetamol)
-• Rest and drinking water is important
-
-⚠️ **See doctor if:**
-• Headache is severe and sudden
-• Accompanied by fever or neck stiffness
-• Gets worse over time
-
-**Consult your doctor for appropriate medical advice**""",
-
-                'cough': """🔍 This is general educational information only
-
-💊 **General Cough:**
-• May be due to upper respiratory tract inflammation
-• Warm fluids and honey may help
-• Avoid irritants like smoke
-
-⚠️ **See doctor if:**
-• Cough persists more than two weeks
-• Accompanied by blood or high fever
-• Difficulty breathing
-
-**Consult your doctor for appropriate medical advice**""",
-
-                'fever': """🔍 This is general educational information only
-
-💊 **General Fever:**
-• Sign that body is fighting infection
-• Rest and fluid intake is important
-• Fever reducers may help comfort
-
-⚠️ **See doctor if:**
-• Temperature above 39°C
-• Persists more than 3 days  
-• Accompanied by serious symptoms
-
-**Consult your doctor for appropriate medical advice**"""
-            }
-        }
-        
         # البحث عن أعراض مطابقة
-        responses = symptom_responses.get(language, symptom_responses['ar'])
-        
-        for symptom, response in responses.items():
-            if symptom in query_lower:
-                return response
+        language = language if language in FALLBACK_SYMPTOM_RESPONSES else 'ar'
+        symptom = FALLBACK_SYMPTOM_LEXICONS[language].first(query)
+        if symptom:
+            return FALLBACK_SYMPTOM_RESPONSES[language][symptom]
         
         # رد عام إذا لم يجد شيء محدد
         if language == 'ar':
@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+مشغّل إنتاجي بنمط prefork: تهيئة البوت مرة واحدة في العملية الأم ثم fork للعمال
+العمال يرثون الفهارس الجاهزة (copy-on-write) ويخدمون واجهة JSON على نفس المنفذ
+"""
+
+import argparse
+import gc
+import json
+import mmap
+import os
+import signal
+import socket
+import struct
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Callable, Dict, Optional, Tuple
+
+from response_cache import cache_stats
+from shared_formulary import enable_sharing, remove_shared
+
+class HealthTable:
+    """جدول صحة العمال في mmap مجهول: يُنشأ قبل fork فيتشاركه الأب وكل العمال
+
+    الأب يكتب الخانة قبل تشغيل العامل فقط، وبعدها لا يكتب فيها إلا العامل نفسه.
+    """
+
+    SLOT = struct.Struct('<iIddQQ')
+    FIELDS = ('pid', 'restarts', 'started', 'heartbeat', 'requests', 'errors')
+
+    def __init__(self, slots: int):
+        self.slots = slots
+        self.buffer = mmap.mmap(-1, self.SLOT.size * slots)
+
+    def read(self, slot: int) -> Dict:
+        return dict(zip(self.FIELDS, self.SLOT.unpack_from(self.buffer, slot * self.SLOT.size)))
+
+    def write(self, slot: int, **fields):
+        values = self.read(slot)
+        values.update(fields)
+        self.SLOT.pack_into(self.buffer, slot * self.SLOT.size, *(values[field] for field in self.FIELDS))
+
+    def beat(self, slot: int, requests: int = 0, errors: int = 0):
+        values = self.read(slot)
+        self.write(slot, heartbeat=time.time(), requests=values['requests'] + requests,
+                   errors=values['errors'] + errors)
+
+    def report(self, now: Optional[float] = None) -> list:
+        now = now or time.time()
+        workers = []
+        for slot in range(self.slots):
+            values = self.read(slot)
+            if values['pid']:
+                workers.append({
+                    'slot': slot,
+                    'pid': values['pid'],
+                    'uptime_s': round(now - values['started'], 1),
+                    'heartbeat_age_s': round(now - values['heartbeat'], 1),
+                    'requests': values['requests'],
+                    'errors': values['errors'],
+                    'restarts': values['restarts']
+                })
+        return workers
+
+def memory_usage(pid: int) -> Dict[str, int]:
+    """RSS و Pss والصفحات الخاصة: الخاصة تُظهر ما نسخه العامل فعلاً من صفحات الأب"""
+    usage = {}
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            for line in f:
+                key, _, rest = line.partition(':')
+                if key in ('Rss', 'Pss', 'Private_Clean', 'Private_Dirty'):
+                    usage[key] = int(rest.split()[0]) * 1024
+    except OSError:
+        return {}
+    usage['Private'] = usage.pop('Private_Clean', 0) + usage.pop('Private_Dirty', 0)
+    return usage
+
+def load_app(app: str, with_ocr: bool = False) -> Tuple[object, Callable[[str], str]]:
+    """تهيئة البوت وكل فهارسه (ونموذج OCR اختيارياً) في العملية الأم"""
+    if app == 'advanced':
+        import main
+        bot = main.AdvancedMedicalChatbot()
+        answer = lambda text: bot.process_query(text, bot.detect_language(text))
+        if with_ocr:
+            main.get_ocr_reader()
+    else:
+        from lightweight_chatbot import LightweightMedicalBot
+        bot = LightweightMedicalBot()
+        answer = bot.process_user_input
+    return bot, answer
+
+class ChatHandler(BaseHTTPRequestHandler):
+    """POST /chat {session_id, message} و GET /health"""
+
+    server_version = 'MedicalBotWorker/1.0'
+
+    def _send_json(self, status: int, payload: Dict):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/health':
+            self._send_json(200, {'worker': os.getpid(), 'workers': self.server.health.report(),
+                                  'response_cache': cache_stats()})
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        if self.path != '/chat':
+            self._send_json(404, {'error': 'not found'})
+            return
+        self.server.requests += 1
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            request = json.loads(self.rfile.read(length).decode('utf-8'))
+            message = request['message']
+        except (ValueError, KeyError, TypeError):
+            self.server.errors += 1
+            self._send_json(400, {'error': 'expected JSON body with "message"'})
+            return
+        try:
+            response = self.server.answer(message)
+        except Exception as e:
+            self.server.errors += 1
+            self._send_json(500, {'error': str(e)})
+            return
+        self._send_json(200, {'session_id': request.get('session_id'), 'response': response,
+                              'worker': os.getpid()})
+
+    def log_message(self, format, *args):
+        pass
+
+class WorkerServer(HTTPServer):
+    """خادم العامل على المقبس الموروث من الأب (كل العمال يستقبلون على نفس المنفذ)"""
+
+    timeout = 0.5
+
+    def __init__(self, listener: socket.socket, answer: Callable[[str], str], health: HealthTable, slot: int):
+        super().__init__(listener.getsockname()[:2], ChatHandler, bind_and_activate=False)
+        self.socket.close()
+        self.socket = listener
+        self.server_name, self.server_port = listener.getsockname()[:2]
+        self.answer = answer
+        self.health = health
+        self.slot = slot
+        self.requests = 0
+        self.errors = 0
+
+    def service_actions(self):
+        # النبضة من نفس حلقة الطلبات: العامل العالق في طلب يتوقف نبضه فيعيد الأب تشغيله
+        self.health.beat(self.slot, requests=self.requests, errors=self.errors)
+        self.requests = self.errors = 0
+
+    def get_request(self):
+        # المقبس المشترك non-blocking حتى لا يعلق العامل إذا سبقه عامل آخر للاتصال
+        connection, address = self.socket.accept()
+        connection.setblocking(True)
+        return connection, address
+
+def run_worker(listener: socket.socket, answer: Callable[[str], str], health: HealthTable, slot: int):
+    server = WorkerServer(listener, answer, health, slot)
+    # shutdown ينتظر انتهاء الحلقة، لذا يُستدعى من thread آخر وليس من داخل معالج الإشارة
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown, daemon=True).start())
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    for restored in (signal.SIGCHLD, signal.SIGTTIN, signal.SIGTTOU):
+        signal.signal(restored, signal.SIG_DFL)
+    server.serve_forever(poll_interval=0.5)
+
+class Arbiter:
+    """العملية الأم: تشغيل العمال ومراقبة نبضهم وإعادة تشغيل ما يتعطل منهم"""
+
+    def __init__(self, listener: socket.socket, answer: Callable[[str], str], workers: int, max_workers: int,
+                 timeout: float, report_interval: float):
+        self.listener = listener
+        self.answer = answer
+        self.target = workers
+        self.health = HealthTable(max_workers)
+        self.timeout = timeout
+        self.report_interval = report_interval
+        self.workers = {}
+        self.restarts = [0] * max_workers
+        self.stopping = False
+
+    def spawn(self, slot: int):
+        now = time.time()
+        self.health.write(slot, pid=0, restarts=self.restarts[slot], started=now, heartbeat=now,
+                          requests=0, errors=0)
+        sys.stdout.flush()
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                self.health.write(slot, pid=os.getpid())
+                run_worker(self.listener, self.answer, self.health, slot)
+            except Exception as e:
+                print(f"Worker {os.getpid()} failed: {e}")
+                code = 1
+            finally:
+                sys.stdout.flush()
+                os._exit(code)
+        self.workers[slot] = pid
+
+    def reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            for slot, worker_pid in list(self.workers.items()):
+                if worker_pid == pid:
+                    del self.workers[slot]
+                    self.health.write(slot, pid=0)
+                    if not self.stopping and slot < self.target:
+                        self.restarts[slot] += 1
+                        print(f"Worker {pid} (slot {slot}) exited with status {os.waitstatus_to_exitcode(status)}, restarting")
+
+    def kill_stuck(self):
+        now = time.time()
+        for slot, pid in self.workers.items():
+            if now - self.health.read(slot)['heartbeat'] > self.timeout:
+                print(f"Worker {pid} (slot {slot}) missed heartbeats for {self.timeout:.0f}s, killing")
+                self._signal(pid, signal.SIGKILL)
+
+    def _signal(self, pid: int, signum: int):
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
+
+    def scale(self, delta: int):
+        self.target = min(max(self.target + delta, 1), self.health.slots)
+        print(f"Scaling to {self.target} workers")
+
+    def print_health(self):
+        print(f"{'slot':>4} {'pid':>7} {'uptime s':>9} {'beat s':>7} {'requests':>9} {'errors':>7} "
+              f"{'restarts':>8} {'RSS MB':>7} {'private MB':>10}")
+        for worker in self.health.report():
+            usage = memory_usage(worker['pid'])
+            print(f"{worker['slot']:>4} {worker['pid']:>7} {worker['uptime_s']:>9} {worker['heartbeat_age_s']:>7} "
+                  f"{worker['requests']:>9} {worker['errors']:>7} {worker['restarts']:>8} "
+                  f"{usage.get('Rss', 0) / 1e6:>7.1f} {usage.get('Private', 0) / 1e6:>10.1f}")
+        sys.stdout.flush()
+
+    def run(self):
+        signal.signal(signal.SIGTERM, lambda *_: setattr(self, 'stopping', True))
+        signal.signal(signal.SIGINT, lambda *_: setattr(self, 'stopping', True))
+        signal.signal(signal.SIGCHLD, lambda *_: None)
+        # زيادة/إنقاص العمال أثناء التشغيل: kill -TTIN / kill -TTOU
+        signal.signal(signal.SIGTTIN, lambda *_: self.scale(1))
+        signal.signal(signal.SIGTTOU, lambda *_: self.scale(-1))
+
+        last_report = time.time()
+        while not self.stopping:
+            self.reap()
+            for slot in range(self.target):
+                if slot not in self.workers:
+                    self.spawn(slot)
+            for slot, pid in list(self.workers.items()):
+                if slot >= self.target:
+                    self._signal(pid, signal.SIGTERM)
+            self.kill_stuck()
+            if self.report_interval and time.time() - last_report >= self.report_interval:
+                self.print_health()
+                last_report = time.time()
+            time.sleep(0.2)
+
+        print("Stopping workers...")
+        for pid in self.workers.values():
+            self._signal(pid, signal.SIGTERM)
+        deadline = time.time() + self.timeout
+        while self.workers and time.time() < deadline:
+            self.reap()
+            time.sleep(0.1)
+        for pid in self.workers.values():
+            self._signal(pid, signal.SIGKILL)
+
+def main():
+    parser = argparse.ArgumentParser(description="تشغيل البوت بعمال متعددين بعد تهيئة واحدة (prefork)")
+    parser.add_argument('--app', choices=['lightweight', 'advanced'], default='lightweight')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2)
+    parser.add_argument('--max-workers', type=int, default=0, help="أقصى عدد عند التوسع بـ SIGTTIN (افتراضياً 4 أضعاف)")
+    parser.add_argument('--timeout', type=float, default=30.0, help="إعادة تشغيل العامل إذا توقف نبضه هذه المدة")
+    parser.add_argument('--ocr', action='store_true', help="تحميل نموذج OCR في الأب قبل fork (للنسخة المتقدمة)")
+    parser.add_argument('--report-interval', type=float, default=30.0, help="طباعة صحة العمال كل N ثانية (0 لإيقافها)")
+    parser.add_argument('--shared-memory', action='store_true',
+                        help="نشر جداول الأدوية في /dev/shm فتتشاركها العمال حتى بعد إعادة تحميل القاعدة")
+    parser.add_argument('--deploy-id', default='', help="معرف ملفات الذاكرة المشتركة (افتراضياً رقم عملية المشغّل)")
+    args = parser.parse_args()
+
+    # ملفات الذاكرة المشتركة تحمل معرف هذا المشغّل، فلا تتعارض مع نشر آخر على نفس الجهاز
+    scope = (args.deploy_id or f"launcher{os.getpid()}") if args.shared_memory else None
+    if scope:
+        enable_sharing(scope)
+    try:
+        started = time.perf_counter()
+        _, answer = load_app(args.app, args.ocr)
+        print(f"{args.app} bot initialized in {time.perf_counter() - started:.2f}s")
+
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        listener.bind((args.host, args.port))
+        listener.listen(128)
+        listener.setblocking(False)
+
+        # نقل كائنات التهيئة إلى الجيل الدائم حتى لا يلمسها جامع القمامة في العمال فتُنسخ صفحاتها
+        gc.collect()
+        gc.freeze()
+
+        arbiter = Arbiter(listener, answer, args.workers, args.max_workers or args.workers * 4,
+                          args.timeout, args.report_interval)
+        print(f"Serving POST /chat and GET /health on http://{args.host}:{args.port} "
+              f"with {args.workers} workers (parent {os.getpid()})")
+        arbiter.run()
+    finally:
+        if scope:
+            remove_shared(scope)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+from functools import lru_cache
+from typing import Dict, Hashable, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+from arabic_normalizer import normalize_text, tokenize
+
+class QueryAnalysis:
+    """الاستعلام محللاً مرة واحدة: النص المطبع وكلماته المجذعة، وكل المراحل تقرأ منه"""
+
+    __slots__ = ('text', 'lower', 'normalized', 'tokens')
+
+    def __init__(self, text: str):
+        self.text = text
+        self.lower = text.lower()
+        self.normalized = normalize_text(text)
+        self.tokens = tuple(tokenize(text))
+
+    def ngrams(self, max_size: int) -> Iterator[Tuple[str, ...]]:
+        """كل تسلسلات الكلمات حتى الطول max_size"""
+        tokens = self.tokens
+        for size in range(1, max_size + 1):
+            for start in range(len(tokens) - size + 1):
+                yield tokens[start:start + size]
+
+@lru_cache(maxsize=1024)
+def analyze(text: str) -> QueryAnalysis:
+    """تحليل الاستعلام (محفوظ، فاستدعاؤه من عدة مراحل لنفس النص لا يعيد التحليل)"""
+    return QueryAnalysis(text)
+
+class Lexicon:
+    """فهرس مقلوب: تسلسل كلمات مطبعة -> تسمية
+
+    الأولوية بترتيب الإضافة، فأول مجموعة تُضاف تفوز كما في فحص القوائم بالترتيب.
+    كلفة الاستعلام عدد n-grams فيه، ولا تعتمد على حجم القاموس.
+    """
+
+    def __init__(self, entries: Iterable[Tuple[str, Hashable]] = ()):
+        self.index: Dict[Tuple[str, ...], Tuple[int, Hashable]] = {}
+        self.max_tokens = 0
+        for phrase, label in entries:
+            self.add(phrase, label)
+
+    @classmethod
+    def from_groups(cls, groups: Dict[Hashable, Iterable[str]]) -> 'Lexicon':
+        """من قاموس تسمية -> عبارات (ترتيب التسميات = الأولوية)"""
+        return cls((phrase, label) for label, phrases in groups.items() for phrase in phrases)
+
+    def add(self, phrase: str, label: Hashable):
+        tokens = tuple(tokenize(phrase))
+        if tokens and tokens not in self.index:
+            self.index[tokens] = (len(self.index), label)
+            self.max_tokens = max(self.max_tokens, len(tokens))
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def hits(self, tokens: Sequence[str]) -> List[Tuple[int, int, int, Hashable]]:
+        """كل الإصابات في تمريرة واحدة: (البداية، عدد الكلمات، الأولوية، التسمية)"""
+        tokens = tuple(tokens)
+        found = []
+        for size in range(1, min(self.max_tokens, len(tokens)) + 1):
+            for start in range(len(tokens) - size + 1):
+                entry = self.index.get(tokens[start:start + size])
+                if entry is not None:
+                    found.append((start, size, entry[0], entry[1]))
+        return found
+
+    def match_tokens(self, tokens: Sequence[str]) -> List[Hashable]:
+        """التسميات المذكورة في الكلمات، مرتبة حسب الأولوية ودون تكرار"""
+        labels = []
+        for _, _, _, label in sorted(self.hits(tokens), key=lambda hit: hit[2]):
+            if label not in labels:
+                labels.append(label)
+        return labels
+
+    def matches(self, query: Union[str, QueryAnalysis]) -> List[Hashable]:
+        analysis = query if isinstance(query, QueryAnalysis) else analyze(query)
+        return self.match_tokens(analysis.tokens)
+
+    def first(self, query: Union[str, QueryAnalysis]) -> Optional[Hashable]:
+        """التسمية الأعلى أولوية في الاستعلام"""
+        labels = self.matches(query)
+        return labels[0] if labels else None
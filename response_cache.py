@@ -0,0 +1,99 @@
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Tuple
+
+DEFAULT_MAX_ENTRIES = 4096
+
+_caches: Dict[str, 'ResponseCache'] = {}
+_caches_lock = threading.Lock()
+
+def canonical_query(text: str) -> str:
+    """الشكل الموحد للاستعلام: مسافات مفردة بدون أطراف (المسار كله يعمل عليه)"""
+    return ' '.join(text.split())
+
+class ResponseCache:
+    """ذاكرة LRU محدودة للردود المحسوبة بالقواعد فقط
+
+    المفتاح: (الاستعلام الموحد بحروف صغيرة، اللغة، نسخة قاعدة الأدوية، نسخة قواعد السلامة).
+    تغير أي نسخة يفرغ الذاكرة كلها، فلا يُرجع رد محسوب بقواعد سلامة قديمة أبداً.
+    المسارات التي تستدعي خدمات خارجية أو تعيد نص المستخدم تستدعي skip() فلا يُخزن ردها.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[Tuple, str]' = OrderedDict()
+        self._versions: Tuple[Hashable, ...] = ()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.hits = self.misses = self.skipped = self.evictions = self.invalidations = 0
+
+    def respond(self, text: str, language: str, versions: Tuple[Hashable, ...],
+                compute: Callable[[str], str]) -> str:
+        """الرد من الذاكرة، أو compute(الاستعلام الموحد) وتخزينه إذا لم يُستدع skip()"""
+        query = canonical_query(text)
+        key = (query.lower(), language) + tuple(versions)
+        with self._lock:
+            if versions != self._versions:
+                self._invalidate(versions)
+            response = self._entries.get(key)
+            if response is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return response
+            self.misses += 1
+
+        self._local.cacheable = True
+        response = compute(query)
+        if not self._local.cacheable:
+            with self._lock:
+                self.skipped += 1
+            return response
+
+        with self._lock:
+            # طلب جارٍ على نسخة قديمة لا يضيف شيئاً بعد التبديل
+            if versions == self._versions:
+                self._entries[key] = response
+                self._entries.move_to_end(key)
+                if len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return response
+
+    def skip(self):
+        """الطلب الحالي لا يُخزن (نتيجته ليست دالة في المفتاح وحده)"""
+        self._local.cacheable = False
+
+    def _invalidate(self, versions: Tuple[Hashable, ...]):
+        if self._entries:
+            self.invalidations += 1
+        self._entries.clear()
+        self._versions = tuple(versions)
+
+    def clear(self):
+        with self._lock:
+            self._invalidate(self._versions)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'skipped': self.skipped,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations
+            }
+
+def get_response_cache(name: str, max_entries: int = DEFAULT_MAX_ENTRIES) -> ResponseCache:
+    """ذاكرة واحدة لكل بوت في العملية، مشتركة بين كل الجلسات"""
+    with _caches_lock:
+        cache = _caches.get(name)
+        if cache is None:
+            cache = _caches[name] = ResponseCache(max_entries)
+        return cache
+
+def cache_stats() -> Dict[str, Dict[str, float]]:
+    """مقاييس كل الذاكرات المنشأة في العملية"""
+    return {name: cache.stats() for name, cache in list(_caches.items())}
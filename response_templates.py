@@ -0,0 +1,277 @@
+from functools import partial
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional
+
+# قوالب الردود لكل (نمط، نية) معرفة مرة واحدة لكلا البوتين:
+# compact للنسخة الخفيفة و detailed للنسخة الكاملة
+
+class TemplateStyle(NamedTuple):
+    """ما يختلف بين النمطين: الخط العريض، واسم النمط لاختيار النصوص الخاصة به"""
+    name: str
+    bold: bool
+
+    def strong(self, text: str) -> str:
+        return f"**{text}**" if self.bold else text
+
+    def footer(self, text: str) -> str:
+        return self.strong(f"👨‍⚕️ {text}")
+
+COMPACT = TemplateStyle('compact', bold=False)
+DETAILED = TemplateStyle('detailed', bold=True)
+
+# النصوص لكل لغة؛ المفتاح "key.style" يغلب "key" في ذلك النمط فقط
+PHRASES = {
+    'ar': {
+        'none': 'لا توجد',
+        'unspecified': 'غير محدد',
+        'note': '💡 ملاحظة',
+        'dosage.title': 'لا يمكنني إعطاء جرعة {name}',
+        'dosage.reason.compact': 'الجرعة تحتاج حساب دقيق حسب العمر والوزن والحالة الصحية.',
+        'dosage.reason.detailed': 'الجرعة تحتاج حساب دقيق حسب:',
+        'dosage.factors.detailed': ['العمر والوزن', 'الحالة الصحية', 'الأدوية الأخرى', 'شدة المرض'],
+        'dosage.footer': 'استشر صيدلي أو طبيب للجرعة الصحيحة',
+        'alternatives.title': 'بدائل {name}:',
+        'alternatives.empty': 'لا توجد بدائل مسجلة',
+        'alternatives.note.detailed': 'البدائل قد تختلف في التركيز والتأثير',
+        'alternatives.footer': 'استشر الصيدلي قبل التبديل',
+        'interactions.title': 'تداخلات {name}:',
+        'interactions.empty': 'لا توجد تداخلات مسجلة',
+        'interactions.note.detailed': 'تجنب هذه المواد/الأدوية مع {name}',
+        'interactions.footer.compact': 'تجنب هذه المواد مع الدواء',
+        'interactions.footer.detailed': 'استشر الصيدلي قبل تناول أي دواء آخر',
+        'warnings.title': 'تحذيرات مهمة لـ {name}:',
+        'warnings.empty': 'لا توجد تحذيرات مسجلة',
+        'warnings.avoid.detailed': 'لا تستخدم إذا:',
+        'warnings.avoid_items.detailed': ['لديك حساسية من المكونات', 'تتناول أدوية متعارضة'],
+        'warnings.footer.compact': 'استشر طبيب قبل الاستخدام',
+        'warnings.footer.detailed': 'استشر طبيب أو صيدلي قبل الاستخدام',
+        'side_effects.title': 'الآثار الجانبية المحتملة لـ {name}:',
+        'side_effects.common.detailed': 'الآثار الشائعة:',
+        'side_effects.items': ['غثيان خفيف', 'صداع طفيف', 'اضطراب معدة'],
+        'side_effects.stop.compact': 'توقف واستشر طبيب إذا ظهرت:',
+        'side_effects.stop.detailed': 'توقف عن استخدام الدواء واستشر طبيب إذا ظهرت:',
+        'side_effects.stop_items.compact': ['حساسية أو طفح جلدي', 'صعوبة تنفس', 'ألم شديد'],
+        'side_effects.stop_items.detailed': ['حساسية (طفح جلدي، تورم)', 'صعوبة تنفس', 'ألم شديد في المعدة'],
+        'side_effects.footer.compact': 'استشر الصيدلي لمعلومات محددة',
+        'side_effects.footer.detailed': 'استشر الصيدلي للآثار الجانبية المحددة لحالتك',
+        'drug_info.use': 'الاستخدام',
+        'drug_info.warnings.compact': 'التحذيرات',
+        'drug_info.warnings.detailed': 'تحذيرات مهمة',
+        'drug_info.interactions': 'التداخلات',
+        'drug_info.no_dosage.compact': 'بدون جرعة - استشر الصيدلي',
+        'drug_info.no_dosage.detailed': 'بدون جرعة نهائياً - استشر الصيدلي للجرعة المناسبة',
+        'drug_info.disclaimer.compact': '**تنبيه طبي:** المعلومات المقدمة هنا لأغراض تعليمية عامة فقط ولا تغني عن الاستشارة الطبية المتخصصة.',
+    },
+    'en': {
+        'none': 'None',
+        'unspecified': 'Not specified',
+        'note': '💡 Note',
+        'dosage.title': 'Cannot provide dosage for {name}',
+        'dosage.reason.compact': 'Dosage requires precise calculation based on age, weight, and condition.',
+        'dosage.reason.detailed': 'Dosage requires precise calculation based on:',
+        'dosage.factors.detailed': ['Age and weight', 'Medical condition', 'Other medications', 'Severity of illness'],
+        'dosage.footer': 'Consult pharmacist or doctor for correct dosage',
+        'alternatives.title': 'Alternatives to {name}:',
+        'alternatives.empty': 'No alternatives recorded',
+        'alternatives.note.detailed': 'Alternatives may vary in concentration and effect',
+        'alternatives.footer': 'Consult pharmacist before switching',
+        'interactions.title': '{name} interactions:',
+        'interactions.empty': 'No interactions recorded',
+        'interactions.note.detailed': 'Avoid these substances/drugs with {name}',
+        'interactions.footer.compact': 'Avoid these substances with the medication',
+        'interactions.footer.detailed': 'Consult pharmacist before taking any other medication',
+        'warnings.title': 'Important warnings for {name}:',
+        'warnings.empty': 'No warnings recorded',
+        'warnings.avoid.detailed': 'Do not use if:',
+        'warnings.avoid_items.detailed': ['You are allergic to the ingredients', 'You are taking conflicting medications'],
+        'warnings.footer.compact': 'Consult doctor before use',
+        'warnings.footer.detailed': 'Consult doctor or pharmacist before use',
+        'side_effects.title': 'Possible side effects of {name}:',
+        'side_effects.common.detailed': 'Common side effects:',
+        'side_effects.items': ['Mild nausea', 'Slight headache', 'Stomach upset'],
+        'side_effects.stop.compact': 'Stop and consult doctor if you experience:',
+        'side_effects.stop.detailed': 'Stop using and consult doctor if you experience:',
+        'side_effects.stop_items.compact': ['Allergic reaction or rash', 'Breathing difficulties', 'Severe pain'],
+        'side_effects.stop_items.detailed': ['Allergic reaction (rash, swelling)', 'Breathing difficulties', 'Severe stomach pain'],
+        'side_effects.footer.compact': 'Consult pharmacist for specific information',
+        'side_effects.footer.detailed': 'Consult pharmacist for specific side effects for your condition',
+        'drug_info.use': 'Use',
+        'drug_info.warnings.compact': 'Warnings',
+        'drug_info.warnings.detailed': 'Important warnings',
+        'drug_info.interactions': 'Interactions',
+        'drug_info.no_dosage.compact': 'No dosage - consult pharmacist',
+        'drug_info.no_dosage.detailed': 'No dosage provided - consult pharmacist for appropriate dose',
+        'drug_info.disclaimer.compact': '**Medical Disclaimer:** Information provided here is for general educational purposes only and does not replace professional medical consultation.',
+    },
+}
+
+def _phrase(key: str, style: TemplateStyle, language: str):
+    phrases = PHRASES[language]
+    return phrases.get(f'{key}.{style.name}', phrases.get(key))
+
+def _bullets(items: Iterable[str]) -> List[str]:
+    return [f"• {item}" for item in items]
+
+def _dosage(drug_info: Dict, language: str, style: TemplateStyle) -> str:
+    """رفض إعطاء جرعات"""
+    name = drug_info[f'name_{language}']
+    lines = [f"🚫 {style.strong(_phrase('dosage.title', style, language).format(name=name))}", '',
+             f"⚠️ {style.strong(_phrase('dosage.reason', style, language))}"]
+    lines += _bullets(_phrase('dosage.factors', style, language) or [])
+    lines += ['', style.footer(_phrase('dosage.footer', style, language))]
+    return '\n'.join(lines)
+
+def _listing(field: str, icon: str, drug_info: Dict, language: str, style: TemplateStyle) -> str:
+    """البدائل والتداخلات والتحذيرات: عنوان ثم قائمة الدواء ثم ملاحظات النمط"""
+    name = drug_info[f'name_{language}']
+    items = drug_info.get(f'{field}_{language}') or [_phrase(f'{field}.empty', style, language)]
+    lines = [f"{icon} {style.strong(_phrase(f'{field}.title', style, language).format(name=name))}", '']
+    lines += _bullets(items) + ['']
+    avoid = _phrase(f'{field}.avoid', style, language)
+    if avoid:
+        lines.append(style.strong(f"🚫 {avoid}"))
+        lines += _bullets(_phrase(f'{field}.avoid_items', style, language)) + ['']
+    note = _phrase(f'{field}.note', style, language)
+    if note:
+        lines.append(f"{style.strong(_phrase('note', style, language) + ':')} {note.format(name=name)}")
+    lines.append(style.footer(_phrase(f'{field}.footer', style, language)))
+    return '\n'.join(lines)
+
+def _side_effects(drug_info: Dict, language: str, style: TemplateStyle) -> str:
+    """الآثار الجانبية"""
+    name = drug_info[f'name_{language}']
+    lines = [f"⚠️ {style.strong(_phrase('side_effects.title', style, language).format(name=name))}", '']
+    common = _phrase('side_effects.common', style, language)
+    if common:
+        lines.append(style.strong(common))
+    lines += _bullets(_phrase('side_effects.items', style, language)) + ['']
+    lines.append(style.strong(f"⚠️ {_phrase('side_effects.stop', style, language)}"))
+    lines += _bullets(_phrase('side_effects.stop_items', style, language)) + ['']
+    lines.append(style.footer(_phrase('side_effects.footer', style, language)))
+    return '\n'.join(lines)
+
+def _drug_info(drug_info: Dict, language: str, style: TemplateStyle) -> str:
+    """معلومات عامة عن الدواء - بدون جرعات نهائياً"""
+    other = 'en' if language == 'ar' else 'ar'
+    none = [_phrase('none', style, language)]
+
+    def field(key: str, value: str) -> str:
+        return f"🔹 {style.strong(_phrase(f'drug_info.{key}', style, language) + ':')} {value}"
+
+    title = f"{drug_info[f'name_{language}']} ({drug_info[f'name_{other}']})"
+    lines = [f"💊 {style.strong(title)}", '',
+             field('use', drug_info.get(f'general_use_{language}', _phrase('unspecified', style, language))),
+             field('warnings', ', '.join(drug_info.get(f'warnings_{language}', none)[:2])),
+             field('interactions', ', '.join(drug_info.get(f'interactions_{language}', none)[:2])),
+             '', f"⚠️ {style.strong(_phrase('drug_info.no_dosage', style, language))}"]
+    disclaimer = _phrase('drug_info.disclaimer', style, language)
+    if disclaimer:
+        lines += ['', f"⚠️ {disclaimer}"]
+    return '\n'.join(lines)
+
+INTENT_BODIES = {
+    'dosage': _dosage,
+    'alternatives': partial(_listing, 'alternatives', '💊'),
+    'interactions': partial(_listing, 'interactions', '⚠️'),
+    'side_effects': _side_effects,
+    'warnings': partial(_listing, 'warnings', '⚠️'),
+    'drug_info': _drug_info,
+}
+
+TEMPLATES = {
+    style.name: {intent: partial(body, style=style) for intent, body in INTENT_BODIES.items()}
+    for style in (COMPACT, DETAILED)
+}
+
+def class_membership_response(drug_name: str, class_info: Dict, member: bool, drug_classes: List[Dict],
+                              language: str) -> str:
+    """جواب سؤال الفئة: هل الدواء من هذه الفئة؟ ومن أي فئة هو إن لم يكن منها"""
+    class_name = class_info.get(f'name_{language}', '')
+    known = ', '.join(info.get(f'name_{language}', '') for info in drug_classes)
+    if language == 'ar':
+        if member:
+            response = f"✅ نعم، {drug_name} من {class_name}."
+        else:
+            response = f"❌ لا، {drug_name} ليس من {class_name}."
+            if known:
+                response += f"\n🔹 فئته: {known}"
+        return response + "\n\n👨‍⚕️ استشر الصيدلي قبل الجمع بين أدوية من نفس الفئة"
+    if member:
+        response = f"✅ Yes, {drug_name} is one of the {class_name}."
+    else:
+        response = f"❌ No, {drug_name} is not one of the {class_name}."
+        if known:
+            response += f"\n🔹 Its class: {known}"
+    return response + "\n\n👨‍⚕️ Consult pharmacist before combining drugs from the same class"
+
+INTENTS = tuple(TEMPLATES['compact'])
+LANGUAGES = ('ar', 'en')
+
+def render_response(style: str, intent: str, drug_info: Dict, language: str) -> str:
+    """توليد الرد مباشرة من القالب (بدون تخزين)"""
+    return TEMPLATES[style][intent](drug_info, language)
+
+class ResponseRenderer:
+    """تخزين الردود المولدة لكل (دواء، نية، لغة، نسخة قاعدة البيانات)"""
+
+    def __init__(self, style: str, lookup: Callable[[str], Optional[Dict]], formulary_version: str,
+                 alternatives: Optional[Callable[[str, str], List[str]]] = None):
+        self.style = style
+        self.lookup = lookup
+        self.formulary_version = formulary_version
+        # بدائل نفس الفئة من التصنيف: (مفتاح الدواء، اللغة) -> أسماء، تُعرض قبل البدائل المسجلة
+        self.alternatives = alternatives
+        self.cache = {}
+
+    def render(self, drug_key: str, intent: str, language: str) -> Optional[str]:
+        key = (drug_key, intent, language, self.formulary_version)
+        response = self.cache.get(key)
+        if response is None:
+            drug_info = self.lookup(drug_key)
+            if not drug_info:
+                return None
+            if intent == 'alternatives' and self.alternatives is not None:
+                drug_info = self._with_class_alternatives(drug_key, drug_info, language)
+            response = render_response(self.style, intent, drug_info, language)
+            self.cache[key] = response
+        return response
+
+    def _with_class_alternatives(self, drug_key: str, drug_info: Dict, language: str) -> Dict:
+        field = f'alternatives_{language}'
+        recorded = list(drug_info.get(field, []))
+        recorded_text = ' '.join(recorded).lower()
+        from_class = [name for name in self.alternatives(drug_key, language) if name.lower() not in recorded_text]
+        if not from_class:
+            return drug_info
+        return {**drug_info, field: from_class + recorded}
+
+    def invalidate(self, formulary_version: str, lookup: Optional[Callable[[str], Optional[Dict]]] = None):
+        """إفراغ الردود المخزنة عند إعادة تحميل قاعدة البيانات"""
+        self.cache = {}
+        self.formulary_version = formulary_version
+        if lookup is not None:
+            self.lookup = lookup
+
+    def reuse(self, previous: 'ResponseRenderer', drug_keys: Iterable[str]) -> int:
+        """نقل ردود الأدوية التي لم تتغير من نسخة سابقة بدل توليدها من جديد"""
+        unchanged = set(drug_keys)
+        count = 0
+        for (drug_key, intent, language, _), response in list(previous.cache.items()):
+            # بدائل الفئة تحمل أسماء أدوية أخرى قد تكون تغيرت
+            if intent == 'alternatives' and self.alternatives is not None:
+                continue
+            if drug_key in unchanged and previous.style == self.style:
+                self.cache[(drug_key, intent, language, self.formulary_version)] = response
+                count += 1
+        return count
+
+    def prerender(self, drug_keys: Iterable[str], intents: Iterable[str] = INTENTS,
+                  languages: Iterable[str] = LANGUAGES) -> int:
+        """توليد ردود كل الأدوية مسبقاً عند بدء التشغيل"""
+        intents, languages = tuple(intents), tuple(languages)
+        count = 0
+        for drug_key in drug_keys:
+            for intent in intents:
+                for language in languages:
+                    if self.render(drug_key, intent, language) is not None:
+                        count += 1
+        return count
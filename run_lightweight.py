@@ -5,12 +5,15 @@
 يمكن استخدامه على أي استضافة خفيفة
 """
 
+import importlib.util
 import subprocess
 import sys
 import os
 
 def install_requirements():
-    """تثبيت المتطلبات البسيطة"""
+    """تثبيت المتطلبات البسيطة (فقط إذا لم تكن مثبتة)"""
+    if importlib.util.find_spec("streamlit") is not None:
+        return True
     try:
         subprocess.check_call([sys.executable, "-m", "pip", "install", "streamlit"])
         print("✅ تم تثبيت المتطلبات بنجاح")
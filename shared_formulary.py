@@ -0,0 +1,237 @@
+import argparse
+import glob
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import tempfile
+from collections.abc import Mapping
+from typing import Dict, Iterator, Optional
+
+from drug_records import _MISSING, DrugRow, DrugTable
+from index_artifact import ArtifactWriter, IndexArtifact
+
+# /dev/shm ملفات في الذاكرة مباشرة، فكل العمليات على نفس الجهاز تتشارك نفس الصفحات
+SHARED_DIR = os.getenv('MEDICAL_BOT_SHARED_DIR') or ('/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir())
+
+# المشاركة اختيارية: يفعلها المشغّل بمعرف نشر، فلا يكتب إنشاء المكونات وحده ملفات في الذاكرة
+SCOPE_ENV = 'MEDICAL_BOT_SHARED_SCOPE'
+
+def content_version(value) -> str:
+    """نسخة المحتوى (لأسماء الملفات المشتركة)"""
+    return hashlib.sha1(json.dumps(value, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()[:12]
+
+class SharedFormulary(IndexArtifact):
+    """ملف مشترك بين العمليات: جدول الأدوية وقواميس الأسماء كمصفوفات على صفحات mmap"""
+
+    def drug_table(self) -> 'SharedDrugTable':
+        return SharedDrugTable(self)
+
+class SharedDrugTable(Mapping):
+    """DrugTable مقروء من الذاكرة المشتركة: نفس الأعمدة المرمّزة دون نسخة لكل عملية"""
+
+    def __init__(self, shared: SharedFormulary):
+        self.shared = shared
+        arrays = shared.arrays
+        header = shared.header
+        self.row_keys = arrays['drugs.keys']
+        self.sorted_keys = arrays['drugs.sorted_keys']
+        self.sorted_rows = arrays['drugs.sorted_rows']
+        self.field_order = header['drug_fields']
+        self.scalar_columns = {field: arrays[f'drugs.scalar.{field}'] for field in header['drug_scalar_fields']}
+        self.list_columns = {
+            field: (arrays[f'drugs.list.{field}.codes'], arrays[f'drugs.list.{field}.offsets'],
+                    arrays[f'drugs.list.{field}.present'])
+            for field in header['drug_list_fields']
+        }
+        # القيم غير النصية (أرقام، true/false) صغيرة وتُحفظ في رأس الملف
+        self.values = header['drug_values']
+        self.string_count = len(arrays['strings.offsets']) - 1
+
+    def _decode(self, code: int):
+        return self.shared.string(code) if code < self.string_count else self.values[code - self.string_count]
+
+    def _row(self, drug_key) -> Optional[int]:
+        if not isinstance(drug_key, str):
+            return None
+        sid = self.shared.find_string(drug_key)
+        position = self.shared._find_id(self.sorted_keys, sid) if sid is not None else None
+        return self.sorted_rows[position] if position is not None else None
+
+    def value(self, row: int, field: str, default=None):
+        codes = self.scalar_columns.get(field)
+        if codes is not None:
+            code = codes[row]
+            return default if code == _MISSING else self._decode(code)
+        column = self.list_columns.get(field)
+        if column is None:
+            return default
+        codes, offsets, present = column
+        if not present[row]:
+            return default
+        return tuple(self._decode(code) for code in codes[offsets[row]:offsets[row + 1]])
+
+    def has_value(self, row: int, field: str) -> bool:
+        codes = self.scalar_columns.get(field)
+        if codes is not None:
+            return codes[row] != _MISSING
+        column = self.list_columns.get(field)
+        return column is not None and bool(column[2][row])
+
+    def __getitem__(self, drug_key: str) -> DrugRow:
+        row = self._row(drug_key)
+        if row is None:
+            raise KeyError(drug_key)
+        return DrugRow(self, row)
+
+    def __iter__(self) -> Iterator[str]:
+        return (self.shared.string(sid) for sid in self.row_keys)
+
+    def __len__(self) -> int:
+        return len(self.row_keys)
+
+    def __contains__(self, drug_key) -> bool:
+        return self._row(drug_key) is not None
+
+def write_shared(path: str, version: str, drug_database: Dict[str, Dict], string_maps: Dict[str, Dict[str, str]]):
+    table = DrugTable.from_dicts(drug_database)
+    writer = ArtifactWriter()
+    writer.add_strings(table.keys_list)
+    writer.add_strings(value for value in table.pool if isinstance(value, str))
+    for mapping in string_maps.values():
+        writer.add_strings(mapping)
+        writer.add_strings(mapping.values())
+    writer.finalize_strings()
+
+    # أرقام قيم الجدول = أرقام النصوص في الجدول المرتب، والقيم الأخرى بعدها
+    values = [value for value in table.pool if not isinstance(value, str)]
+    value_ids = {id(value): idx for idx, value in enumerate(values)}
+    string_count = len(writer.string_ids)
+    remap = [writer.sid(value) if isinstance(value, str) else string_count + value_ids[id(value)]
+             for value in table.pool]
+
+    key_ids = [writer.sid(key) for key in table.keys_list]
+    by_key = sorted(range(len(key_ids)), key=key_ids.__getitem__)
+    writer.add_array('drugs.keys', 'I', key_ids)
+    writer.add_array('drugs.sorted_keys', 'I', [key_ids[row] for row in by_key])
+    writer.add_array('drugs.sorted_rows', 'I', by_key)
+    for field, codes in table.scalar_columns.items():
+        writer.add_array(f'drugs.scalar.{field}', 'I', [_MISSING if code == _MISSING else remap[code] for code in codes])
+    for field, (codes, offsets, present) in table.list_columns.items():
+        writer.add_array(f'drugs.list.{field}.codes', 'I', [remap[code] for code in codes])
+        writer.add_array(f'drugs.list.{field}.offsets', 'I', offsets)
+        writer.add_array(f'drugs.list.{field}.present', 'B', present)
+
+    for name, mapping in string_maps.items():
+        writer.add_string_map(name, mapping)
+
+    writer.write(path, {
+        'kind': 'shared_formulary',
+        'formulary_version': version,
+        'drug_fields': table.field_order,
+        'drug_scalar_fields': list(table.scalar_columns),
+        'drug_list_fields': list(table.list_columns),
+        'drug_values': values,
+        'string_maps': list(string_maps)
+    })
+
+def enable_sharing(scope: str):
+    """تفعيل المشاركة لهذه العملية وكل ما تنشئه من عمليات، بملفات تحمل معرف النشر"""
+    if not re.fullmatch(r'[A-Za-z0-9_.]+', scope):
+        raise ValueError(f"Invalid shared memory scope: {scope!r}")
+    os.environ[SCOPE_ENV] = scope
+
+def shared_path(name: str, version: str) -> Optional[str]:
+    scope = os.getenv(SCOPE_ENV)
+    return os.path.join(SHARED_DIR, f"medical-{scope}-{name}-{version}.bin") if scope else None
+
+def remove_shared(scope: str):
+    """حذف ملفات معرف النشر عند إيقاف المشغّل (العمليات التي ما زالت تقرأها تحتفظ بالـ mmap حتى تغلقه)"""
+    for path in glob.glob(os.path.join(SHARED_DIR, f"medical-{scope}-*.bin")):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+def publish(name: str, version: str, drug_database: Optional[Dict[str, Dict]] = None,
+            string_maps: Optional[Dict[str, Dict[str, str]]] = None) -> Optional[SharedFormulary]:
+    """فتح النسخة المشتركة إن كانت عملية أخرى قد نشرتها، وإلا كتابتها مرة واحدة لمعرف النشر
+
+    يعيد None إذا لم يفعّل المشغّل المشاركة أو تعذرت الكتابة، فيستخدم المستدعي نسخته الخاصة.
+    النسخ القديمة لا تُحذف هنا لأن عمليات أخرى قد تفتحها بعد، ويحذفها المشغّل عند إيقافه.
+    """
+    path = shared_path(name, version)
+    if path is None:
+        return None
+    shared = SharedFormulary.open(path, version)
+    if shared is None:
+        try:
+            write_shared(path, version, drug_database or {}, string_maps or {})
+            shared = SharedFormulary(path)
+        except (OSError, ValueError) as e:
+            print(f"Shared formulary {name} unavailable, using a private copy: {e}")
+            return None
+    return shared
+
+def proportional_memory(pid: int) -> int:
+    """Pss بالبايت: الصفحات المشتركة مقسومة على عدد العمليات التي تقرأها"""
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            if line.startswith('Pss:'):
+                return int(line.split()[1]) * 1024
+    return 0
+
+def _worker(mode: str, size: int, formulary: str, ready, done):
+    if mode == 'shared':
+        table = publish('benchmark', f'synthetic-{size}').drug_table()
+    else:
+        from drug_records import synthetic_database
+        with open(formulary, 'r', encoding='utf-8') as f:
+            template = json.load(f)['drug_database']
+        table = DrugTable.from_dicts(synthetic_database(size, template))
+    for drug_key in table:
+        table[drug_key].get('warnings_en')
+    ready.set()
+    done.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description="ذاكرة الجهاز مع زيادة عدد العمليات: نسخة خاصة مقابل نسخة مشتركة")
+    parser.add_argument('--drugs', type=int, default=50_000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--formulary', default='medical_dataset_final.json')
+    args = parser.parse_args()
+
+    from drug_records import synthetic_database
+    with open(args.formulary, 'r', encoding='utf-8') as f:
+        template = json.load(f)['drug_database']
+    scope = f"benchmark{os.getpid()}"
+    enable_sharing(scope)
+    path = shared_path('benchmark', f'synthetic-{args.drugs}')
+    write_shared(path, f'synthetic-{args.drugs}', synthetic_database(args.drugs, template), {})
+    print(f"{args.drugs} drugs, shared file {os.path.getsize(path) / 1e6:.1f} MB in {SHARED_DIR}")
+    print(f"{'workers':>8} {'private MB':>11} {'shared MB':>10}")
+
+    context = multiprocessing.get_context('spawn')
+    try:
+        for count in args.workers:
+            totals = []
+            for mode in ('private', 'shared'):
+                done = context.Event()
+                readies = [context.Event() for _ in range(count)]
+                processes = [context.Process(target=_worker, args=(mode, args.drugs, args.formulary, ready, done))
+                             for ready in readies]
+                for process in processes:
+                    process.start()
+                for ready in readies:
+                    ready.wait()
+                totals.append(sum(proportional_memory(process.pid) for process in processes))
+                done.set()
+                for process in processes:
+                    process.join()
+            print(f"{count:>8} {totals[0] / 1e6:>11.1f} {totals[1] / 1e6:>10.1f}")
+    finally:
+        remove_shared(scope)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+import argparse
+import subprocess
+import sys
+import time
+from typing import List, Tuple
+
+def import_costs(module: str) -> List[Tuple[str, float, float]]:
+    """زمن استيراد كل وحدة يستوردها الملف مباشرة (من python -X importtime في عملية جديدة)"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True, text=True
+    )
+    costs, pending = [], []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        entry = (name.strip(), int(self_us) / 1e6, int(cumulative_us) / 1e6)
+        # الوحدات الفرعية تُطبع قبل الوحدة التي استوردتها، والمستوى 1 = ما يستورده الملف مباشرة
+        if depth == 1:
+            pending.append(entry)
+        elif depth == 0:
+            if entry[0] == module:
+                costs = pending + [entry]
+                break
+            pending = []
+    if result.returncode != 0:
+        print(result.stderr.strip().splitlines()[-1])
+    return costs
+
+def timed(label: str, func, rows: List[Tuple[str, float]]):
+    started = time.perf_counter()
+    value = func()
+    rows.append((label, time.perf_counter() - started))
+    return value
+
+def main():
+    parser = argparse.ArgumentParser(description="تقرير زمن بدء التشغيل وزمن أول رد")
+    parser.add_argument('--app', choices=['main', 'lightweight_chatbot'], default='main')
+    parser.add_argument('--query', default='معلومات عن بندول')
+    parser.add_argument('--ocr', action='store_true', help="قياس تحميل OCR أيضاً")
+    parser.add_argument('--top', type=int, default=15)
+    args = parser.parse_args()
+
+    print(f"Import cost of {args.app} (fresh process):")
+    costs = import_costs(args.app)
+    for name, self_s, cumulative_s in sorted(costs, key=lambda item: -item[2])[:args.top]:
+        print(f"  {name:<32} {cumulative_s * 1000:>9.1f} ms  (self {self_s * 1000:.1f} ms)")
+
+    rows = []
+    process_started = time.perf_counter()
+    module = timed(f"import {args.app}", lambda: __import__(args.app), rows)
+
+    if args.app == 'main':
+        bot = timed('AdvancedMedicalChatbot()', module.AdvancedMedicalChatbot, rows)
+        rows.extend((f"  {stage}", seconds) for stage, seconds in bot.startup_timings.items())
+        timed('first answer', lambda: bot.process_query(args.query, bot.detect_language(args.query)), rows)
+    else:
+        bot = timed('LightweightMedicalBot()', module.LightweightMedicalBot, rows)
+        timed('first answer', lambda: bot.process_user_input(args.query), rows)
+    time_to_first_answer = time.perf_counter() - process_started
+
+    if args.ocr and args.app == 'main':
+        timed('OCR reader (easyocr)', module.get_ocr_reader, rows)
+
+    print("\nInitialization:")
+    for label, seconds in rows:
+        print(f"  {label:<32} {seconds * 1000:>9.1f} ms")
+    print(f"\nTime to first answer (after interpreter start): {time_to_first_answer * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    main()
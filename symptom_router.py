@@ -0,0 +1,51 @@
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from arabic_normalizer import tokenize as default_tokenize
+
+class SymptomSuggestion(NamedTuple):
+    drug_key: Optional[str]
+    name: str
+    score: float
+
+class SymptomRouter:
+    """جدول توجيه الأعراض إلى الأدوية مُجهز مسبقاً من قاعدة البيانات"""
+
+    def __init__(self, routing_table: Dict[str, List[str]], resolve_drug: Callable[[str], Optional[str]],
+                 tokenize: Callable[[str], List[str]] = default_tokenize):
+        self.tokenize = tokenize
+
+        # الأدوية تُحل مرة واحدة عند التحميل بدل البحث عنها في كل طلب
+        self.routes = []
+        # فهرس بالكلمات المطبعة (بلا سوابق ولواحق): "للصداع" و"بالصداع" و"صداعي" مفتاحها واحد
+        self.index: Dict[Tuple[str, ...], List[int]] = {}
+        for order, (symptom, drug_names) in enumerate(routing_table.items()):
+            self.routes.append((symptom, [(resolve_drug(name), name) for name in drug_names]))
+            tokens = tuple(tokenize(symptom))
+            if tokens:
+                self.index.setdefault(tokens, []).append(order)
+        self.max_tokens = max(map(len, self.index), default=0)
+
+    def match_symptoms(self, query: str) -> List[int]:
+        """أرقام الأعراض المذكورة في الاستعلام بترتيب الجدول"""
+        tokens = self.tokenize(query)
+        found = set()
+        for size in range(1, self.max_tokens + 1):
+            for start in range(len(tokens) - size + 1):
+                orders = self.index.get(tuple(tokens[start:start + size]))
+                if orders:
+                    found.update(orders)
+        return sorted(found)
+
+    def route(self, query: str) -> List[SymptomSuggestion]:
+        """ترتيب الأدوية المقترحة لكل الأعراض المذكورة (الأعلى تكراراً وأولوية أولاً)"""
+        scores = {}
+        for order in self.match_symptoms(query):
+            _, drugs = self.routes[order]
+            for position, (drug_key, name) in enumerate(drugs):
+                key = drug_key or name
+                if key not in scores:
+                    scores[key] = [0.0, len(scores), drug_key, name]
+                scores[key][0] += 1.0 / (position + 1)
+
+        ranked = sorted(scores.values(), key=lambda entry: (-entry[0], entry[1]))
+        return [SymptomSuggestion(drug_key, name, score) for score, _, drug_key, name in ranked]
@@ -0,0 +1,39 @@
+import pytest
+
+from lightweight_chatbot import LightweightMedicalBot
+from main import AdvancedMedicalChatbot
+
+@pytest.fixture(scope='module')
+def advanced():
+    return AdvancedMedicalChatbot()
+
+@pytest.fixture(scope='module')
+def lightweight():
+    return LightweightMedicalBot()
+
+@pytest.mark.parametrize('query, language', [
+    ('Augmentin with iron supplements', 'en'),
+    ('اوجمنتين مع الحديد', 'ar'),
+])
+def test_drug_with_interacting_class_is_interaction(advanced, query, language):
+    assert advanced.intent_classifier.detect_intent(query, language) == 'GET_INTERACTION'
+    response = advanced.process_query(query, language)
+    assert advanced.interaction_index.name('class:B03A', language) in response
+    assert advanced.interaction_index.name('augmentin', language) in response
+
+@pytest.mark.parametrize('query, language, expected', [
+    ('Is augmentin an iron supplement?', 'en', '❌'),
+    ('Is augmentin a penicillin?', 'en', '✅'),
+    ('هل اوجمنتين من البنسلينات', 'ar', '✅'),
+])
+def test_membership_wording_is_class_question(advanced, query, language, expected):
+    assert advanced.intent_classifier.detect_intent(query, language) == 'GET_CLASS_MEMBERSHIP'
+    assert advanced.process_query(query, language).startswith(expected)
+
+def test_lightweight_drug_with_interacting_class_is_interaction(lightweight):
+    expected = lightweight.renderer.render('augmentin', 'interactions', 'en')
+    assert lightweight.process_user_input('Augmentin with iron supplements') == expected
+
+def test_lightweight_membership_wording_is_class_question(lightweight):
+    assert lightweight.process_user_input('Is augmentin an iron supplement?').startswith('❌')
+    assert lightweight.process_user_input('هل اوجمنتين من البنسلينات').startswith('✅')
@@ -0,0 +1,16 @@
+import pytest
+
+from main import AdvancedMedicalChatbot
+
+@pytest.fixture(scope='module')
+def advanced():
+    return AdvancedMedicalChatbot()
+
+@pytest.mark.parametrize('query, language', [
+    ('panadol overdose', 'en'),
+    ('augmentin dosing', 'en'),
+    ('بنادول جرعة زائدة', 'ar'),
+])
+def test_overdose_wording_gets_dosage_refusal(advanced, query, language):
+    assert advanced.intent_classifier.detect_intent(query, language) == 'GET_DOSAGE'
+    assert advanced.process_query(query, language).startswith('🚫')
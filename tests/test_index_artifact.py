@@ -0,0 +1,29 @@
+import json
+
+from drug_ontology import DrugOntology
+from index_artifact import IndexArtifact, MappedAhoCorasick, MappedStringMap, compile_artifact
+from main import IntentClassifier
+
+def test_advanced_bot_reads_compiled_sections(tmp_path):
+    path = str(tmp_path / 'index.bin')
+    compile_artifact('medical_dataset_final.json', path)
+
+    built = IntentClassifier()
+    mapped = IntentClassifier(artifact=IndexArtifact.open(path))
+    assert isinstance(mapped.safety_checker.matchers['ar'], MappedAhoCorasick)
+    assert isinstance(mapped.symptom_parser.drug_synonyms, MappedStringMap)
+    assert mapped.symptom_parser.drug_synonyms.items() == list(built.symptom_parser.drug_synonyms.items())
+    assert mapped.interaction_index.matrix == built.interaction_index.matrix
+    assert mapped.interaction_index.names == built.interaction_index.names
+
+def test_stale_interaction_table_is_rebuilt(tmp_path):
+    path = str(tmp_path / 'index.bin')
+    compile_artifact('medical_dataset_final.json', path)
+
+    with open('drug_classes.json', 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    data['classes']['B03A']['severity'] = 'high'
+    ontology = DrugOntology(data['classes'], data['members'], data['version'])
+
+    index = IntentClassifier(ontology, IndexArtifact.open(path)).interaction_index
+    assert index.check_all(['augmentin', 'class:B03A'])[0].severity == 3
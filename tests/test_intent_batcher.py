@@ -0,0 +1,33 @@
+import threading
+
+from intent_batcher import MicroBatcher
+
+def test_cancelled_request_does_not_stop_worker():
+    release = threading.Event()
+
+    def predict(texts):
+        release.wait(5)
+        return [text.upper() for text in texts]
+
+    batcher = MicroBatcher(predict, max_batch_size=1, max_wait_ms=0)
+    try:
+        first = batcher.submit('a')
+        cancelled = batcher.submit('b')
+        assert cancelled.cancel()
+        release.set()
+
+        assert first.result(5) == 'A'
+        assert batcher.classify('c', timeout=5) == 'C'
+    finally:
+        batcher.close()
+
+def test_predict_error_reaches_every_caller():
+    def predict(texts):
+        raise ValueError('model failed')
+
+    batcher = MicroBatcher(predict, max_batch_size=4, max_wait_ms=1)
+    try:
+        future = batcher.submit('a')
+        assert isinstance(future.exception(5), ValueError)
+    finally:
+        batcher.close()
@@ -0,0 +1,10 @@
+from main import IntentClassifier
+
+def test_pair_severity_ignores_drug_danger_level():
+    index = IntentClassifier().interaction_index
+    interaction = index.check_all(['zanidip', 'substance:grapefruit'])[0]
+    assert interaction.severity == 1
+
+    report = index.format_report(['zanidip', 'substance:grapefruit'], 'en')
+    assert '🟡 **Zanidip + Grapefruit** - low severity' in report
+    assert '🔴 Zanidip - high severity' in report
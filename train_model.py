@@ -1,39 +1,117 @@
 
 import torch
 from transformers import AutoTokenizer, AutoModelForSequenceClassification, TrainingArguments, Trainer
-from torch.utils.data import Dataset, DataLoader
+from torch.utils.data import Dataset, DataLoader, Sampler
 import json
+import os
+import hashlib
 import pandas as pd
-from sklearn.model_selection import train_test_split
 from sklearn.metrics import accuracy_score, precision_recall_fscore_support, classification_report
 import numpy as np
+import argparse
+import time
+from intent_student import StudentIntentModel
+from dedup_split import group_train_test_split
+
+def tokenize_corpus(tokenizer, texts, max_length=128, cache_dir='./tokenized_cache'):
+    """ترميز كامل النصوص مرة واحدة وحفظها على القرص كمصفوفات (بدون padding)"""
+    texts = [str(text) for text in texts]
+    digest = hashlib.sha1()
+    digest.update(f"{tokenizer.name_or_path}|{max_length}|".encode('utf-8'))
+    for text in texts:
+        digest.update(text.encode('utf-8'))
+        digest.update(b'\0')
+    cache_path = os.path.join(cache_dir, f"{digest.hexdigest()[:16]}.npz") if cache_dir else None
+
+    if cache_path and os.path.exists(cache_path):
+        cached = np.load(cache_path)
+        return cached['input_ids'], cached['offsets']
+
+    # ترميز دفعة واحدة بدل ترميز كل نص عند كل وصول
+    encoding = tokenizer(texts, truncation=True, padding=False, max_length=max_length)
+    lengths = np.array([len(ids) for ids in encoding['input_ids']], dtype=np.int64)
+    offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    input_ids = np.fromiter(
+        (token for ids in encoding['input_ids'] for token in ids),
+        dtype=np.int32,
+        count=int(offsets[-1])
+    )
+
+    if cache_path:
+        os.makedirs(cache_dir, exist_ok=True)
+        np.savez(cache_path, input_ids=input_ids, offsets=offsets)
+
+    return input_ids, offsets
 
 class MedicalIntentDataset(Dataset):
-    def __init__(self, texts, labels, tokenizer, max_length=128):
-        self.texts = texts
-        self.labels = labels
-        self.tokenizer = tokenizer
-        self.max_length = max_length
+    def __init__(self, texts, labels, tokenizer, max_length=128, cache_dir='./tokenized_cache'):
+        self.labels = np.asarray(labels, dtype=np.int64)
+        self.input_ids, self.offsets = tokenize_corpus(tokenizer, texts, max_length, cache_dir)
+        self.lengths = np.diff(self.offsets)
     
     def __len__(self):
-        return len(self.texts)
+        return len(self.labels)
     
     def __getitem__(self, idx):
-        text = str(self.texts[idx])
-        encoding = self.tokenizer(
-            text,
-            truncation=True,
-            padding='max_length',
-            max_length=self.max_length,
-            return_tensors='pt'
-        )
+        start, end = self.offsets[idx], self.offsets[idx + 1]
+        input_ids = torch.from_numpy(self.input_ids[start:end].astype(np.int64))
         
         return {
-            'input_ids': encoding['input_ids'].flatten(),
-            'attention_mask': encoding['attention_mask'].flatten(),
+            'input_ids': input_ids,
+            'attention_mask': torch.ones_like(input_ids),
             'labels': torch.tensor(self.labels[idx], dtype=torch.long)
         }
 
+class LengthBucketSampler(Sampler):
+    """تجميع النصوص متقاربة الطول في نفس الدفعة لتقليل الـ padding"""
+    def __init__(self, lengths, batch_size, shuffle=True, bucket_size_multiplier=50, seed=42):
+        self.lengths = np.asarray(lengths)
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.bucket_size = batch_size * bucket_size_multiplier
+        self.seed = seed
+        self.epoch = 0
+    
+    def __iter__(self):
+        rng = np.random.default_rng(self.seed + self.epoch)
+        self.epoch += 1
+        
+        indices = rng.permutation(len(self.lengths)) if self.shuffle else np.arange(len(self.lengths))
+        batches = []
+        for start in range(0, len(indices), self.bucket_size):
+            bucket = indices[start:start + self.bucket_size]
+            bucket = bucket[np.argsort(self.lengths[bucket], kind='stable')]
+            batches.extend(bucket[i:i + self.batch_size].tolist() for i in range(0, len(bucket), self.batch_size))
+        
+        if self.shuffle:
+            rng.shuffle(batches)
+        return iter(batches)
+    
+    def __len__(self):
+        return (len(self.lengths) + self.batch_size - 1) // self.batch_size
+
+class DynamicPaddingCollator:
+    """padding حتى أطول نص في الدفعة فقط بدل max_length الثابت"""
+    def __init__(self, pad_token_id=0):
+        self.pad_token_id = pad_token_id
+    
+    def __call__(self, features):
+        max_len = max(len(feature['input_ids']) for feature in features)
+        input_ids = torch.full((len(features), max_len), self.pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(features), max_len), dtype=torch.long)
+        
+        for i, feature in enumerate(features):
+            length = len(feature['input_ids'])
+            input_ids[i, :length] = feature['input_ids']
+            attention_mask[i, :length] = 1
+        
+        return {
+            'input_ids': input_ids,
+            'attention_mask': attention_mask,
+            'labels': torch.stack([feature['labels'] for feature in features])
+        }
+
 class MBERTTrainer:
     def __init__(self, model_name='bert-base-multilingual-cased'):
         self.model_name = model_name
@@ -41,7 +119,7 @@ class MBERTTrainer:
         self.intent_to_id = {}
         self.id_to_intent = {}
         
-    def prepare_data(self, json_file):
+    def prepare_data(self, json_file, intent_to_id=None):
         """Load and prepare training data"""
         with open(json_file, 'r', encoding='utf-8') as f:
             data = json.load(f)
@@ -49,21 +127,27 @@ class MBERTTrainer:
         df = pd.DataFrame(data)
         
         # Create intent mappings
-        unique_intents = df['intent'].unique()
-        self.intent_to_id = {intent: idx for idx, intent in enumerate(unique_intents)}
+        if intent_to_id is None:
+            unique_intents = df['intent'].unique()
+            intent_to_id = {intent: idx for idx, intent in enumerate(unique_intents)}
+        self.intent_to_id = intent_to_id
         self.id_to_intent = {idx: intent for intent, idx in self.intent_to_id.items()}
         
         # Convert intents to IDs
         df['label_id'] = df['intent'].map(self.intent_to_id)
         
-        # Split data
-        X_train, X_test, y_train, y_test = train_test_split(
+        # Split data: النصوص شبه المتطابقة تبقى في نفس الجهة حتى لا تتضخم الدقة
+        split_report = {}
+        X_train, X_test, y_train, y_test = group_train_test_split(
             df['text'].tolist(),
             df['label_id'].tolist(),
             test_size=0.2,
             random_state=42,
-            stratify=df['label_id']
+            report=split_report
         )
+        print(f"Near-duplicate groups: {split_report['groups']} "
+              f"({split_report['duplicate_rows']} redundant rows), "
+              f"train/test leakage: {split_report['leakage_rate']:.2%}")
         
         return X_train, X_test, y_train, y_test
     
@@ -92,6 +176,7 @@ class MBERTTrainer:
             evaluation_strategy="epoch",
             save_strategy="epoch",
             load_best_model_at_end=True,
+            group_by_length=True,
         )
         
         def compute_metrics(eval_pred):
@@ -113,6 +198,7 @@ class MBERTTrainer:
             train_dataset=train_dataset,
             eval_dataset=test_dataset,
             compute_metrics=compute_metrics,
+            data_collator=DynamicPaddingCollator(self.tokenizer.pad_token_id),
         )
         
         # Train model
@@ -131,35 +217,107 @@ class MBERTTrainer:
         
         return model, trainer
     
-    def evaluate_model(self, model, X_test, y_test):
-        """Evaluate trained model"""
-        test_dataset = MedicalIntentDataset(X_test, y_test, self.tokenizer)
-        test_loader = DataLoader(test_dataset, batch_size=8)
+    def load_trained_model(self, model_dir='./mbert_medical_intent'):
+        """تحميل النموذج المدرب (المعلم) مع خرائط النوايا"""
+        with open(os.path.join(model_dir, 'intent_mappings.json'), 'r') as f:
+            mappings = json.load(f)
+        self.intent_to_id = mappings['intent_to_id']
+        self.id_to_intent = {int(idx): intent for idx, intent in mappings['id_to_intent'].items()}
+        return AutoModelForSequenceClassification.from_pretrained(model_dir)
+    
+    def predict_logits(self, model, texts):
+        """حساب الـ logits بترتيب النصوص الأصلي (يدعم المعلم والطالب)"""
+        if isinstance(model, StudentIntentModel):
+            return model.predict_logits(texts)
+        
+        dataset = MedicalIntentDataset(texts, [0] * len(texts), self.tokenizer)
+        loader = DataLoader(
+            dataset,
+            batch_sampler=LengthBucketSampler(dataset.lengths, batch_size=32, shuffle=False),
+            collate_fn=DynamicPaddingCollator(self.tokenizer.pad_token_id)
+        )
+        # ترتيب الدفعات حسب الطول، لذا نعيد الـ logits لترتيبها الأصلي
+        ordered_indices = [idx for batch in loader.batch_sampler for idx in batch]
         
         model.eval()
-        predictions = []
-        true_labels = []
+        batch_logits = []
         
         with torch.no_grad():
-            for batch in test_loader:
+            for batch in loader:
                 inputs = {
                     'input_ids': batch['input_ids'],
                     'attention_mask': batch['attention_mask']
                 }
                 
                 outputs = model(**inputs)
-                logits = outputs.logits
-                
-                predictions.extend(torch.argmax(logits, dim=-1).cpu().numpy())
-                true_labels.extend(batch['labels'].cpu().numpy())
+                batch_logits.append(outputs.logits.cpu().numpy())
+        
+        logits = np.empty((len(dataset), len(self.id_to_intent)), dtype=np.float32)
+        logits[ordered_indices] = np.concatenate(batch_logits)
+        return logits
+    
+    def evaluate_model(self, model, X_test, y_test):
+        """Evaluate trained model"""
+        predictions = np.argmax(self.predict_logits(model, X_test), axis=1)
+        true_labels = list(y_test)
         
         # Generate classification report
         intent_names = [self.id_to_intent[i] for i in range(len(self.id_to_intent))]
         report = classification_report(true_labels, predictions, target_names=intent_names)
         
         return report, predictions, true_labels
+    
+    def distill_student(self, teacher, X_train, y_train, temperature=2.0, alpha=0.7,
+                        epochs=30, embedding_dim=32, num_buckets=2 ** 16,
+                        output_dir='./mbert_medical_intent'):
+        """تقطير المعلم (mBERT) إلى نموذج طالب صغير من char n-grams"""
+        teacher_logits = torch.from_numpy(self.predict_logits(teacher, X_train))
+        labels = torch.tensor(y_train, dtype=torch.long)
+        features = [
+            torch.tensor(StudentIntentModel.featurize(text, num_buckets) or [0], dtype=torch.long)
+            for text in X_train
+        ]
+        
+        num_labels = len(self.id_to_intent)
+        embedding = torch.nn.EmbeddingBag(num_buckets, embedding_dim, mode='mean')
+        classifier = torch.nn.Linear(embedding_dim, num_labels)
+        optimizer = torch.optim.Adam(list(embedding.parameters()) + list(classifier.parameters()), lr=0.05)
+        generator = torch.Generator().manual_seed(42)
+        
+        for epoch in range(epochs):
+            for batch in torch.randperm(len(features), generator=generator).split(32):
+                flat = torch.cat([features[i] for i in batch])
+                offsets = torch.tensor([0] + [len(features[i]) for i in batch[:-1]]).cumsum(0)
+                student_logits = classifier(embedding(flat, offsets))
+                
+                # خسارة التقطير: مطابقة توزيع المعلم الناعم + التسميات الحقيقية
+                soft_loss = torch.nn.functional.kl_div(
+                    torch.log_softmax(student_logits / temperature, dim=-1),
+                    torch.softmax(teacher_logits[batch] / temperature, dim=-1),
+                    reduction='batchmean'
+                ) * temperature ** 2
+                hard_loss = torch.nn.functional.cross_entropy(student_logits, labels[batch])
+                loss = alpha * soft_loss + (1 - alpha) * hard_loss
+                
+                optimizer.zero_grad()
+                loss.backward()
+                optimizer.step()
+        
+        student = StudentIntentModel(
+            embedding.weight.detach().numpy().astype(np.float32),
+            classifier.weight.detach().numpy().astype(np.float32),
+            classifier.bias.detach().numpy().astype(np.float32),
+            dict(self.id_to_intent)
+        )
+        student.save(output_dir)
+        return student
 
 def main():
+    parser = argparse.ArgumentParser(description="تدريب مصنف النوايا الطبي")
+    parser.add_argument('--distill', action='store_true',
+                        help="تقطير النموذج المدرب إلى نموذج طالب صغير للمعالج")
+    args = parser.parse_args()
+    
     # Initialize trainer
     trainer = MBERTTrainer()
     
@@ -169,9 +327,16 @@ def main():
         print(f"Training data: {len(X_train)} samples")
         print(f"Test data: {len(X_test)} samples")
         
-        # Train model
-        print("Starting training...")
-        model, trained_model = trainer.train_model(X_train, y_train, X_test, y_test)
+        if args.distill and os.path.exists('./mbert_medical_intent/intent_mappings.json'):
+            # استخدام المعلم المدرب مسبقاً
+            print("Loading teacher model...")
+            model = trainer.load_trained_model()
+            # إعادة تطبيق الخرائط المحفوظة على التسميات
+            X_train, X_test, y_train, y_test = trainer.prepare_data('medical_chatbot_dataset.json', trainer.intent_to_id)
+        else:
+            # Train model
+            print("Starting training...")
+            model, trained_model = trainer.train_model(X_train, y_train, X_test, y_test)
         
         # Evaluate model
         print("Evaluating model...")
@@ -179,6 +344,19 @@ def main():
         print("\nClassification Report:")
         print(report)
         
+        if args.distill:
+            print("Distilling student model...")
+            student = trainer.distill_student(model, X_train, y_train)
+            report, predictions, true_labels = trainer.evaluate_model(student, X_test, y_test)
+            print("\nStudent Classification Report:")
+            print(report)
+            
+            started = time.perf_counter()
+            for text in X_test:
+                student.predict(text)
+            per_message_ms = (time.perf_counter() - started) * 1000 / max(len(X_test), 1)
+            print(f"Student CPU latency: {per_message_ms:.3f} ms/message")
+        
     except FileNotFoundError:
         print("Dataset file not found. Please run dataset_builder.py first.")
 